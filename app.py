@@ -1,552 +1,335 @@
-import streamlit as st
-import pandas as pd
 import io
-import zipfile
-import google.generativeai as genai
+import json
+import os
+import shutil
+import tempfile
 import time
 
+import streamlit as st
+import streamlit.components.v1 as components
+
+from report_generator import (
+    DEFAULT_COMPRESSION_LEVEL, DEFAULT_INSIGHT_WORKERS, DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE, GROUP_COLUMN_NAMES, ZIP_CODECS, InsightCache, JobRunner, PipelineCallbacks,
+    PipelineProfiler, SurveyFrameCache, SurveyValidator, group_column_names, load_scored_survey, preview_report,
+    rollup_export_table, school_stats_table, stats_export_table, stats_format, survey_rollup, write_report_shards,
+    write_report_zip, write_stats,
+)
+from report_generator.jobs import ACTIVE_STATUSES
+
 # --- CONFIGURATION ---
 st.set_page_config(page_title="EDXSO Survey Report Generator", layout="wide")
+JOB_POLL_SECONDS = 2
+
+
+class StreamlitCallbacks(PipelineCallbacks):
+    """
+    Shows pipeline progress as a progress bar and messages as captions.
+    """
+
+    def __init__(self):
+        self.progress_bar = None
+
+    def progress(self, fraction, text=""):
+        if self.progress_bar is None:
+            self.progress_bar = st.progress(0)
+        self.progress_bar.progress(fraction, text=text or None)
+
+    def info(self, message):
+        st.caption(message)
+
+    def error(self, message):
+        st.error(message)
+
 
-# --- HTML TEMPLATE (Source of Truth) ---
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Student Well-Being Survey Report - [SCHOOL_NAME]</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        body { font-family: 'Inter', sans-serif; background-color: #f9fafb; color: #1e293b; scroll-behavior: smooth; }
-        .report-section { background: #ffffff; margin-bottom: 3rem; overflow: hidden; border: 1px solid #f1f5f9; border-radius: 1.5rem; }
-        .text-navy { color: #0c4a6e; }
-        .hero-gradient { background: linear-gradient(135deg, #0c4a6e 0%, #075985 100%); }
-        .chart-bar-bg { background-color: #f1f5f9; border-radius: 9999px; height: 1.5rem; width: 100%; overflow: hidden; position: relative; }
-        .chart-bar-fill { height: 100%; border-radius: 9999px; transition: width 1s ease-in-out; }
-        .legend-dot { width: 12px; height: 12px; border-radius: 3px; display: inline-block; margin-right: 6px; }
-    </style>
-</head>
-<body class="p-4 md:p-8">
-    <div class="max-w-5xl mx-auto">
-        <header class="report-section hero-gradient text-white p-12 md:p-20 flex flex-col items-center text-center border-none">
-            <div class="mb-10 bg-white p-4 rounded-xl">
-                <img src="https://i.ibb.co/jP5j8vf8/Screenshot-2026-01-30-at-5-16-07-PM.png" alt="EDXSO Logo" class="h-20 w-auto">
-            </div>
-            <p class="uppercase tracking-widest text-blue-200 font-semibold mb-2">[SCHOOL_NAME]</p>
-            <h1 class="text-4xl md:text-6xl font-extrabold mb-6 leading-tight">Student Well-Being & <br>Assessment Experience Survey</h1>
-            <div class="w-24 h-1 bg-blue-400 mb-8"></div>
-            <div class="space-y-2 text-blue-100">
-                <p class="text-xl font-medium">SURVEY REPORT</p>
-                <p>Established [EST_YEAR]</p>
-                <p class="opacity-80">www.edxso.com</p>
-            </div>
-        </header>
-
-        <section id="executive-summary" class="report-section">
-            <div class="p-10 md:p-12">
-                <div class="flex items-center gap-3 mb-8 border-b border-gray-50 pb-6">
-                    <span class="p-2 bg-blue-50 rounded-lg">
-                        <svg class="w-6 h-6 text-blue-700" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z"></path></svg>
-                    </span>
-                    <h2 class="text-3xl font-bold text-navy uppercase tracking-tight">Executive Summary</h2>
-                </div>
-                <div class="grid grid-cols-1 md:grid-cols-2 gap-12 mb-10">
-                    <div class="space-y-4 text-gray-700 leading-relaxed text-lg">
-                        <p>[EXEC_SUMMARY_P1]</p>
-                        <p>[EXEC_SUMMARY_P2]</p>
-                    </div>
-                    <div class="space-y-4 text-gray-700 leading-relaxed text-lg">
-                        <p class="font-semibold text-navy">[EXEC_SUMMARY_KEY_FINDING]</p>
-                        <p>[EXEC_SUMMARY_CONCLUSION]</p>
-                    </div>
-                </div>
-                <div class="p-8 border-l-4 border-blue-600 mb-12 italic text-gray-600 bg-slate-50/50 text-xl rounded-r-xl">
-                    "[INSERT_KEY_QUOTE]"
-                </div>
-                <div class="flex items-center justify-center p-0 mb-4">
-                    <img src="https://i.ibb.co/3YcKMn9W/Screenshot-2026-01-30-at-5-19-05-PM.png" alt="Students in Classroom" class="rounded-xl max-w-4xl w-full h-auto">
-                </div>
-            </div>
-        </section>
-
-        <section id="overview" class="report-section p-10 md:p-12">
-            <div class="flex flex-col md:flex-row gap-12">
-                <div class="md:w-1/3">
-                    <img src="https://i.ibb.co/VYdmHbWy/Screenshot-2026-01-30-at-5-19-42-PM.png" alt="Overview Icon" class="rounded-xl mb-6 w-full object-cover">
-                    <h2 class="text-2xl font-bold text-navy mb-4 uppercase">Survey Overview</h2>
-                    <p class="text-gray-600 leading-relaxed">Structured snapshot outlining scale, mode, and analytical logic used to capture student perspectives.</p>
-                </div>
-                <div class="md:w-2/3 space-y-2">
-                    <div class="flex items-center p-5 border-b border-gray-100">
-                        <div class="w-40 font-bold text-navy uppercase text-xs tracking-wider">Survey Name:</div>
-                        <div class="text-gray-700">Student Well-Being & Assessment Experience Survey</div>
-                    </div>
-                    <div class="flex items-center p-5 border-b border-gray-100">
-                        <div class="w-40 font-bold text-navy uppercase text-xs tracking-wider">Participants:</div>
-                        <div class="text-gray-700">[COUNT] Students</div>
-                    </div>
-                    <div class="flex items-center p-5 border-b border-gray-100">
-                        <div class="w-40 font-bold text-navy uppercase text-xs tracking-wider">Mode:</div>
-                        <div class="text-gray-700">[MODE]</div>
-                    </div>
-                    <div class="flex items-center p-5 border-b border-gray-100">
-                        <div class="w-40 font-bold text-navy uppercase text-xs tracking-wider">Nature:</div>
-                        <div class="text-gray-700">Anonymous, self-reported</div>
-                    </div>
-                    <div class="flex items-center p-5 border-b border-gray-100">
-                        <div class="w-40 font-bold text-navy uppercase text-xs tracking-wider">Focus:</div>
-                        <div class="text-gray-700">Emotional impact of assessments</div>
-                    </div>
-                </div>
-            </div>
-        </section>
-
-        <section class="grid grid-cols-1 md:grid-cols-2 gap-12 mb-16">
-            <div class="p-10 border border-slate-100 rounded-2xl bg-white">
-                <h2 class="text-2xl font-bold text-navy mb-8 uppercase tracking-widest flex items-center gap-2">Objectives</h2>
-                <ul class="space-y-6">
-                    <li class="flex gap-4"><span class="text-blue-600 font-bold text-xl">01</span><p class="text-gray-700">Collect evidence on emotional responses to tests.</p></li>
-                    <li class="flex gap-4"><span class="text-blue-600 font-bold text-xl">02</span><p class="text-gray-700">Analyze stress associated with performance expectations.</p></li>
-                    <li class="flex gap-4"><span class="text-blue-600 font-bold text-xl">03</span><p class="text-gray-700">Classify students into defined stress categories.</p></li>
-                </ul>
-            </div>
-            <div class="p-0">
-                <img src="https://i.ibb.co/kV9wrJ8q/Screenshot-2026-01-30-at-5-20-37-PM.png" alt="Methodology" class="rounded-2xl mb-6 w-full">
-                <h2 class="text-2xl font-bold text-navy mb-4 uppercase">Design & Methodology</h2>
-                <p class="text-gray-600 mb-6">20 structured statements on a 5-point scale from <span class="font-semibold">Never</span> to <span class="font-semibold">Always</span>.</p>
-            </div>
-        </section>
-
-        <section id="scoring" class="report-section p-10 md:p-12">
-            <div class="mb-12">
-                <h2 class="text-4xl font-extrabold text-navy tracking-tight mb-2 uppercase">Scoring Framework</h2>
-                <div class="h-1 w-20 bg-blue-600"></div>
-            </div>
-            <div class="space-y-1">
-                 [INSERT_FULL_SCORING_TABLE_FROM_USER_PROMPT]
-            </div>
-            <div class="mt-12 p-6 bg-slate-50 rounded-xl text-gray-500 text-sm">
-                <p>Note: Participation was anonymous. Scoring logic was applied strictly without subjective interpretation.</p>
-            </div>
-        </section>
-
-        <section id="results" class="report-section p-10 md:p-12">
-            <div class="mb-12 text-center">
-                <h2 class="text-3xl font-bold text-navy mb-2 uppercase tracking-tighter">Student Well-Being</h2>
-                <p class="text-xl text-gray-400">Stress Category Distribution</p>
-            </div>
-            <div class="mb-16 flex justify-center">
-                <img src="https://i.ibb.co/bR1yz5p6/Screenshot-2026-01-30-at-5-21-18-PM.png" alt="Stress Distribution Chart" class="w-full max-w-4xl">
-            </div>
-            <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-12">
-                <div class="pb-6 border-b-2 border-green-500">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Emotionally Balanced</h3>
-                        <span class="text-3xl font-black text-green-600">[VAL_BALANCED]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">[PCT_BALANCED]% — Stable emotional states.</p>
-                </div>
-                <div class="pb-6 border-b-2 border-blue-500">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Mildly Stressed</h3>
-                        <span class="text-3xl font-black text-blue-600">[VAL_MILD]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">[PCT_MILD]% — Minor stress levels.</p>
-                </div>
-                <div class="pb-6 border-b-2 border-yellow-500">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Moderately Stressed</h3>
-                        <span class="text-3xl font-black text-yellow-600">[VAL_MOD]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">[PCT_MOD]% — Significant challenges.</p>
-                </div>
-                <div class="pb-6 border-b-2 border-orange-500">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Highly Stressed</h3>
-                        <span class="text-3xl font-black text-orange-600">[VAL_HIGH]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">[PCT_HIGH]% — Intense experiences.</p>
-                </div>
-                <div class="pb-6 border-b-2 border-red-500">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Severely Stressed</h3>
-                        <span class="text-3xl font-black text-red-600">[VAL_SEVERE]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">[PCT_SEVERE]% — Extreme stress levels.</p>
-                </div>
-                <div class="pb-6 border-b-2 border-gray-900">
-                    <div class="flex justify-between items-baseline mb-2">
-                        <h3 class="font-bold text-gray-900 uppercase text-sm tracking-widest">Total Surveyed</h3>
-                        <span class="text-3xl font-black text-gray-900">[VAL_TOTAL]</span>
-                    </div>
-                    <p class="text-sm text-gray-500">100% Valid Responses.</p>
-                </div>
-            </div>
-        </section>
-
-        <section id="national-benchmark" class="report-section p-10 md:p-12">
-            <div class="mb-10">
-                <h2 class="text-3xl font-bold text-navy mb-4 uppercase tracking-tighter">National Benchmark Comparison: <span class="text-blue-600">Student Stress Levels (India)</span></h2>
-                <div class="h-1 w-24 bg-blue-600 mb-6"></div>
-                <p class="text-gray-600 leading-relaxed text-lg">
-                    To contextualize findings, student responses were compared against established benchmarks from the <strong>NCERT National Survey (2022)</strong> and Indian academic morbidity studies (2020–2024).
-                </p>
-            </div>
-
-            <div class="grid grid-cols-1 md:grid-cols-2 gap-8 mb-12">
-                <div class="p-8 border border-slate-50 rounded-2xl bg-slate-50/30">
-                    <h3 class="text-xl font-bold text-navy mb-4">Calculation Methodology</h3>
-                    <ul class="space-y-4 text-sm text-gray-600">
-                        <li class="flex gap-2"><span class="text-blue-600 font-bold">•</span> <strong>Likert Scoring:</strong> 20 diagnostic statements rated 1–5.</li>
-                        <li class="flex gap-2"><span class="text-blue-600 font-bold">•</span> <strong>Reverse Scoring:</strong> Applied to Q16–20 to measure resilience.</li>
-                        <li class="flex gap-2"><span class="text-blue-600 font-bold">•</span> <strong>Mapping:</strong> Total scores (20–100) mapped to NMHS-aligned stress categories.</li>
-                    </ul>
-                </div>
-                <div class="p-8 border border-slate-50 rounded-2xl bg-white">
-                    <h3 class="text-xl font-bold text-navy mb-4">Benchmark Data Sources</h3>
-                    <div class="space-y-3">
-                        <div class="flex justify-between items-center text-sm p-3 border-b border-gray-50">
-                            <span class="text-gray-600 font-medium">NCERT (2022)</span>
-                            <span class="text-navy font-bold">81% Exam Anxiety</span>
-                        </div>
-                        <div class="flex justify-between items-center text-sm p-3 border-b border-gray-100">
-                            <span class="text-gray-600 font-medium">Academic Studies (20-24)</span>
-                            <span class="text-navy font-bold">30% Moderate Stress</span>
-                        </div>
-                        <div class="flex justify-between items-center text-sm p-3 border-b border-gray-100">
-                            <span class="text-gray-600 font-medium">NMHS Adolescents</span>
-                            <span class="text-navy font-bold">7.3% Morbidity</span>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="mb-16">
-                <h3 class="text-2xl font-bold text-navy mb-6 text-center">Stress Category Distribution: School vs. National Benchmark</h3>
-                <div class="space-y-8 max-w-3xl mx-auto">
-                    <div>
-                        <div class="flex justify-between mb-2 text-sm font-bold uppercase tracking-widest text-gray-500">
-                            <span>[SCHOOL_NAME]</span>
-                            <span>Valid N=[VAL_TOTAL]</span>
-                        </div>
-                        <div class="flex h-12 w-full rounded-xl overflow-hidden shadow-inner">
-                            <div class="bg-green-500" style="width: [PCT_BALANCED]%;" title="Balanced"></div>
-                            <div class="bg-blue-500" style="width: [PCT_MILD]%;" title="Mild"></div>
-                            <div class="bg-yellow-500" style="width: [PCT_MOD]%;" title="Moderate"></div>
-                            <div class="bg-orange-500" style="width: [PCT_HIGH]%;" title="High"></div>
-                            <div class="bg-red-500" style="width: [PCT_SEVERE]%;" title="Severe"></div>
-                        </div>
-                    </div>
-                    <div>
-                        <div class="flex justify-between mb-2 text-sm font-bold uppercase tracking-widest text-gray-500">
-                            <span>National Average Benchmark Range</span>
-                            <span>Estimated Ranges</span>
-                        </div>
-                        <div class="flex h-12 w-full rounded-xl overflow-hidden shadow-inner opacity-70 grayscale-[0.2]">
-                            <div class="bg-green-500/80" style="width: 15%;" title="Balanced (Est)"></div>
-                            <div class="bg-blue-500/80" style="width: 35%;" title="Mild (Est)"></div>
-                            <div class="bg-yellow-500/80" style="width: 35%;" title="Moderate (Est)"></div>
-                            <div class="bg-orange-500/80" style="width: 10%;" title="High (Est)"></div>
-                            <div class="bg-red-500/80" style="width: 5%;" title="Severe (Est)"></div>
-                        </div>
-                    </div>
-                    <div class="flex flex-wrap justify-center gap-6 text-xs font-bold text-gray-500 uppercase">
-                        <div class="flex items-center"><span class="legend-dot bg-green-500"></span> Balanced</div>
-                        <div class="flex items-center"><span class="legend-dot bg-blue-500"></span> Mild</div>
-                        <div class="flex items-center"><span class="legend-dot bg-yellow-500"></span> Moderate</div>
-                        <div class="flex items-center"><span class="legend-dot bg-orange-500"></span> High</div>
-                        <div class="flex items-center"><span class="legend-dot bg-red-500"></span> Severe</div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="mb-12">
-                <h3 class="text-2xl font-bold text-navy mb-10 text-center">Key Stress Indicator Comparison</h3>
-                <div class="grid grid-cols-1 gap-8">
-                    <div>
-                        <div class="flex justify-between text-sm font-bold text-gray-600 mb-2">
-                            <span>Exam Anxiety (Frequent Nervousness)</span>
-                            <div class="flex gap-4">
-                                <span class="text-blue-600">School: [PCT_ANXIETY]%</span>
-                                <span class="text-gray-400">National: 81%</span>
-                            </div>
-                        </div>
-                        <div class="chart-bar-bg">
-                            <div class="chart-bar-fill bg-blue-600" style="width: [PCT_ANXIETY]%;"></div>
-                            <div class="absolute top-0 bottom-0 w-1 bg-red-400 border-x border-white" style="left: 81%;"></div>
-                        </div>
-                    </div>
-                    <div>
-                        <div class="flex justify-between text-sm font-bold text-gray-600 mb-2">
-                            <span>Parental Performance Pressure</span>
-                            <div class="flex gap-4">
-                                <span class="text-blue-600">School: [PCT_PARENT_PRESSURE]%</span>
-                                <span class="text-gray-400">National: 66%</span>
-                            </div>
-                        </div>
-                        <div class="chart-bar-bg">
-                            <div class="chart-bar-fill bg-blue-600" style="width: [PCT_PARENT_PRESSURE]%;"></div>
-                            <div class="absolute top-0 bottom-0 w-1 bg-red-400 border-x border-white" style="left: 66%;"></div>
-                        </div>
-                    </div>
-                    <div>
-                        <div class="flex justify-between text-sm font-bold text-gray-600 mb-2">
-                            <span>Support Accessibility (Can talk to teachers/counselors)</span>
-                            <div class="flex gap-4">
-                                <span class="text-blue-600">School: [PCT_SUPPORT]%</span>
-                                <span class="text-gray-400">National: 28%</span>
-                            </div>
-                        </div>
-                        <div class="chart-bar-bg">
-                            <div class="chart-bar-fill bg-green-500" style="width: [PCT_SUPPORT]%;"></div>
-                            <div class="absolute top-0 bottom-0 w-1 bg-red-400 border-x border-white" style="left: 28%;"></div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="p-10 border border-blue-50 rounded-2xl bg-blue-50/20">
-                <h3 class="text-2xl font-bold text-navy mb-6">Interpretation & Insights</h3>
-                <div class="grid grid-cols-1 md:grid-cols-2 gap-10">
-                    <div class="space-y-4">
-                        <div class="p-4 bg-white rounded-xl">
-                            <h4 class="text-green-700 font-bold flex items-center gap-2 mb-2">Strengths vs. National Trend</h4>
-                            <p class="text-sm text-gray-600 leading-relaxed">[INSIGHT_STRENGTHS]</p>
-                        </div>
-                    </div>
-                    <div class="space-y-4">
-                        <div class="p-4 bg-white rounded-xl">
-                            <h4 class="text-orange-700 font-bold flex items-center gap-2 mb-2">Points of Intervention</h4>
-                            <p class="text-sm text-gray-600 leading-relaxed">[INSIGHT_WEAKNESS]</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </section>
-
-        <footer class="text-center p-12 text-gray-400 text-xs mt-12">
-            <div class="flex justify-center mb-8">
-                <img src="https://i.ibb.co/jP5j8vf8/Screenshot-2026-01-30-at-5-16-07-PM.png" alt="Logo Small" class="h-8 grayscale opacity-30">
-            </div>
-            <p class="uppercase tracking-widest mb-2 font-bold">&copy; 2026 EDXSO Survey Reports</p>
-            <p>[SCHOOL_NAME] — Student Assessment Experience</p>
-        </footer>
-
-    </div>
-
-    <div class="fixed top-0 left-0 w-full h-1 z-50">
-        <div id="progress-bar" class="h-full bg-blue-600 w-0 transition-all duration-150"></div>
-    </div>
-    <script>
-        window.onscroll = function() {
-            var winScroll = document.body.scrollTop || document.documentElement.scrollTop;
-            var height = document.documentElement.scrollHeight - document.documentElement.clientHeight;
-            var scrolled = (winScroll / height) * 100;
-            document.getElementById("progress-bar").style.width = scrolled + "%";
-        };
-    </script>
-</body>
-</html>
-"""
-
-# --- HELPER FUNCTIONS ---
-
-def generate_insights_with_gemini(api_key, stats, school_name):
+def session_survey(uploaded_file, frame_cache, profiler, group_names):
     """
-    Uses Gemini API to generate the Executive Summary and Insights.
+    The scored upload, kept in the session so reruns (e.g. switching the
+    previewed school) do not parse it again. Previews, the stats table and
+    the rollup are reset whenever a different file is uploaded or other
+    grouping columns are named. The upload is validated before scoring;
+    problems are shown by show_validation().
     """
-    if not api_key:
-        return {
-            "p1": "The students exhibited a diverse range of emotional responses to assessment stimuli. Data indicates significant variance in stress levels compared to national averages.",
-            "p2": "Detailed analysis suggests that while some students possess robust coping mechanisms, a notable segment requires targeted intervention to manage evaluation-related anxiety.",
-            "key_finding": "Moderate Correlation between Preparation and Panic.",
-            "conclusion": "Implementing structured mentorship programs is recommended.",
-            "quote": "Success is not final, failure is not fatal: it is the courage to continue that counts.",
-            "strengths": f"The school shows a Support Accessibility score of {stats['support_pct']:.1f}%, which differs from the national benchmark. This indicates a unique school culture regarding teacher-student interaction.",
-            "weaknesses": f"Exam anxiety is recorded at {stats['anxiety_pct']:.1f}%. Addressing this through mindfulness and mock-test desensitization could improve overall well-being."
-        }
-    
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        prompt = f"""
-        ROLE: Expert Education Data Analyst.
-        TASK: Write report sections for School: "{school_name}".
-        DATA:
-        - Total Students: {stats['count']}
-        - Balanced: {stats['balanced']} ({stats['pct_balanced']}%)
-        - Mild Stress: {stats['mild']} ({stats['pct_mild']}%)
-        - Moderate Stress: {stats['moderate']} ({stats['pct_moderate']}%)
-        - High Stress: {stats['high']} ({stats['pct_high']}%)
-        - Severe Stress: {stats['severe']} ({stats['pct_severe']}%)
-        - Exam Anxiety: {stats['anxiety_pct']}% (National: 81%)
-        - Parental Pressure: {stats['parent_pressure_pct']}% (National: 66%)
-        - Support Accessibility: {stats['support_pct']}% (National: 28%)
-
-        OUTPUT FORMAT (JSON):
-        {{
-            "p1": "Executive Summary Paragraph 1 (Overview of participation and general mood)",
-            "p2": "Executive Summary Paragraph 2 (Deep dive into stress distribution)",
-            "key_finding": "One punchy key finding headline",
-            "conclusion": "One sentence strategic conclusion",
-            "quote": "A relevant, inspiring quote for students",
-            "strengths": "Insight on Strengths (Compare School vs National data)",
-            "weaknesses": "Insight on Points of Intervention (Compare School vs National data)"
-        }}
-        """
-        response = model.generate_content(prompt)
-        # In a real app, use json parsing. Here we fallback to text if json fails or use regex.
-        # For robustness in this demo, we'll assume the prompt returns clean text or we use the fallback.
-        # Simple extraction logic (placeholder for robust JSON handling):
-        import json
-        text = response.text.replace("```json", "").replace("```", "")
-        return json.loads(text)
-        
-    except Exception as e:
-        return {
-            "p1": "Analysis generation failed (API Error).",
-            "p2": "Please check API Key or try again.",
-            "key_finding": "Data Processing Complete",
-            "conclusion": "Review numerical data below.",
-            "quote": "Data speaks for itself.",
-            "strengths": "N/A",
-            "weaknesses": "N/A"
-        }
-
-def process_data(df, api_key):
-    # Map responses
-    scale_map = {'Never': 1, 'Rarely': 2, 'Sometimes': 3, 'Often': 4, 'Always': 5}
-    reverse_map = {'Never': 5, 'Rarely': 4, 'Sometimes': 3, 'Often': 2, 'Always': 1}
-
-    # Identify Question Columns (Indices 8 to 27 based on user file)
-    cols = df.columns.tolist()
-    # Ensure we have the right columns
-    if len(cols) < 28:
-        st.error("CSV format incorrect. Expected at least 28 columns.")
-        return []
-
-    # Scoring Logic
-    def calculate_score(row):
-        score = 0
-        # Q1-Q16 (Standard) -> Index 8 to 23
-        for i in range(8, 24):
-            val = row[cols[i]]
-            score += scale_map.get(val, 3)
-        # Q17-Q20 (Reverse) -> Index 24 to 27
-        for i in range(24, 28):
-            val = row[cols[i]]
-            score += reverse_map.get(val, 3)
-        return score
-
-    df['total_score'] = df.apply(calculate_score, axis=1)
-    
-    # Categorization
-    def get_category(s):
-        if s <= 36: return 'Balanced'
-        elif s <= 52: return 'Mild'
-        elif s <= 68: return 'Moderate'
-        elif s <= 84: return 'High'
-        else: return 'Severe'
-        
-    df['category'] = df['total_score'].apply(get_category)
-
-    reports = []
-    schools = df['sname'].unique()
-    
-    progress_bar = st.progress(0)
-    
-    for idx, school in enumerate(schools):
-        if pd.isna(school): continue
-        
-        sdf = df[df['sname'] == school]
-        total = len(sdf)
-        if total == 0: continue
-
-        # Stats
-        cats = sdf['category'].value_counts()
-        stats = {
-            'count': total,
-            'balanced': cats.get('Balanced', 0),
-            'mild': cats.get('Mild', 0),
-            'moderate': cats.get('Moderate', 0),
-            'high': cats.get('High', 0),
-            'severe': cats.get('Severe', 0),
-            # Percentages
-            'pct_balanced': round(cats.get('Balanced', 0)/total*100, 1),
-            'pct_mild': round(cats.get('Mild', 0)/total*100, 1),
-            'pct_moderate': round(cats.get('Moderate', 0)/total*100, 1),
-            'pct_high': round(cats.get('High', 0)/total*100, 1),
-            'pct_severe': round(cats.get('Severe', 0)/total*100, 1),
-            # Indicators
-            'anxiety_pct': round(len(sdf[sdf[cols[8]].isin(['Often', 'Always'])]) / total * 100, 1),
-            'parent_pressure_pct': round(len(sdf[sdf[cols[12]].isin(['Often', 'Always'])]) / total * 100, 1),
-            'support_pct': round(len(sdf[sdf[cols[26]].isin(['Often', 'Always'])]) / total * 100, 1)
-        }
-
-        # Generate AI Content
-        ai_content = generate_insights_with_gemini(api_key, stats, school)
-
-        # Fill Template
-        html = HTML_TEMPLATE
-        
-        # Replacements
-        replacements = {
-            "[SCHOOL_NAME]": str(school),
-            "[EST_YEAR]": "2024",
-            "[MODE]": "Online Survey",
-            "[COUNT]": str(stats['count']),
-            
-            # Exec Summary
-            "[EXEC_SUMMARY_P1]": ai_content.get("p1", ""),
-            "[EXEC_SUMMARY_P2]": ai_content.get("p2", ""),
-            "[EXEC_SUMMARY_KEY_FINDING]": ai_content.get("key_finding", ""),
-            "[EXEC_SUMMARY_CONCLUSION]": ai_content.get("conclusion", ""),
-            "[INSERT_KEY_QUOTE]": ai_content.get("quote", ""),
-            
-            # Scoring Table Placeholder
-            "[INSERT_FULL_SCORING_TABLE_FROM_USER_PROMPT]": """
-            <div class="grid grid-cols-5 gap-2 text-center text-xs font-medium text-gray-500">
-                <div class="bg-green-100 p-2 rounded">20-36<br>Balanced</div>
-                <div class="bg-blue-100 p-2 rounded">37-52<br>Mild</div>
-                <div class="bg-yellow-100 p-2 rounded">53-68<br>Moderate</div>
-                <div class="bg-orange-100 p-2 rounded">69-84<br>High</div>
-                <div class="bg-red-100 p-2 rounded">85-100<br>Severe</div>
-            </div>
-            """,
-
-            # Values
-            "[VAL_BALANCED]": str(stats['balanced']),
-            "[PCT_BALANCED]": str(stats['pct_balanced']),
-            "[VAL_MILD]": str(stats['mild']),
-            "[PCT_MILD]": str(stats['pct_mild']),
-            "[VAL_MOD]": str(stats['moderate']),
-            "[PCT_MOD]": str(stats['pct_moderate']),
-            "[VAL_HIGH]": str(stats['high']),
-            "[PCT_HIGH]": str(stats['pct_high']),
-            "[VAL_SEVERE]": str(stats['severe']),
-            "[PCT_SEVERE]": str(stats['pct_severe']),
-            "[VAL_TOTAL]": str(stats['count']),
-            
-            # Indicators
-            "[PCT_ANXIETY]": str(stats['anxiety_pct']),
-            "[PCT_PARENT_PRESSURE]": str(stats['parent_pressure_pct']),
-            "[PCT_SUPPORT]": str(stats['support_pct']),
-            
-            # Insights
-            "[INSIGHT_STRENGTHS]": ai_content.get("strengths", ""),
-            "[INSIGHT_WEAKNESS]": ai_content.get("weaknesses", "")
-        }
-
-        for key, val in replacements.items():
-            html = html.replace(key, str(val))
-            
-        reports.append((f"{school}_Report.html", html))
-        progress_bar.progress((idx + 1) / len(schools))
-
-    return reports
+    upload_key = (uploaded_file.name, uploaded_file.size, group_names)
+    session = st.session_state
+    if session.get('upload_key') != upload_key:
+        validator = SurveyValidator(fail_fast=False)
+        df = load_scored_survey(uploaded_file, frame_cache=frame_cache, callbacks=StreamlitCallbacks(),
+                                profiler=profiler, validator=validator, group_names=group_names)
+        if df is None:
+            return None
+        session['upload_key'] = upload_key
+        session['group_names'] = group_names
+        session['survey'] = df
+        session['validation'] = validator.report
+        session['stats_table'] = None
+        session['rollup'] = None
+        session['previews'] = {}
+    return session['survey']
+
+
+def show_validation(report):
+    """
+    Lists validation problems. Returns False while errors are present and
+    the user has not chosen to continue.
+    """
+    for warning in report.warnings:
+        st.warning(warning)
+    with st.expander("Answer check per question"):
+        st.dataframe([{'question': col, 'unrecognised or blank': f"{rate:.1%}"}
+                      for col, rate in report.unknown_rates.items()], use_container_width=True)
+    if report.ok:
+        return True
+    st.error("This upload has problems that would make answers score as neutral:\n\n"
+             + "\n".join(f"- {error}" for error in report.errors))
+    return st.checkbox("Continue anyway", value=False)
+
+
+def session_stats_table(df):
+    session = st.session_state
+    if session['stats_table'] is None:
+        session['stats_table'] = school_stats_table(df)
+    return session['stats_table']
+
+
+def session_rollup(df):
+    session = st.session_state
+    if session['rollup'] is None:
+        session['rollup'] = survey_rollup(df, session['group_names'])
+    return session['rollup']
+
+
+def choose_peer_level(df):
+    """
+    Peer group each report is compared against: None (national figures
+    only), a grouping column found in the upload, or every school in it.
+    """
+    rollup = session_rollup(df)
+    labels = {None: "National benchmarks only", 'overall': "All schools in this upload"}
+    labels.update({level: f"Schools in the same {level}" for level in rollup.levels})
+    options = [None] + rollup.levels + ['overall']
+    return st.selectbox("Compare each school against", options, format_func=labels.get)
+
+
+def show_stats_export(df):
+    with st.expander("Statistics only (CSV / JSON Lines / Parquet)"):
+        st.caption("Per-school counts, category shares and key indicators, without AI text or HTML.")
+        extension = st.selectbox("Format", [".csv", ".jsonl", ".parquet"])
+        national = st.checkbox("Include differences from the national benchmarks", value=False)
+        rollups = st.checkbox("Add rows per grouping level and for all schools", value=False)
+        file_name = f"school_stats{extension}"
+        if rollups:
+            table = rollup_export_table(session_rollup(df), national=national)
+        else:
+            table = stats_export_table(session_stats_table(df), national=national)
+        buffer = io.BytesIO()
+        try:
+            write_stats(table, buffer, stats_format(file_name))
+        except ImportError:
+            st.error("Parquet export needs pyarrow (pip install pyarrow).")
+            return
+        st.download_button("Download statistics", data=buffer.getvalue(), file_name=file_name,
+                           mime="application/octet-stream")
+
+
+def show_preview(df, api_key, use_cache, peer_level, ai_schools=None):
+    session = st.session_state
+    stats_table = session_stats_table(df)
+
+    school = st.selectbox("Preview one school's report", options=list(stats_table.index), index=None,
+                          placeholder="Choose a school")
+    if school is None:
+        return
+    # Whether this school goes to Gemini, so changing the selection re-renders it
+    uses_ai = bool(api_key) and (ai_schools is None or str(school) in ai_schools)
+    key = (school, uses_ai, peer_level)
+    if key not in session['previews']:
+        peer = session_rollup(df).peer_stats(school, peer_level) if peer_level else None
+        with st.spinner(f"Rendering {school}..."):
+            session['previews'][key] = preview_report(stats_table, school, api_key, use_cache=use_cache,
+                                                      peer=peer, ai_schools=ai_schools)
+    stats, html = session['previews'][key]
+
+    cols = st.columns(4)
+    cols[0].metric("Students", stats['count'])
+    cols[1].metric("Exam anxiety", f"{stats['anxiety_pct']}%")
+    cols[2].metric("Parental pressure", f"{stats['parent_pressure_pct']}%")
+    cols[3].metric("Support accessibility", f"{stats['support_pct']}%")
+    components.html(html, height=900, scrolling=True)
+    st.download_button("Download this report", data=html, file_name=f"{school}_Report.html",
+                       mime="text/html")
+
+
+def show_profile(profiler):
+    with st.expander("Pipeline profile", expanded=True):
+        st.dataframe([dict(stage=name, **total) for name, total in profiler.stage_totals().items()],
+                     use_container_width=True)
+        latency = profiler.latency_percentiles()
+        if latency:
+            st.dataframe([dict(name=name, **pct) for name, pct in latency.items()], use_container_width=True)
+        st.text(profiler.summary())
+        st.download_button("Download profile (JSON)", data=profiler.to_json(),
+                           file_name="pipeline_profile.json", mime="application/json")
+        st.download_button("Download Chrome trace", data=json.dumps(profiler.chrome_trace()),
+                           file_name="pipeline_trace.json", mime="application/json")
+        if profiler.profile is not None:
+            st.code(profiler.profile_report())
+
+
+@st.cache_resource
+def job_runner():
+    return JobRunner(frame_cache=SurveyFrameCache())
+
+
+def poll(fn):
+    """
+    Re-runs `fn` every couple of seconds on Streamlit versions with
+    fragments; older versions refresh on the next interaction.
+    """
+    fragment = getattr(st, 'fragment', None)
+    return fragment(run_every=JOB_POLL_SECONDS)(fn) if fragment else fn
+
+
+@poll
+def show_job_progress(runner, job_id):
+    job = runner.status(job_id)
+    total = job['total'] or "?"
+    st.progress(min(job['progress'], 1.0), text=f"{job['done']}/{total} schools: {job['message'] or job['status']}")
+    if job['error']:
+        st.error(job['error'])
+    # Redraw the whole page once the job stops so the download and resume buttons appear
+    seen = st.session_state.setdefault('job_status_seen', {})
+    if seen.get(job_id) in ACTIVE_STATUSES and job['status'] not in ACTIVE_STATUSES:
+        seen[job_id] = job['status']
+        st.rerun()
+    seen[job_id] = job['status']
+
+
+def build_job_export(runner, job_id, export_options, profiler):
+    """
+    One zip (file path, report count) or, with `shard_schools`, zip
+    shards in a temp directory (directory, index) for a finished job. Both
+    live in the job's directory, so they are removed with the job if the
+    session ends before discard_job_export(). The zip is a real file, as
+    st.download_button takes an open file but not a spooled temp file.
+    """
+    options = dict(export_options)
+    shard_schools = options.pop('shard_schools')
+    with st.spinner("Compressing reports..."), profiler.stage('export'):
+        if shard_schools:
+            out_dir = tempfile.mkdtemp(prefix="report_shards_", dir=runner.store.job_dir(job_id))
+            return 'shards', out_dir, write_report_shards(runner.store.reports(job_id), out_dir,
+                                                         max_schools=shard_schools, **options)
+        fd, path = tempfile.mkstemp(prefix="school_reports_", suffix=".zip", dir=runner.store.job_dir(job_id))
+        os.close(fd)
+        return 'zip', path, write_report_zip(runner.store.reports(job_id), path, **options)
+
+
+def discard_job_export(export):
+    kind, target, _ = export
+    if kind == 'shards':
+        shutil.rmtree(target, ignore_errors=True)
+    elif os.path.exists(target):
+        os.remove(target)
+
+
+def show_job_downloads(export):
+    kind, target, result = export
+    if kind == 'zip':
+        st.success(f"Generated {result} reports!")
+        with open(target, "rb") as f:
+            st.download_button(
+                label="Download All Reports (ZIP)",
+                data=f,
+                file_name="school_reports.zip",
+                mime="application/zip"
+            )
+        return
+    st.success(f"Generated {len(result['schools'])} reports in {len(result['shards'])} parts.")
+    for shard in result['shards']:
+        with open(os.path.join(target, shard['file']), "rb") as f:
+            st.download_button(f"Download {shard['file']} ({shard['reports']} schools)", data=f,
+                               file_name=shard['file'], mime="application/zip", key=shard['file'])
+    st.download_button("Download index (which part holds each school)", data=json.dumps(result, indent=1),
+                       file_name="school_reports-index.json", mime="application/json")
+
+
+def choose_ai_schools(df):
+    """
+    None to use Gemini for every school, otherwise the schools picked for
+    Gemini; all others get local insights.
+    """
+    scope = st.selectbox("Use Gemini for", ["All schools", "Selected schools only"])
+    if scope != "Selected schools only":
+        return None
+    schools = [str(school) for school in session_stats_table(df).index]
+    return st.multiselect("Schools written with Gemini (the rest use local insights)", schools)
+
+
+def show_upgrade(runner, job_id, api_key):
+    """
+    Rewrites chosen schools of a finished job with Gemini insights, keeping
+    every other report.
+    """
+    with st.expander("Upgrade selected schools to Gemini insights"):
+        if not api_key:
+            st.info("Enter the API key above to rewrite selected schools with Gemini.")
+            return
+        schools = sorted(runner.store.completed(job_id, include_ai_errors=True))
+        chosen = st.multiselect("Schools to rewrite", schools)
+        if chosen and st.button("Rewrite with Gemini"):
+            runner.upgrade(job_id, api_key, chosen)
+            st.rerun()
+
+
+def show_jobs(runner, api_key, export_options, profile):
+    jobs = runner.store.recent()
+    if not jobs:
+        return
+    st.subheader("Report jobs")
+    ids = [job['id'] for job in jobs]
+    labels = {job['id']: f"{job['filename']} ({time.strftime('%d %b %H:%M', time.localtime(job['created']))})"
+              for job in jobs}
+    current = st.session_state.get('job_id')
+    job_id = st.selectbox("Job", ids, index=ids.index(current) if current in ids else 0,
+                          format_func=labels.get)
+    st.session_state['job_id'] = job_id
+
+    show_job_progress(runner, job_id)
+    job = runner.status(job_id)
+    if job['status'] in ACTIVE_STATUSES:
+        if st.button("Cancel job"):
+            runner.cancel(job_id)
+        return
+
+    if st.button("Delete job"):
+        runner.store.delete(job_id)
+        st.session_state.pop('job_id', None)
+        st.rerun()
+
+    retry_ai = job['status'] == 'done' and job['uses_ai'] and runner.store.ai_error_count(job_id)
+    if job['status'] != 'done' or retry_ai:
+        if job['uses_ai'] and not api_key:
+            st.warning("This job used AI insights; enter the API key above before resuming.")
+        if st.button("Resume job" if job['status'] != 'done' else "Retry failed AI insights"):
+            runner.resume(job_id, api_key)
+            st.rerun()
+
+    if job['status'] == 'done':
+        show_upgrade(runner, job_id, api_key)
+        profiler = runner.profilers.get(job_id) or PipelineProfiler()
+        # Kept in the session so polling reruns do not re-compress the batch
+        key = (job_id, job['updated'], tuple(sorted(export_options.items())))
+        if st.session_state.get('job_archive_key') != key:
+            previous = st.session_state.get('job_archive')
+            if previous:
+                discard_job_export(previous)
+            st.session_state['job_archive'] = build_job_export(runner, job_id, export_options, profiler)
+            st.session_state['job_archive_key'] = key
+        show_job_downloads(st.session_state['job_archive'])
+        if profile and job_id in runner.profilers:
+            show_profile(profiler)
+
 
 # --- MAIN UI ---
 st.title("Education Data Analyst: School Report Generator")
@@ -555,29 +338,64 @@ st.markdown("Upload your survey Excel/CSV, enter your API key, and generate Gold
 api_key = st.text_input("Enter Gemini API Key (Optional for AI Insights)", type="password")
 uploaded_file = st.file_uploader("Upload Survey Data (Excel/CSV)", type=['xlsx', 'csv'])
 
+with st.expander("Advanced settings"):
+    max_workers = st.number_input("Concurrent AI requests", min_value=1, max_value=64,
+                                  value=DEFAULT_INSIGHT_WORKERS, step=1)
+    requests_per_minute = st.number_input("AI requests per minute", min_value=1,
+                                          value=DEFAULT_REQUESTS_PER_MINUTE, step=10)
+    tokens_per_minute = st.number_input("AI tokens per minute", min_value=1000,
+                                        value=DEFAULT_TOKENS_PER_MINUTE, step=10000)
+    batch_size = st.number_input("Schools per AI request (1 = one request per school)",
+                                 min_value=1, max_value=50, value=1, step=1)
+    use_cache = st.checkbox("Reuse cached AI insights for unchanged schools", value=True)
+    if st.button("Clear AI insight cache"):
+        cache = InsightCache()
+        cache.clear()
+        cache.close()
+        st.success("AI insight cache cleared.")
+    group_names = group_column_names(st.text_input(
+        "Grouping columns for peer comparisons and rollups (comma-separated, coarsest first)",
+        value=", ".join(GROUP_COLUMN_NAMES)))
+    use_frame_cache = st.checkbox("Reuse parsed data for previously uploaded files", value=True)
+    if st.button("Clear parsed-data cache"):
+        SurveyFrameCache().clear()
+        st.success("Parsed-data cache cleared.")
+    render_workers = st.number_input("Render worker processes", min_value=1, max_value=64, value=1, step=1)
+    compresslevel = st.slider("ZIP compression level (0 = store only)", min_value=0, max_value=9,
+                              value=DEFAULT_COMPRESSION_LEVEL)
+    codec = st.selectbox("ZIP codec (bzip2/lzma are smaller but slower)", list(ZIP_CODECS))
+    shard_schools = st.number_input("Schools per download part (0 = one ZIP)", min_value=0, value=0, step=100)
+    bundle_assets = st.checkbox("Share one offline stylesheet across reports (smaller ZIP, no CDN needed)",
+                                value=False)
+    show_timings = st.checkbox("Show pipeline timing profile", value=False)
+    use_cprofile = st.checkbox("Profile the per-school loop with cProfile (slower)", value=False)
+
 if uploaded_file:
-    if uploaded_file.name.endswith('.csv'):
-        df = pd.read_csv(uploaded_file)
-    else:
-        df = pd.read_excel(uploaded_file)
-        
+    frame_cache = SurveyFrameCache() if use_frame_cache else None
+    profiler = PipelineProfiler(cprofile=use_cprofile)
+    df = session_survey(uploaded_file, frame_cache, profiler, group_names)
+    if df is None:
+        st.stop()
+
     st.write(f"Loaded data: {len(df)} rows. Found {df['sname'].nunique()} schools.")
-    
-    if st.button("Generate Reports"):
-        with st.spinner("Processing data & querying AI..."):
-            reports = process_data(df, api_key)
-            
-            # Zip
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w") as zf:
-                for name, content in reports:
-                    zf.writestr(name, content)
-            
-            st.success(f"Generated {len(reports)} reports!")
-            st.download_button(
-                label="Download All Reports (ZIP)",
-                data=zip_buffer.getvalue(),
-                file_name="school_reports.zip",
-                mime="application/zip"
+    if not show_validation(st.session_state['validation']):
+        st.stop()
 
-            )
+    peer_level = choose_peer_level(df)
+    ai_schools = choose_ai_schools(df) if api_key else None
+    show_preview(df, api_key, use_cache, peer_level, ai_schools)
+    show_stats_export(df)
+
+    if st.button("Generate Reports"):
+        # Runs on a background thread; progress survives reruns and closed tabs
+        st.session_state['job_id'] = job_runner().submit(
+            uploaded_file, uploaded_file.name, api_key, profiler=profiler,
+            max_workers=int(max_workers), requests_per_minute=int(requests_per_minute),
+            tokens_per_minute=int(tokens_per_minute), use_cache=use_cache, batch_size=int(batch_size),
+            render_workers=int(render_workers), peer_level=peer_level, ai_schools=ai_schools,
+            group_names=list(group_names),
+        )
+
+export_options = dict(compresslevel=compresslevel, codec=codec, bundle_assets=bundle_assets,
+                      shard_schools=int(shard_schools))
+show_jobs(job_runner(), api_key, export_options, show_timings or use_cprofile)
@@ -0,0 +1,65 @@
+"""
+Load time and peak memory of a plain pd.read_csv/read_excel vs the lean reader.
+
+    python benchmarks/ingest_benchmark.py [--rows N] [--xlsx]
+
+The file is generated and each loader run in fresh subprocesses, so peak
+RSS is measured per loader (Linux carries ru_maxrss across fork+exec).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from synthetic import write_survey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_generator.ingest import peak_rss_mb, read_survey
+
+
+def measure(loader, path):
+    started = time.perf_counter()
+    if loader == 'plain':
+        df = pd.read_csv(path) if path.endswith('.csv') else pd.read_excel(path)
+    else:
+        df = read_survey(path)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak_rss_mb(),
+                      'frame_mb': df.memory_usage(deep=True).sum() / (1024 * 1024)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--xlsx", action="store_true", help="benchmark an Excel file instead of CSV")
+    parser.add_argument("--measure", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--write", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+    if args.write:
+        write_survey(args.write, args.rows)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "survey.xlsx" if args.xlsx else "survey.csv")
+        subprocess.run([sys.executable, __file__, "--write", path, "--rows", str(args.rows)], check=True)
+        print(f"{args.rows:,} rows, {os.path.getsize(path) / (1024 * 1024):,.0f} MB on disk")
+        for loader in ('plain', 'lean'):
+            out = subprocess.run([sys.executable, __file__, "--measure", loader, path],
+                                 check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{loader:>6}: {result['seconds']:6.2f}s  peak RSS {result['peak_rss_mb'] or 0:8,.0f} MB  "
+                  f"frame {result['frame_mb']:8,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
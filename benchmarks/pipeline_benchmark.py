@@ -0,0 +1,174 @@
+"""
+End-to-end pipeline timings (score, aggregate, insights, render, zip) on
+synthetic uploads, with a stub insight model so no network is used.
+
+    python benchmarks/pipeline_benchmark.py --save before.json
+    python benchmarks/pipeline_benchmark.py --compare before.json --fail-on-regression
+    python benchmarks/pipeline_benchmark.py --scales 1000x10,100000x1000 --repeat 5
+
+Each stage's best time over `--repeat` runs is reported. Results saved with
+--save carry the git revision and library versions, and --compare flags
+stages that got slower than the baseline by more than --threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import types
+
+import numpy as np
+import pandas as pd
+from synthetic import make_survey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_generator.batching import INSIGHT_KEYS
+from report_generator.export import write_report_archive
+from report_generator.pipeline import process_data
+from report_generator.profiling import PipelineProfiler
+
+SCALES = ((1_000, 10), (10_000, 100), (100_000, 1_000), (1_000_000, 10_000))
+STAGES = ('score', 'aggregate', 'insights', 'render', 'zip')
+# Stages faster than this in the baseline are too noisy to flag.
+NOISE_FLOOR_S = 0.005
+
+
+class StubInsightModel:
+    """
+    Stands in for the Gemini model: answers every prompt with a fixed,
+    valid insight JSON after an optional simulated latency.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.text = json.dumps({key: f"Benchmark {key} text." for key in INSIGHT_KEYS})
+
+    def generate_content(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return types.SimpleNamespace(text=self.text)
+
+
+def parse_scales(text):
+    scales = []
+    for item in text.split(','):
+        rows, schools = item.lower().split('x')
+        scales.append((int(rows), int(schools)))
+    return scales
+
+
+def run_scale(rows, schools, args):
+    df = make_survey(rows, schools, skew=args.skew, unknown_rate=args.unknown_rate, seed=args.seed)
+    best = dict.fromkeys(STAGES, float('inf'))
+    for _ in range(args.repeat):
+        profiler = PipelineProfiler()
+        reports = process_data(
+            df.copy(), "", model=StubInsightModel(args.insight_latency), use_cache=False,
+            max_workers=args.workers, requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12,
+            profiler=profiler,
+        )
+        with profiler.stage('zip'):
+            archive, count = write_report_archive(reports)
+        archive.close()
+        totals = profiler.stage_totals()
+        # The zip stage drives the report generator, so only its own time counts
+        timings = {stage: totals[stage]['wall_s'] for stage in STAGES if stage != 'zip'}
+        timings['zip'] = totals['zip']['self_s']
+        for stage, seconds in timings.items():
+            best[stage] = min(best[stage], seconds)
+    return {'rows': rows, 'schools': schools, 'reports': count, 'seconds': best}
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                                  capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+        'platform': platform.platform(), 'cpus': os.cpu_count(),
+    }
+
+
+def print_header():
+    print(f"{'rows':>10} {'schools':>8} " + " ".join(f"{stage:>10}" for stage in STAGES) + f" {'total':>10}")
+
+
+def print_result(result):
+    seconds = result['seconds']
+    print(f"{result['rows']:>10,} {result['schools']:>8,} "
+          + " ".join(f"{seconds[stage]:>9.3f}s" for stage in STAGES)
+          + f" {sum(seconds.values()):>9.3f}s")
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints new/old time ratios per stage; returns the regressions found.
+    """
+    previous = {(r['rows'], r['schools']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    print(f"\nvs {baseline['environment'].get('revision') or 'baseline'} (ratio new/old, * = slower by "
+          f"more than {threshold:.0%}):")
+    for result in results:
+        old = previous.get((result['rows'], result['schools']))
+        if old is None:
+            continue
+        cells = []
+        for stage in STAGES:
+            ratio = result['seconds'][stage] / old[stage] if old[stage] else float('nan')
+            slower = old[stage] >= NOISE_FLOOR_S and ratio > 1 + threshold
+            if slower:
+                regressions.append((result['rows'], result['schools'], stage, ratio))
+            cells.append(f"{ratio:>9.2f}{'*' if slower else ' '}")
+        print(f"{result['rows']:>10,} {result['schools']:>8,} " + " ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=parse_scales, default=SCALES,
+                        help="comma-separated ROWSxSCHOOLS list (default: 1k x 10 up to 1M x 10k)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skew", type=float, default=1.0, help="school size skew (0 = equal sizes)")
+    parser.add_argument("--unknown-rate", type=float, default=0.01, help="share of unrecognised answers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8, help="insight worker threads")
+    parser.add_argument("--insight-latency", type=float, default=0.0,
+                        help="simulated seconds per stub AI request")
+    parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved earlier")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown ratio flagged as a regression (default: %(default)s)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any stage regressed")
+    args = parser.parse_args()
+
+    results = []
+    print_header()
+    for rows, schools in args.scales:
+        results.append(run_scale(rows, schools, args))
+        print_result(results[-1])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({'environment': environment(), 'args': {k: v for k, v in vars(args).items()
+                                                               if k != 'scales'},
+                       'results': results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
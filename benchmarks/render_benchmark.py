@@ -0,0 +1,45 @@
+"""
+Per-report render cost: the legacy str.replace loop vs the precompiled template.
+
+    python benchmarks/render_benchmark.py [--reports N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_generator import rendering
+from report_generator.insights import offline_insights
+
+
+def legacy_render(school, stats, ai_content):
+    html = rendering.HTML_TEMPLATE
+    for key, val in rendering.report_replacements(school, stats, ai_content).items():
+        html = html.replace(key, str(val))
+    return html
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=2000)
+    args = parser.parse_args()
+
+    stats = {
+        'count': 412, 'balanced': 61, 'mild': 140, 'moderate': 131, 'high': 58, 'severe': 22,
+        'pct_balanced': 14.8, 'pct_mild': 34.0, 'pct_moderate': 31.8, 'pct_high': 14.1,
+        'pct_severe': 5.3, 'anxiety_pct': 77.4, 'parent_pressure_pct': 63.1, 'support_pct': 31.6,
+    }
+    ai_content = offline_insights(stats)
+    school = "Benchmark Public School"
+
+    assert legacy_render(school, stats, ai_content) == rendering.render_report(school, stats, ai_content)
+
+    for label, fn in (("str.replace loop", legacy_render), ("compiled template", rendering.render_report)):
+        seconds = min(timeit.repeat(lambda fn=fn: fn(school, stats, ai_content), number=args.reports, repeat=3))
+        print(f"{label:>18}: {seconds / args.reports * 1e6:8.1f} us/report")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Synthetic survey uploads shaped like the real export: 7 metadata columns,
+`sname`, 20 Likert answers and a free-text column.
+
+    python benchmarks/synthetic.py survey.csv --rows 100000 --schools 1000 --skew 1.0
+
+School sizes follow a Zipf-like distribution (`skew` 0 = equal sizes,
+larger = a few big schools and a long tail of small ones), and each school
+gets its own stress level so the categories differ between schools.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_generator.scoring import LIKERT_LEVELS
+
+ANSWERS = np.array(LIKERT_LEVELS, dtype=object)
+# Answers the scorer does not recognise, mixed in at `unknown_rate`.
+UNKNOWN_ANSWERS = np.array(['', 'always', 'Sometime'], dtype=object)
+COMMENTS = np.array(['', 'Exams make me anxious before results are announced.'], dtype=object)
+
+
+def school_weights(schools, skew=1.0):
+    ranks = np.arange(1, schools + 1, dtype=float)
+    weights = ranks ** -skew
+    return weights / weights.sum()
+
+
+def make_survey(rows, schools=100, skew=1.0, unknown_rate=0.0, seed=0):
+    """
+    DataFrame with `rows` responses spread over `schools` schools.
+    """
+    rng = np.random.default_rng(seed)
+    school_idx = rng.choice(schools, rows, p=school_weights(schools, skew))
+    # Per-school mean answer on the 0-4 scale, so schools land in different categories
+    tilt = rng.normal(2.0, 0.5, schools)
+    codes = np.clip(np.rint(rng.normal(tilt[school_idx, None], 1.1, (rows, 20))), 0, 4).astype(np.int8)
+    answers = ANSWERS[codes]
+    if unknown_rate:
+        mask = rng.random((rows, 20)) < unknown_rate
+        answers[mask] = rng.choice(UNKNOWN_ANSWERS, mask.sum())
+
+    data = {
+        'Timestamp': pd.date_range('2026-01-01', periods=rows, freq='s').astype(str),
+        'Email': [f"student{i}@example.org" for i in range(rows)],
+        'Name': [f"Student {i}" for i in range(rows)],
+        'Class': rng.integers(6, 13, rows),
+        'Section': rng.choice(np.array(list('ABCD'), dtype=object), rows),
+        'Gender': rng.choice(np.array(['F', 'M'], dtype=object), rows),
+        'City': rng.choice(np.array(['Delhi', 'Pune', 'Jaipur'], dtype=object), rows),
+        'sname': np.array([f"School {i}" for i in range(schools)], dtype=object)[school_idx],
+    }
+    for q in range(20):
+        data[f"Q{q + 1}"] = answers[:, q]
+    data['Comments'] = rng.choice(COMMENTS, rows)
+    return pd.DataFrame(data)
+
+
+def write_survey(path, rows, schools=1000, skew=1.0, unknown_rate=0.0, seed=0):
+    df = make_survey(rows, schools, skew=skew, unknown_rate=unknown_rate, seed=seed)
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="output .csv or .xlsx")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--schools", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--unknown-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_survey(args.path, args.rows, args.schools, args.skew, args.unknown_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
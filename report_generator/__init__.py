@@ -0,0 +1,67 @@
+"""
+Survey report generation library used by the Streamlit app and the CLI.
+
+Importing this package needs only pandas and numpy; Gemini is imported
+lazily when an API key is used.
+"""
+from .aggregation import (
+    NATIONAL_BENCHMARKS, STATS_COLUMNS, aggregate_school_stats, finalize_stats, national_deltas, partial_aggregates,
+    school_stats,
+)
+from .assets import AssetBundle, build_stylesheet
+from .batching import DEFAULT_BATCH_SIZE, InsightBatcher
+from .cache import CACHE_DIR, InsightCache, SurveyFrameCache, file_digest
+from .export import (
+    DEFAULT_CODEC, DEFAULT_COMPRESSION_LEVEL, ZIP_CODECS, rollup_export_table, stats_export_table, stats_format,
+    write_report_archive, write_report_directory, write_report_zip, write_stats,
+)
+from .incremental import generate_incremental, school_fingerprints
+from .ingest import read_survey
+from .insights import (
+    DEFAULT_INSIGHT_WORKERS, GEMINI_MODEL_NAME, generate_all_insights, generate_insights_with_gemini,
+    offline_insights,
+)
+from .jobs import JobRunner, JobStore
+from .narrative import NARRATIVE_VERSION, local_insights
+from .pipeline import (
+    PipelineCallbacks, check_peer_level, group_levels, load_scored_survey, preview_report, process_data,
+    school_stats_table, score_survey, survey_rollup,
+)
+from .profiling import PipelineProfiler
+from .providers import (
+    GeminiInsightProvider, InsightProvider, LocalInsightProvider, SelectiveInsightProvider, insight_provider,
+)
+from .ratelimit import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, RequestScheduler
+from .rendering import render_report
+from .rollups import Rollup
+from .scoring import GROUP_COLUMN_NAMES, group_column_names, group_columns
+from .shards import prefix_key, write_report_shards
+from .template import HTML_TEMPLATE
+from .validation import SurveyValidator, ValidationReport
+
+__all__ = [
+    'NATIONAL_BENCHMARKS', 'STATS_COLUMNS', 'aggregate_school_stats', 'finalize_stats', 'national_deltas',
+    'partial_aggregates', 'school_stats',
+    'AssetBundle', 'build_stylesheet',
+    'DEFAULT_BATCH_SIZE', 'InsightBatcher',
+    'CACHE_DIR', 'InsightCache', 'SurveyFrameCache', 'file_digest',
+    'DEFAULT_CODEC', 'DEFAULT_COMPRESSION_LEVEL', 'ZIP_CODECS', 'rollup_export_table', 'stats_export_table',
+    'stats_format', 'write_report_archive', 'write_report_directory', 'write_report_zip', 'write_stats',
+    'generate_incremental', 'school_fingerprints',
+    'read_survey',
+    'DEFAULT_INSIGHT_WORKERS', 'GEMINI_MODEL_NAME', 'generate_all_insights',
+    'generate_insights_with_gemini', 'offline_insights',
+    'JobRunner', 'JobStore',
+    'NARRATIVE_VERSION', 'local_insights',
+    'PipelineCallbacks', 'check_peer_level', 'group_levels', 'load_scored_survey', 'preview_report',
+    'process_data', 'school_stats_table', 'score_survey', 'survey_rollup',
+    'PipelineProfiler',
+    'GeminiInsightProvider', 'InsightProvider', 'LocalInsightProvider', 'SelectiveInsightProvider', 'insight_provider',
+    'DEFAULT_REQUESTS_PER_MINUTE', 'DEFAULT_TOKENS_PER_MINUTE', 'RequestScheduler',
+    'render_report',
+    'Rollup',
+    'GROUP_COLUMN_NAMES', 'group_column_names', 'group_columns',
+    'prefix_key', 'write_report_shards',
+    'HTML_TEMPLATE',
+    'SurveyValidator', 'ValidationReport',
+]
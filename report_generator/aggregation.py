@@ -0,0 +1,96 @@
+"""
+Per-school stats table built in a single aggregation pass. The pass
+produces integer partial counts per school, which add up exactly, so
+larger groupings can be built from them (see rollups.py).
+"""
+import numpy as np
+import pandas as pd
+
+from .scoring import LIKERT_LEVELS, QUESTION_START
+
+# Key indicators: share of students answering Often/Always on a single question.
+INDICATOR_QUESTIONS = {
+    'anxiety_pct': 8,           # Q1: exam nervousness
+    'parent_pressure_pct': 12,  # Q5: parental performance pressure
+    'support_pct': 26,          # Q19: can talk to teachers/counselors
+}
+FREQUENT_CODE = LIKERT_LEVELS.index('Often') + 1
+CATEGORY_KEYS = ['balanced', 'mild', 'moderate', 'high', 'severe']
+STATS_COLUMNS = (['count'] + CATEGORY_KEYS + ['pct_' + k for k in CATEGORY_KEYS]
+                 + list(INDICATOR_QUESTIONS))
+# Responses per category and per indicator; what partial_aggregates() counts.
+PARTIAL_COLUMNS = CATEGORY_KEYS + list(INDICATOR_QUESTIONS)
+# National figures quoted in the report template and the AI prompts.
+NATIONAL_BENCHMARKS = {
+    'pct_balanced': 15, 'pct_mild': 35, 'pct_moderate': 35, 'pct_high': 10, 'pct_severe': 5,
+    'anxiety_pct': 81, 'parent_pressure_pct': 66, 'support_pct': 28,
+}
+
+
+def _round_pct(part, total):
+    # Python's round() per value, as the original indicator formula did
+    # (np.round can differ on ties such as 1.05).
+    return [round(p / t * 100, 1) for p, t in zip(part, total)]
+
+
+def _round_category_pct(part, total):
+    # np.round, as the original category formula did: it divided numpy
+    # counts from value_counts(), so the result was a numpy float.
+    return np.round(part.to_numpy(dtype=np.float64) / total.to_numpy(dtype=np.float64) * 100, 1)
+
+
+def partial_aggregates(df, codes):
+    """
+    PARTIAL_COLUMNS counts per school (one row per school, in upload
+    order) from a single groupby over category dummies and indicator
+    flags. Rows with a blank sname are ignored; a categorical sname is fine.
+    """
+    flags = pd.get_dummies(df['category']).set_axis(CATEGORY_KEYS, axis=1)
+    for key, col_idx in INDICATOR_QUESTIONS.items():
+        flags[key] = codes[:, col_idx - QUESTION_START] >= FREQUENT_CODE
+    flags.index = df.index
+
+    sums = flags.groupby(df['sname'], sort=False, observed=True).sum()
+    if isinstance(sums.index, pd.CategoricalIndex):
+        sums.index = sums.index.astype(sums.index.categories.dtype)
+    return sums[PARTIAL_COLUMNS]
+
+
+def finalize_stats(partials):
+    """
+    Turns partial counts (for schools or any grouping of them) into the
+    stats table: totals, category counts and rounded percentages.
+    """
+    total = partials[CATEGORY_KEYS].sum(axis=1)
+    table = pd.DataFrame({'count': total}, index=partials.index)
+    for key in CATEGORY_KEYS:
+        table[key] = partials[key]
+    for key in CATEGORY_KEYS:
+        table['pct_' + key] = _round_category_pct(partials[key], total)
+    for key in INDICATOR_QUESTIONS:
+        table[key] = _round_pct(partials[key], total)
+    return table[STATS_COLUMNS]
+
+
+def aggregate_school_stats(df, codes):
+    """
+    Builds the per-school stats table (one row per school, in upload order).
+    """
+    return finalize_stats(partial_aggregates(df, codes))
+
+
+def national_deltas(stats_table):
+    """
+    Percentage-point differences from NATIONAL_BENCHMARKS, one
+    `<column>_vs_national` column per benchmarked stat.
+    """
+    return pd.DataFrame({f"{key}_vs_national": (stats_table[key] - value).round(1)
+                         for key, value in NATIONAL_BENCHMARKS.items()}, index=stats_table.index)
+
+
+def school_stats(stats_table, school):
+    """
+    Returns one school's row of the stats table as the plain `stats` dict
+    consumed by the insight and template stages.
+    """
+    return {key: stats_table.at[school, key].item() for key in STATS_COLUMNS}
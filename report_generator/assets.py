@@ -0,0 +1,315 @@
+"""
+Shared asset bundle for exported reports: one precompiled stylesheet and
+script written once into the archive, with each page linking to them
+instead of repeating the inline <style>/<script> and loading the Tailwind
+CDN and Google Fonts at view time.
+"""
+import re
+
+from .template import HTML_TEMPLATE
+
+ASSET_DIR = "assets"
+STYLESHEET_PATH = f"{ASSET_DIR}/report.css"
+SCRIPT_PATH = f"{ASSET_DIR}/report.js"
+
+# Parts of every rendered page that move into the bundle.
+_STYLE_BLOCK = re.search(r"<style>.*?</style>", HTML_TEMPLATE, re.S).group(0)
+_SCRIPT_BLOCK = re.search(r"<script>.*?</script>", HTML_TEMPLATE, re.S).group(0)
+_REMOTE_TAGS = [
+    re.search(r'<script src="https://cdn\.tailwindcss\.com"></script>\s*', HTML_TEMPLATE).group(0),
+    re.search(r'<link href="https://fonts\.googleapis\.com[^>]*>\s*', HTML_TEMPLATE).group(0),
+]
+_STYLESHEET_LINK = f'<link rel="stylesheet" href="{STYLESHEET_PATH}">'
+_SCRIPT_TAG = f'<script src="{SCRIPT_PATH}"></script>'
+_CLASS_ATTR = re.compile(r'class="([^"]*)"')
+
+TEMPLATE_CSS = "\n".join(line.strip() for line in _STYLE_BLOCK[len("<style>"):-len("</style>")].strip().splitlines())
+TEMPLATE_JS = "\n".join(line[8:] for line in _SCRIPT_BLOCK[len("<script>"):-len("</script>")].strip("\n").splitlines())
+# Classes the template's own stylesheet defines (not Tailwind utilities).
+TEMPLATE_CLASSES = frozenset(re.findall(r"\.([A-Za-z][\w-]*)", TEMPLATE_CSS))
+
+# The parts of Tailwind's preflight reset the reports rely on.
+PREFLIGHT_CSS = """\
+*,::before,::after{box-sizing:border-box;border-width:0;border-style:solid;border-color:#e5e7eb}
+html{line-height:1.5;-webkit-text-size-adjust:100%;tab-size:4;font-family:ui-sans-serif,system-ui,-apple-system,"Segoe UI",Roboto,"Helvetica Neue",Arial,sans-serif}
+body{margin:0;line-height:inherit}
+hr{height:0;color:inherit;border-top-width:1px}
+h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}
+a{color:inherit;text-decoration:inherit}
+b,strong{font-weight:bolder}
+table{text-indent:0;border-color:inherit;border-collapse:collapse}
+blockquote,dl,dd,h1,h2,h3,h4,h5,h6,hr,figure,p,pre{margin:0}
+ol,ul,menu{list-style:none;margin:0;padding:0}
+img,svg,video,canvas,audio,iframe,embed,object{display:block;vertical-align:middle}
+img,video{max-width:100%;height:auto}
+[hidden]{display:none}"""
+
+# Tailwind's default palette for the colour families the reports use.
+PALETTE = {
+    'slate': ['#f8fafc', '#f1f5f9', '#e2e8f0', '#cbd5e1', '#94a3b8', '#64748b', '#475569', '#334155', '#1e293b', '#0f172a'],
+    'gray': ['#f9fafb', '#f3f4f6', '#e5e7eb', '#d1d5db', '#9ca3af', '#6b7280', '#4b5563', '#374151', '#1f2937', '#111827'],
+    'red': ['#fef2f2', '#fee2e2', '#fecaca', '#fca5a5', '#f87171', '#ef4444', '#dc2626', '#b91c1c', '#991b1b', '#7f1d1d'],
+    'orange': ['#fff7ed', '#ffedd5', '#fed7aa', '#fdba74', '#fb923c', '#f97316', '#ea580c', '#c2410c', '#9a3412', '#7c2d12'],
+    'yellow': ['#fefce8', '#fef9c3', '#fef08a', '#fde047', '#facc15', '#eab308', '#ca8a04', '#a16207', '#854d0e', '#713f12'],
+    'green': ['#f0fdf4', '#dcfce7', '#bbf7d0', '#86efac', '#4ade80', '#22c55e', '#16a34a', '#15803d', '#166534', '#14532d'],
+    'blue': ['#eff6ff', '#dbeafe', '#bfdbfe', '#93c5fd', '#60a5fa', '#3b82f6', '#2563eb', '#1d4ed8', '#1e40af', '#1e3a8a'],
+}
+SHADES = ['50', '100', '200', '300', '400', '500', '600', '700', '800', '900']
+BREAKPOINTS = {'sm': '640px', 'md': '768px', 'lg': '1024px', 'xl': '1280px'}
+
+FONT_SIZES = {
+    'xs': ('0.75rem', '1rem'), 'sm': ('0.875rem', '1.25rem'), 'base': ('1rem', '1.5rem'),
+    'lg': ('1.125rem', '1.75rem'), 'xl': ('1.25rem', '1.75rem'), '2xl': ('1.5rem', '2rem'),
+    '3xl': ('1.875rem', '2.25rem'), '4xl': ('2.25rem', '2.5rem'), '5xl': ('3rem', '1'), '6xl': ('3.75rem', '1'),
+}
+FONT_WEIGHTS = {'light': 300, 'normal': 400, 'medium': 500, 'semibold': 600, 'bold': 700, 'extrabold': 800, 'black': 900}
+TRACKING = {'tighter': '-0.05em', 'tight': '-0.025em', 'normal': '0em', 'wide': '0.025em', 'wider': '0.05em',
+            'widest': '0.1em'}
+LEADING = {'none': '1', 'tight': '1.25', 'snug': '1.375', 'normal': '1.5', 'relaxed': '1.625', 'loose': '2'}
+RADII = {'none': '0px', 'sm': '0.125rem', '': '0.25rem', 'md': '0.375rem', 'lg': '0.5rem', 'xl': '0.75rem',
+         '2xl': '1rem', '3xl': '1.5rem', 'full': '9999px'}
+MAX_WIDTHS = {'sm': '24rem', 'md': '28rem', 'lg': '32rem', 'xl': '36rem', '2xl': '42rem', '3xl': '48rem',
+              '4xl': '56rem', '5xl': '64rem', '6xl': '72rem', '7xl': '80rem', 'full': '100%'}
+SIDES = {'': [''], 'x': ['-left', '-right'], 'y': ['-top', '-bottom'],
+         't': ['-top'], 'r': ['-right'], 'b': ['-bottom'], 'l': ['-left']}
+RADIUS_SIDES = {'': ['border-radius'], 't': ['border-top-left-radius', 'border-top-right-radius'],
+                'r': ['border-top-right-radius', 'border-bottom-right-radius'],
+                'b': ['border-bottom-right-radius', 'border-bottom-left-radius'],
+                'l': ['border-top-left-radius', 'border-bottom-left-radius']}
+STATIC_UTILITIES = {
+    'fixed': 'position:fixed', 'absolute': 'position:absolute', 'relative': 'position:relative',
+    'block': 'display:block', 'inline-block': 'display:inline-block', 'flex': 'display:flex', 'grid': 'display:grid',
+    'hidden': 'display:none', 'flex-row': 'flex-direction:row', 'flex-col': 'flex-direction:column',
+    'flex-wrap': 'flex-wrap:wrap', 'items-start': 'align-items:flex-start', 'items-center': 'align-items:center',
+    'items-end': 'align-items:flex-end', 'items-baseline': 'align-items:baseline',
+    'justify-start': 'justify-content:flex-start', 'justify-center': 'justify-content:center',
+    'justify-end': 'justify-content:flex-end', 'justify-between': 'justify-content:space-between',
+    'overflow-hidden': 'overflow:hidden', 'object-cover': 'object-fit:cover', 'object-contain': 'object-fit:contain',
+    'border-none': 'border-style:none', 'text-left': 'text-align:left', 'text-center': 'text-align:center',
+    'text-right': 'text-align:right', 'uppercase': 'text-transform:uppercase', 'italic': 'font-style:italic',
+    'underline': 'text-decoration-line:underline',
+    'shadow-inner': 'box-shadow:inset 0 2px 4px 0 rgb(0 0 0 / 0.05)',
+    'shadow': 'box-shadow:0 1px 3px 0 rgb(0 0 0 / 0.1), 0 1px 2px -1px rgb(0 0 0 / 0.1)',
+    'grayscale': 'filter:grayscale(100%)',
+    'transition-all': 'transition-property:all;transition-timing-function:cubic-bezier(0.4, 0, 0.2, 1);'
+                      'transition-duration:150ms',
+    'mx-auto': 'margin-left:auto;margin-right:auto',
+    'w-auto': 'width:auto', 'w-full': 'width:100%', 'h-auto': 'height:auto', 'h-full': 'height:100%',
+}
+
+
+def _spacing(value):
+    """
+    Tailwind spacing-scale value ('4' -> 1rem, 'px', fractions for widths),
+    or None.
+    """
+    if value == 'px':
+        return '1px'
+    if re.fullmatch(r"\d+(\.5)?", value):
+        number = float(value) / 4
+        return '0px' if number == 0 else f"{number:g}rem"
+    if re.fullmatch(r"\d+/\d+", value):
+        numerator, denominator = map(int, value.split('/'))
+        return f"{numerator / denominator * 100:.6f}".rstrip('0').rstrip('.') + '%'
+    return None
+
+
+def _color(value):
+    """
+    CSS colour for 'blue-500', 'blue-500/80', 'white' or 'black', or None.
+    """
+    value, _, alpha = value.partition('/')
+    if value == 'white':
+        hex_color = '#ffffff'
+    elif value == 'black':
+        hex_color = '#000000'
+    else:
+        family, _, shade = value.rpartition('-')
+        if family not in PALETTE or shade not in SHADES:
+            return None
+        hex_color = PALETTE[family][SHADES.index(shade)]
+    if not alpha:
+        return hex_color
+    if not alpha.isdigit():
+        return None
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgb({r} {g} {b} / {int(alpha) / 100:g})"
+
+
+# (pattern, declarations) in Tailwind's utility order, so that later rules
+# win the same way they do with the CDN build.
+def _utility_rules():
+    def spaced(*properties):
+        def rule(value):
+            size = _spacing(value)
+            return size and ";".join(f"{p}:{size}" for p in properties)
+        return rule
+
+    def sided(prefix):
+        def rule(side, value):
+            size = _spacing(value)
+            return size and ";".join(f"{prefix}{suffix}:{size}" for suffix in SIDES[side])
+        return rule
+
+    def border_width(side, width):
+        width = f"{width or 1}px"
+        return ";".join(f"border{suffix}-width:{width}" for suffix in SIDES[side])
+
+    def radius(side, size):
+        value = RADII.get(size)
+        return value and ";".join(f"{p}:{value}" for p in RADIUS_SIDES[side])
+
+    def font_size(size):
+        font, line = FONT_SIZES[size]
+        return f"font-size:{font};line-height:{line}"
+
+    def static(name):
+        return STATIC_UTILITIES[name]
+
+    return [
+        (r"(fixed|absolute|relative)", static),
+        (r"top-(.+)", spaced('top')), (r"right-(.+)", spaced('right')),
+        (r"bottom-(.+)", spaced('bottom')), (r"left-(.+)", spaced('left')),
+        (r"z-(\d+)", lambda value: f"z-index:{value}"),
+        (r"(mx-auto)", static),
+        (r"m([xytrbl]?)-(.+)", sided('margin')),
+        (r"(block|inline-block|flex|grid|hidden)", static),
+        (r"(h-auto|h-full)", static), (r"h-(.+)", spaced('height')),
+        (r"(w-auto|w-full)", static), (r"w-(.+)", spaced('width')),
+        (r"max-w-(.+)", lambda value: MAX_WIDTHS.get(value) and f"max-width:{MAX_WIDTHS[value]}"),
+        (r"grid-cols-(\d+)", lambda n: f"grid-template-columns:repeat({n}, minmax(0, 1fr))"),
+        (r"(flex-row|flex-col|flex-wrap)", static),
+        (r"(items-(?:start|center|end|baseline))", static),
+        (r"(justify-(?:start|center|end|between))", static),
+        (r"gap-(.+)", spaced('gap')),
+        (r"space-y-(.+)", lambda value: _spacing(value) and f"margin-top:{_spacing(value)}"),
+        (r"(overflow-hidden)", static),
+        (r"rounded(?:-([trbl]))?(?:-?(none|sm|md|lg|xl|2xl|3xl|full))?", lambda side, size: radius(side or '', size or '')),
+        (r"border(?:-([xytrbl]))?(?:-(\d+))?", lambda side, width: border_width(side or '', width)),
+        (r"(border-none)", static),
+        (r"border-(.+)", lambda value: _color(value) and f"border-color:{_color(value)}"),
+        (r"bg-(.+)", lambda value: _color(value) and f"background-color:{_color(value)}"),
+        (r"(object-cover|object-contain)", static),
+        (r"p([xytrbl]?)-(.+)", sided('padding')),
+        (r"(text-left|text-center|text-right)", static),
+        (rf"text-({'|'.join(FONT_SIZES)})", font_size),
+        (rf"font-({'|'.join(FONT_WEIGHTS)})", lambda weight: f"font-weight:{FONT_WEIGHTS[weight]}"),
+        (r"(uppercase|italic)", static),
+        (rf"leading-({'|'.join(LEADING)})", lambda value: f"line-height:{LEADING[value]}"),
+        (rf"tracking-({'|'.join(TRACKING)})", lambda value: f"letter-spacing:{TRACKING[value]}"),
+        (r"text-(.+)", lambda value: _color(value) and f"color:{_color(value)}"),
+        (r"(underline)", static),
+        (r"opacity-(\d+)", lambda value: f"opacity:{int(value) / 100:g}"),
+        (r"(shadow-inner|shadow)", static),
+        (r"(grayscale)", static),
+        (r"grayscale-\[([\d.]+)\]", lambda value: f"filter:grayscale({value})"),
+        (r"(transition-all)", static),
+        (r"duration-(\d+)", lambda value: f"transition-duration:{value}ms"),
+    ]
+
+
+UTILITY_RULES = [(re.compile(pattern), rule) for pattern, rule in _utility_rules()]
+
+
+def _escape(class_name):
+    return re.sub(r"([^A-Za-z0-9_-])", r"\\\1", class_name)
+
+
+def compile_utility(class_name):
+    """
+    (order, css rule) for one Tailwind utility class such as 'md:p-8' or
+    'bg-blue-500/80', or None if it is not a supported utility.
+    """
+    variant, _, utility = class_name.rpartition(':')
+    if variant and variant not in BREAKPOINTS:
+        return None
+    for position, (pattern, rule) in enumerate(UTILITY_RULES):
+        match = pattern.fullmatch(utility)
+        if not match:
+            continue
+        declarations = rule(*match.groups())
+        if not declarations:
+            continue
+        selector = f".{_escape(class_name)}"
+        if utility.startswith('space-y-'):
+            selector += " > :not([hidden]) ~ :not([hidden])"
+        variant_rank = list(BREAKPOINTS).index(variant) + 1 if variant else 0
+        return (variant_rank, position, class_name), f"{selector}{{{declarations}}}"
+    return None
+
+
+def build_stylesheet(classes):
+    """
+    The preflight reset, the template's own styles and a rule for each used
+    utility class (everything else is purged). Breakpoint variants follow
+    the base utilities inside their media queries, as in Tailwind.
+    Returns (css, unsupported class names).
+    """
+    compiled, unsupported = [], []
+    for class_name in classes:
+        if class_name in TEMPLATE_CLASSES:
+            continue
+        rule = compile_utility(class_name)
+        if rule is None:
+            unsupported.append(class_name)
+        else:
+            compiled.append(rule)
+    compiled.sort()
+
+    lines = [PREFLIGHT_CSS, TEMPLATE_CSS]
+    for rank, variant in enumerate([None, *BREAKPOINTS], start=0):
+        rules = [css for (variant_rank, _, _), css in compiled if variant_rank == rank]
+        if not rules:
+            continue
+        if variant is None:
+            lines.extend(rules)
+        else:
+            lines.append(f"@media (min-width:{BREAKPOINTS[variant]}){{")
+            lines.extend(rules)
+            lines.append("}")
+    return "\n".join(lines) + "\n", sorted(unsupported)
+
+
+class AssetBundle:
+    """
+    Rewrites pages to link the shared assets and records the classes they
+    use; `files()` then gives the purged stylesheet and the script to write
+    alongside them. Already-bundled pages pass through unchanged (their
+    classes are still recorded), so reused reports can be fed back in.
+    """
+
+    def __init__(self):
+        self.classes = set()
+        self.stats = {'pages': 0, 'bytes_saved': 0, 'unsupported': []}
+
+    def page(self, html):
+        if _STYLESHEET_LINK not in html:
+            original_size = len(html)
+            for tag in _REMOTE_TAGS:
+                html = html.replace(tag, "", 1)
+            html = html.replace(_STYLE_BLOCK, _STYLESHEET_LINK, 1)
+            html = html.replace(_SCRIPT_BLOCK, _SCRIPT_TAG, 1)
+            self.stats['bytes_saved'] += original_size - len(html)
+        for match in _CLASS_ATTR.finditer(html):
+            self.classes.update(match.group(1).split())
+        self.stats['pages'] += 1
+        return html
+
+    def pages(self, reports):
+        for name, html in reports:
+            yield name, self.page(html)
+
+    def files(self):
+        """
+        [(path, content)] of the shared assets for the pages seen so far.
+        """
+        css, self.stats['unsupported'] = build_stylesheet(self.classes)
+        return [(STYLESHEET_PATH, css), (SCRIPT_PATH, TEMPLATE_JS + "\n")]
+
+    def summary(self):
+        s = self.stats
+        text = (f"Asset bundle: {s['pages']} pages linked to shared CSS/JS "
+                f"({len(self.classes)} classes kept, {s['bytes_saved'] / 1024:.0f} KB of repeated markup removed).")
+        if s['unsupported']:
+            text += f" Unstyled classes: {', '.join(s['unsupported'])}."
+        return text
@@ -0,0 +1,185 @@
+"""
+Batched multi-school insight requests.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .insights import (
+    API_ERROR_INSIGHTS, DEFAULT_INSIGHT_WORKERS, build_insight_prompt, generate_insights_with_gemini,
+    insight_cache_key, insight_errors, parse_insight_response,
+)
+from .ratelimit import EXPECTED_OUTPUT_TOKENS, estimate_tokens
+
+INSIGHT_KEYS = list(API_ERROR_INSIGHTS)
+DEFAULT_BATCH_SIZE = 10
+
+
+def is_valid_insight(insights):
+    return isinstance(insights, dict) and all(isinstance(insights.get(k), str) for k in INSIGHT_KEYS)
+
+
+def _peer_fields(stats):
+    peer = stats.get('peer')
+    if not peer:
+        return ""
+    group = json.dumps(f"{peer['level']} {peer['group']}")
+    return (f"; peer_group={group} "
+            f"(schools={peer['schools']}, exam_anxiety={peer['anxiety_pct']}%, "
+            f"parental_pressure={peer['parent_pressure_pct']}%, support_accessibility={peer['support_pct']}%)")
+
+
+def build_batch_insight_prompt(school_stats_list):
+    """
+    One prompt for several schools: the instructions and schema are sent
+    once and each school's numbers take a single compact line.
+    """
+    lines = []
+    for school, stats in school_stats_list:
+        lines.append(
+            f"- {json.dumps(str(school))}: students={stats['count']}; "
+            f"balanced={stats['balanced']} ({stats['pct_balanced']}%); "
+            f"mild={stats['mild']} ({stats['pct_mild']}%); "
+            f"moderate={stats['moderate']} ({stats['pct_moderate']}%); "
+            f"high={stats['high']} ({stats['pct_high']}%); "
+            f"severe={stats['severe']} ({stats['pct_severe']}%); "
+            f"exam_anxiety={stats['anxiety_pct']}%; "
+            f"parental_pressure={stats['parent_pressure_pct']}%; "
+            f"support_accessibility={stats['support_pct']}%"
+            + _peer_fields(stats)
+        )
+    data = "\n        ".join(lines)
+    return f"""
+        ROLE: Expert Education Data Analyst.
+        TASK: Write report sections for each of the {len(school_stats_list)} schools below.
+        NATIONAL BENCHMARKS: Exam Anxiety 81%, Parental Pressure 66%, Support Accessibility 28%.
+        DATA (one line per school):
+        {data}
+
+        OUTPUT FORMAT (JSON array, exactly one object per school):
+        [
+            {{
+                "school": "School name exactly as given above",
+                "p1": "Executive Summary Paragraph 1 (Overview of participation and general mood)",
+                "p2": "Executive Summary Paragraph 2 (Deep dive into stress distribution)",
+                "key_finding": "One punchy key finding headline",
+                "conclusion": "One sentence strategic conclusion",
+                "quote": "A relevant, inspiring quote for students",
+                "strengths": "Insight on Strengths (Compare School vs National data)",
+                "weaknesses": "Insight on Points of Intervention (Compare School vs National data)"
+            }}
+        ]
+        """
+
+
+def parse_batch_insight_response(text):
+    """
+    Returns {school name: insights} for the well-formed elements of the
+    response array; malformed or unnamed elements are dropped.
+    """
+    parsed = parse_insight_response(text)
+    if not isinstance(parsed, list):
+        raise ValueError("Expected a JSON array")
+    results = {}
+    for item in parsed:
+        if isinstance(item, dict) and is_valid_insight(item) and isinstance(item.get('school'), str):
+            results[item['school']] = {k: item[k] for k in INSIGHT_KEYS}
+    return results
+
+
+class InsightBatcher:
+    """
+    Packs `batch_size` schools into each Gemini request. Schools missing or
+    malformed in a batch reply fall back to single-school calls. `stats`
+    compares the calls and estimated prompt tokens spent with what one call
+    per school would have cost.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.stats = {'schools': 0, 'batch_calls': 0, 'fallback_calls': 0,
+                      'single_tokens': 0, 'used_tokens': 0}
+
+    def _request_batch(self, model, scheduler, chunk):
+        prompt = build_batch_insight_prompt(chunk)
+        try:
+            if scheduler is not None:
+                response = scheduler.call(model.generate_content, prompt,
+                                          output_tokens=EXPECTED_OUTPUT_TOKENS * len(chunk))
+            else:
+                response = model.generate_content(prompt)
+            return prompt, parse_batch_insight_response(response.text)
+        except insight_errors():
+            return prompt, {}
+
+    def generate(self, api_key, school_stats_list, model, max_workers=DEFAULT_INSIGHT_WORKERS,
+                 scheduler=None, cache=None, on_progress=None):
+        total = len(school_stats_list)
+        results = [None] * total
+        pending = []
+        for i, (school, stats) in enumerate(school_stats_list):
+            cached = cache.get(insight_cache_key(school, stats)) if cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        done = total - len(pending)
+        if on_progress and done:
+            on_progress(done, total)
+
+        chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        retry = []
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {
+                pool.submit(self._request_batch, model, scheduler,
+                            [school_stats_list[i] for i in chunk]): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                prompt, answers = future.result()
+                self.stats['batch_calls'] += 1
+                self.stats['used_tokens'] += estimate_tokens(prompt)
+                for i in chunk:
+                    school, stats = school_stats_list[i]
+                    insights = answers.get(str(school))
+                    if insights is None:
+                        retry.append(i)
+                        continue
+                    results[i] = insights
+                    if cache is not None:
+                        cache.put(insight_cache_key(school, stats), insights)
+                    done += 1
+                if on_progress:
+                    on_progress(done, total)
+
+            # Single-school calls for anything the batches did not return cleanly
+            retry.sort()
+            futures = {
+                pool.submit(generate_insights_with_gemini, api_key, school_stats_list[i][1],
+                            school_stats_list[i][0], model, scheduler, cache): i
+                for i in retry
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                school, stats = school_stats_list[i]
+                insights = future.result()
+                results[i] = insights
+                self.stats['fallback_calls'] += 1
+                self.stats['used_tokens'] += estimate_tokens(build_insight_prompt(stats, school))
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+
+        self.stats['schools'] += len(pending)
+        self.stats['single_tokens'] += sum(
+            estimate_tokens(build_insight_prompt(school_stats_list[i][1], school_stats_list[i][0]))
+            for i in pending)
+        return results
+
+    def summary(self):
+        s = self.stats
+        calls = s['batch_calls'] + s['fallback_calls']
+        return (f"Batched AI insights: {calls} calls for {s['schools']} schools "
+                f"({s['schools'] - calls} calls saved, {s['fallback_calls']} single-school fallbacks), "
+                f"~{s['single_tokens'] - s['used_tokens']:,} prompt tokens saved.")
@@ -0,0 +1,208 @@
+"""
+On-disk caches: successful AI insight responses (SQLite) and parsed,
+scored survey frames (uncompressed Arrow IPC files).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get(
+    "REPORT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "survey-report-generator"))
+DEFAULT_CACHE_MAX_ENTRIES = 50_000
+DEFAULT_CACHE_MAX_AGE_DAYS = 90
+DEFAULT_FRAME_CACHE_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_FRAME_CACHE_MAX_AGE_DAYS = 30
+# Bump when scoring or the scored frame layout changes.
+FRAME_FORMAT_VERSION = 3
+# Arrow schema metadata key holding the frame's attrs (header, question names).
+FRAME_ATTRS_KEY = b'survey_report_attrs'
+
+
+class InsightCache:
+    """
+    SQLite-backed store of successful insight responses keyed by
+    insight_cache_key(). Entries older than `max_age_days` and the least
+    recently used ones beyond `max_entries` are evicted by prune(), which
+    runs on open. Safe to share between the insight worker threads.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                 max_age_days=DEFAULT_CACHE_MAX_AGE_DAYS):
+        self.path = path or os.path.join(CACHE_DIR, "insights.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS insights ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.conn.commit()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0}
+        self.prune()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM insights WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.conn.execute("UPDATE insights SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.stats['hits'] += 1
+        return json.loads(row[0])
+
+    def put(self, key, insights):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO insights (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(insights), now, now))
+            self.conn.commit()
+            self.stats['writes'] += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM insights WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM insights")
+            self.conn.commit()
+
+    def prune(self):
+        cutoff = time.time() - self.max_age_days * 86400
+        with self.lock:
+            self.conn.execute("DELETE FROM insights WHERE created < ?", (cutoff,))
+            self.conn.execute(
+                "DELETE FROM insights WHERE key NOT IN "
+                "(SELECT key FROM insights ORDER BY accessed DESC LIMIT ?)", (self.max_entries,))
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def summary(self):
+        s = self.stats
+        return f"AI cache: {s['hits']} hits, {s['misses']} misses, {s['writes']} new entries."
+
+
+def file_digest(source, block_size=1024 * 1024):
+    """
+    SHA-256 of a file's content, from a path or a seekable file-like object
+    (which is rewound afterwards).
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+    else:
+        source.seek(0)
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+class SurveyFrameCache:
+    """
+    Directory of scored survey frames stored as Arrow IPC files named after
+    the upload's content hash, so a re-run on the same file loads the
+    cached frame instead of re-parsing and re-scoring it. get() maps the
+    file and converts it to pandas in one copy, with the same categorical
+    and numpy dtypes the pipeline produced. Needs pyarrow;
+    `available` is False without it and every lookup misses. Files older
+    than `max_age_days` and the least recently used ones beyond
+    `max_bytes` in total are evicted by prune(), which runs on open.
+    The frame's `attrs` (the upload's header and question names) are kept
+    in the Arrow schema metadata and restored on get().
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_FRAME_CACHE_MAX_BYTES,
+                 max_age_days=DEFAULT_FRAME_CACHE_MAX_AGE_DAYS):
+        self.directory = directory or os.path.join(CACHE_DIR, "frames")
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        try:
+            import pyarrow.feather  # noqa: F401
+            self.available = True
+        except ImportError:
+            self.available = False
+        if self.available:
+            os.makedirs(self.directory, exist_ok=True)
+            self.prune()
+
+    def key(self, digest):
+        return f"{digest}-v{FRAME_FORMAT_VERSION}"
+
+    def _path(self, digest):
+        return os.path.join(self.directory, self.key(digest) + ".arrow")
+
+    def get(self, digest):
+        if not self.available:
+            return None
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        from pyarrow import feather
+        table = feather.read_table(path, memory_map=True)
+        frame = table.to_pandas()
+        attrs = (table.schema.metadata or {}).get(FRAME_ATTRS_KEY)
+        if attrs is not None:
+            frame.attrs.update(json.loads(attrs))
+        os.utime(path)
+        return frame
+
+    def put(self, digest, frame):
+        """
+        Stores the frame; returns False (and stores nothing) if Arrow cannot
+        represent a column, e.g. an sname column mixing numbers and text.
+        """
+        if not self.available:
+            return False
+        from pyarrow import ArrowException, Table, feather
+        path = self._path(digest)
+        tmp = path + ".tmp"
+        try:
+            table = Table.from_pandas(frame)
+            metadata = dict(table.schema.metadata or {})
+            metadata[FRAME_ATTRS_KEY] = json.dumps(frame.attrs, default=str)
+            feather.write_feather(table.replace_schema_metadata(metadata), tmp, compression="uncompressed")
+        except (ArrowException, TypeError, ValueError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        self.prune()
+        return True
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".arrow"):
+                path = os.path.join(self.directory, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries, reverse=True)
+
+    def prune(self):
+        cutoff = time.time() - self.max_age_days * 86400
+        total = 0
+        for mtime, size, path in self._entries():
+            total += size
+            if mtime < cutoff or total > self.max_bytes:
+                os.remove(path)
+
+    def clear(self):
+        if self.available:
+            for _, _, path in self._entries():
+                os.remove(path)
@@ -0,0 +1,312 @@
+"""
+Headless batch entry point:
+
+    python -m report_generator survey.xlsx -o school_reports.zip
+    python -m report_generator survey.csv -o reports/ --no-ai
+    python -m report_generator survey.csv -o reports/ --incremental --ai-schools "School A,School B"
+    python -m report_generator survey.csv -o reports/ --incremental
+    python -m report_generator survey.csv -o stats.parquet --stats-only --national-deltas
+    python -m report_generator survey.csv -o reports/ --peer-group district
+    python -m report_generator survey.csv -o reports/ --group-columns state,city --peer-group city
+    python -m report_generator survey.csv -o rollups.csv --stats-only --rollups
+    python -m report_generator survey.csv -o out/school_reports.zip --shard-schools 500 --shard-by region
+"""
+import argparse
+import os
+import sys
+
+from .batching import DEFAULT_BATCH_SIZE
+from .cache import SurveyFrameCache
+from .export import (
+    DEFAULT_CODEC, DEFAULT_COMPRESSION_LEVEL, ZIP_CODECS, rollup_export_table, stats_export_table, stats_format,
+    write_report_directory, write_report_zip, write_stats,
+)
+from .incremental import generate_incremental
+from .ingest import ENGINES
+from .insights import DEFAULT_INSIGHT_WORKERS
+from .pipeline import (
+    PipelineCallbacks, check_peer_level, load_scored_survey, process_data, school_stats_table, survey_rollup,
+)
+from .profiling import PipelineProfiler
+from .ratelimit import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+from .rendering import DEFAULT_RENDER_CHUNKSIZE
+from .scoring import GROUP_COLUMN_NAMES, find_group_column, group_column_names
+from .shards import (
+    DEFAULT_EXPORT_WORKERS, PREFIX_SHARDING, group_key, prefix_key, shard_summary, shard_target, write_report_shards,
+)
+from .validation import DEFAULT_MAX_UNKNOWN_RATE, DEFAULT_MIN_RESPONSES, SurveyValidator
+
+
+class ConsoleCallbacks(PipelineCallbacks):
+    """
+    Writes progress and messages to stderr and remembers whether an error
+    was reported, so the CLI can exit non-zero.
+    """
+
+    def __init__(self, quiet=False, stream=None):
+        self.quiet = quiet
+        self.stream = stream or sys.stderr
+        self.failed = False
+        self._last = None
+
+    def progress(self, fraction, text=""):
+        if self.quiet:
+            return
+        line = f"{text or 'Working...'} {int(fraction * 100):3d}%"
+        if line != self._last:
+            self.stream.write("\r" + line)
+            self.stream.flush()
+            self._last = line
+        if fraction >= 1:
+            self.stream.write("\n")
+            self._last = None
+
+    def info(self, message):
+        if not self.quiet:
+            print(message, file=self.stream)
+
+    def error(self, message):
+        self.failed = True
+        print(f"error: {message}", file=self.stream)
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive whole number, got {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m report_generator",
+        description="Generate per-school HTML well-being reports from a survey export.")
+    parser.add_argument("input", help="survey file (.csv or .xlsx)")
+    parser.add_argument("-o", "--output", default="school_reports.zip",
+                        help="output .zip file or directory (default: %(default)s)")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="file reader: pyarrow (CSV) / calamine (Excel) are faster when installed")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY", ""),
+                        help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--no-ai", action="store_true",
+                        help="skip Gemini and write every school's insights locally from its figures")
+    parser.add_argument("--ai-schools", metavar="NAMES",
+                        help="comma-separated school names, or @FILE with one per line: use Gemini for these "
+                             "schools only and local insights for the rest")
+    parser.add_argument("--validation", choices=("fail", "warn", "off"), default="fail",
+                        help="check answers, headers and school names before scoring: stop on errors, "
+                             "report them and continue, or skip the check (default: %(default)s)")
+    parser.add_argument("--max-unknown-rate", type=float, default=DEFAULT_MAX_UNKNOWN_RATE,
+                        help="share of unrecognised or blank answers in a question column treated as an "
+                             "error (default: %(default)s)")
+    parser.add_argument("--min-responses", type=int, default=DEFAULT_MIN_RESPONSES,
+                        help="warn about schools with fewer responses (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_INSIGHT_WORKERS,
+                        help="concurrent AI requests (default: %(default)s)")
+    parser.add_argument("--rpm", type=positive_int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="AI requests per minute (default: %(default)s)")
+    parser.add_argument("--tpm", type=positive_int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help="AI tokens per minute (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help=f"schools per AI request, e.g. {DEFAULT_BATCH_SIZE} (default: %(default)s)")
+    parser.add_argument("--render-workers", type=int, default=1,
+                        help="processes used to fill templates (default: %(default)s)")
+    parser.add_argument("--render-chunksize", type=int, default=DEFAULT_RENDER_CHUNKSIZE,
+                        help="schools per render task (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the AI insight cache")
+    parser.add_argument("--no-frame-cache", action="store_true",
+                        help="always re-parse and re-score the input instead of using the parsed-data cache")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_COMPRESSION_LEVEL,
+                        choices=range(10), metavar="0-9",
+                        help="zip compression level, 0 = store (default: %(default)s)")
+    parser.add_argument("--codec", choices=list(ZIP_CODECS), default=DEFAULT_CODEC,
+                        help="zip compression codec; bzip2 and lzma are smaller but slower (default: %(default)s)")
+    parser.add_argument("--shard-schools", type=int, metavar="N",
+                        help="split the output into zip shards of at most N schools, plus an index of "
+                             "which shard holds each school")
+    parser.add_argument("--shard-mb", type=float, metavar="MB",
+                        help="split the output into zip shards of at most MB of uncompressed HTML")
+    parser.add_argument("--shard-by", metavar="KEY",
+                        help="shard by 'prefix' (first letter of the school name) or a grouping column "
+                             "such as region; combined with the limits above")
+    parser.add_argument("--export-workers", type=int, default=DEFAULT_EXPORT_WORKERS,
+                        help="shards compressed in parallel (default: %(default)s)")
+    parser.add_argument("--bundle-assets", action="store_true",
+                        help="write one shared, purged stylesheet and script under assets/ and link every "
+                             "report to it, so pages load without the Tailwind CDN or Google Fonts")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="skip insights and templates and write the per-school stats table to the "
+                             "output (.csv, .jsonl or .parquet)")
+    parser.add_argument("--national-deltas", action="store_true",
+                        help="with --stats-only, add percentage-point differences from the national benchmarks")
+    parser.add_argument("--rollups", action="store_true",
+                        help="with --stats-only, also write one row per grouping level found in the upload "
+                             "(region, state, board, district, zone, block, cluster, or --group-columns) and for "
+                             "all schools")
+    parser.add_argument("--group-columns", metavar="NAMES",
+                        help="comma-separated grouping columns, coarsest first, used for --peer-group, "
+                             "--rollups and --shard-by instead of the built-in names "
+                             f"({','.join(GROUP_COLUMN_NAMES)})")
+    parser.add_argument("--peer-group", metavar="LEVEL",
+                        help="compare each school with its peer group computed from the upload: a grouping "
+                             "column such as district, 'auto' for the finest one present or 'overall'")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild reports for schools whose responses changed since the last run "
+                             "into the same output")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="write per-stage timings, AI latency percentiles and peak memory as JSON")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a Chrome trace of the pipeline stages (open in chrome://tracing or Perfetto)")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="run the per-school render loop under cProfile and print the top functions")
+    parser.add_argument("--cprofile-out", metavar="FILE",
+                        help="run the per-school render loop under cProfile and save the stats to FILE "
+                             "(readable with pstats or snakeviz)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    return parser
+
+
+def write_profile(profiler, args, callbacks):
+    callbacks.info(profiler.summary())
+    if args.profile_json:
+        profiler.write_json(args.profile_json)
+        callbacks.info(f"Wrote profile to {args.profile_json}")
+    if args.trace:
+        profiler.write_chrome_trace(args.trace)
+        callbacks.info(f"Wrote Chrome trace to {args.trace}")
+    if args.cprofile:
+        print(profiler.profile_report(), file=sys.stderr)
+    if args.cprofile_out:
+        profiler.write_cprofile(args.cprofile_out)
+        callbacks.info(f"Wrote cProfile stats to {args.cprofile_out}")
+
+
+def read_school_names(value):
+    """
+    Names from --ai-schools: 'A,B' or '@file' with one name per line.
+    """
+    if value.startswith("@"):
+        with open(value[1:], encoding="utf-8") as f:
+            names = f.read().splitlines()
+    else:
+        names = value.split(",")
+    return {name.strip() for name in names if name.strip()}
+
+
+def export_shards(df, reports, args, callbacks):
+    """
+    Writes `reports` as zip shards per the --shard-* options. Returns the
+    index, or None if the --shard-by column is missing.
+    """
+    key = None
+    if args.shard_by == PREFIX_SHARDING:
+        key = prefix_key
+    elif args.shard_by:
+        column = find_group_column(df.columns, args.shard_by, names=args.group_names)
+        if column is None:
+            callbacks.error(f"No '{args.shard_by}' column to shard by.")
+            return None
+        key = group_key(df, column)
+    out_dir, base_name = shard_target(args.output)
+    max_bytes = int(args.shard_mb * 1024 * 1024) if args.shard_mb else None
+    return write_report_shards(reports, out_dir, base_name, max_schools=args.shard_schools, max_bytes=max_bytes,
+                               key=key, shard_by=args.shard_by, compresslevel=args.compression_level,
+                               codec=args.codec, workers=args.export_workers, bundle_assets=args.bundle_assets)
+
+
+def export_stats(df, args, profiler, callbacks, profiling):
+    with profiler.stage('aggregate', rows=len(df)) as counts:
+        if args.rollups:
+            table = rollup_export_table(survey_rollup(df, args.group_names), national=args.national_deltas)
+        else:
+            table = stats_export_table(school_stats_table(df), national=args.national_deltas)
+        counts['schools'] = df['sname'].nunique()
+    with profiler.stage('export'):
+        try:
+            write_stats(table, args.output, stats_format(args.output))
+        except ImportError:
+            callbacks.error("Parquet output needs pyarrow (pip install pyarrow).")
+            return 1
+    if profiling:
+        write_profile(profiler, args, callbacks)
+    callbacks.info(f"Wrote stats for {counts['schools']} schools to {args.output}")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.stats_only and stats_format(args.output) is None:
+        parser.error("--stats-only needs a .csv, .jsonl or .parquet output file")
+    if args.rollups and not args.stats_only:
+        parser.error("--rollups only applies with --stats-only")
+    sharded = bool(args.shard_schools or args.shard_mb or args.shard_by)
+    args.group_names = None if args.group_columns is None else group_column_names(args.group_columns)
+    if sharded and (args.incremental or args.stats_only):
+        parser.error("--shard-* options cannot be combined with --incremental or --stats-only")
+    ai_schools = None
+    if args.ai_schools:
+        if args.no_ai or not args.api_key:
+            parser.error("--ai-schools needs a Gemini API key (--api-key or $GEMINI_API_KEY)")
+        try:
+            ai_schools = read_school_names(args.ai_schools)
+        except OSError as exc:
+            parser.error(f"--ai-schools: {exc}")
+    callbacks = ConsoleCallbacks(quiet=args.quiet)
+    profiling = bool(args.profile_json or args.trace or args.cprofile or args.cprofile_out)
+    profiler = PipelineProfiler(cprofile=bool(args.cprofile or args.cprofile_out))
+
+    frame_cache = None if args.no_frame_cache else SurveyFrameCache()
+    validator = None
+    if args.validation != "off":
+        validator = SurveyValidator(max_unknown_rate=args.max_unknown_rate, min_responses=args.min_responses,
+                                    fail_fast=args.validation == "fail")
+    df = load_scored_survey(args.input, frame_cache=frame_cache, engine=args.engine, callbacks=callbacks,
+                            profiler=profiler, validator=validator, group_names=args.group_names)
+    if df is None:
+        return 1
+    callbacks.info(f"Loaded data: {len(df)} rows. Found {df['sname'].nunique()} schools.")
+    if ai_schools:
+        unknown = ai_schools - set(df['sname'].dropna().astype(str))
+        if unknown:
+            callbacks.info(f"--ai-schools: {len(unknown)} names not in the upload: {', '.join(sorted(unknown))}")
+
+    if args.stats_only:
+        return export_stats(df, args, profiler, callbacks, profiling)
+    # Checked here because process_data only runs once the output is open
+    if not check_peer_level(df, args.peer_group, callbacks, args.group_names):
+        return 1
+
+    api_key = "" if args.no_ai else args.api_key
+    options = dict(
+        max_workers=args.workers, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+        use_cache=not args.no_cache, batch_size=args.batch_size,
+        render_workers=args.render_workers, render_chunksize=args.render_chunksize, callbacks=callbacks,
+        profiler=profiler, peer_level=args.peer_group, ai_schools=ai_schools, group_names=args.group_names,
+    )
+    # The export stage includes the render slices streamed into it
+    with profiler.stage('export'):
+        if args.incremental:
+            summary = generate_incremental(df, args.output, api_key, compresslevel=args.compression_level,
+                                           bundle_assets=args.bundle_assets, codec=args.codec, **options)
+        else:
+            reports = process_data(df, api_key, **options)
+            if sharded:
+                index = export_shards(df, reports, args, callbacks)
+                count = len(index['schools']) if index else 0
+            elif args.output.lower().endswith(".zip"):
+                count = write_report_zip(reports, args.output, compresslevel=args.compression_level,
+                                         bundle_assets=args.bundle_assets, codec=args.codec)
+            else:
+                count = write_report_directory(reports, args.output, bundle_assets=args.bundle_assets)
+
+    if profiling:
+        write_profile(profiler, args, callbacks)
+    if args.incremental:
+        return 1 if summary is None or callbacks.failed else 0
+    if callbacks.failed:
+        return 1
+    if sharded:
+        callbacks.info(shard_summary(index))
+    callbacks.info(f"Generated {count} reports in {args.output}")
+    return 0
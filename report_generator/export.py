@@ -0,0 +1,154 @@
+"""
+Writing rendered reports to a zip archive or a directory.
+"""
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+
+from .aggregation import national_deltas
+from .assets import AssetBundle
+
+DEFAULT_COMPRESSION_LEVEL = 6
+# Zip entry codecs by name; bzip2 and lzma are smaller but slower to write and open.
+ZIP_CODECS = {'deflate': zipfile.ZIP_DEFLATED, 'bzip2': zipfile.ZIP_BZIP2, 'lzma': zipfile.ZIP_LZMA,
+              'store': zipfile.ZIP_STORED}
+DEFAULT_CODEC = 'deflate'
+# Archives larger than this roll over from memory to a temp file on disk.
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+# Stats-only export formats by file extension.
+STATS_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.parquet': 'parquet'}
+
+
+def _bundled(reports, bundle_assets):
+    """
+    (reports, bundle): the pages rewritten to use a new AssetBundle, or
+    unchanged with None.
+    """
+    if not bundle_assets:
+        return reports, None
+    bundle = AssetBundle()
+    return bundle.pages(reports), bundle
+
+
+def _zip_reports(fileobj, reports, compresslevel, bundle=None, codec=DEFAULT_CODEC):
+    """
+    Writes the reports, then the files of the AssetBundle they were passed
+    through, if any. Level 0 stores without compression whatever the codec
+    (lzma has no levels). Returns the report count.
+    """
+    compression = ZIP_CODECS[codec] if compresslevel > 0 else zipfile.ZIP_STORED
+    if compression in (zipfile.ZIP_STORED, zipfile.ZIP_LZMA):
+        compresslevel = 0
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=compression,
+                         compresslevel=compresslevel if compresslevel > 0 else None) as zf:
+        for name, content in reports:
+            zf.writestr(name, content)
+            count += 1
+        # Written last: the stylesheet keeps only the classes the pages used
+        if bundle is not None:
+            for name, content in bundle.files():
+                zf.writestr(name, content)
+    return count
+
+
+def write_report_archive(reports, compresslevel=DEFAULT_COMPRESSION_LEVEL, spool_max_bytes=SPOOL_MAX_BYTES,
+                         bundle_assets=False, codec=DEFAULT_CODEC):
+    """
+    Compresses (name, html) pairs into a zip as they are produced, so only
+    one report is held uncompressed at a time. Level 0 stores without
+    compression; `codec` is one of ZIP_CODECS. With `bundle_assets`, pages link to one shared stylesheet
+    and script in the archive instead of inlining them and loading the
+    Tailwind CDN. Returns the archive as a spooled temp file rewound to the
+    start, plus the number of reports written.
+    """
+    archive = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes, suffix=".zip")
+    reports, bundle = _bundled(reports, bundle_assets)
+    count = _zip_reports(archive, reports, compresslevel, bundle, codec)
+    archive.seek(0)
+    return archive, count
+
+
+def write_report_zip(reports, path, compresslevel=DEFAULT_COMPRESSION_LEVEL, bundle_assets=False,
+                     codec=DEFAULT_CODEC):
+    """
+    Streams (name, html) pairs into a zip file at `path`, optionally with
+    the shared asset bundle. Returns the count.
+    """
+    reports, bundle = _bundled(reports, bundle_assets)
+    with open(path, "wb") as f:
+        return _zip_reports(f, reports, compresslevel, bundle, codec)
+
+
+def safe_filename(name):
+    return name.replace("/", "_").replace("\\", "_")
+
+
+def write_report_directory(reports, out_dir, bundle_assets=False):
+    """
+    Writes each (name, html) pair as a UTF-8 file under `out_dir`, plus
+    the shared assets under `out_dir/assets` with `bundle_assets`. Returns
+    the count.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    reports, bundle = _bundled(reports, bundle_assets)
+    count = 0
+    for name, content in reports:
+        with open(os.path.join(out_dir, safe_filename(name)), "w", encoding="utf-8") as f:
+            f.write(content)
+        count += 1
+    if bundle is not None:
+        _write_assets(bundle, out_dir)
+    return count
+
+
+def _write_assets(bundle, out_dir):
+    for name, content in bundle.files():
+        path = os.path.join(out_dir, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def stats_format(path):
+    """
+    'csv', 'jsonl' or 'parquet' from a file name, or None.
+    """
+    return STATS_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def stats_export_table(stats_table, national=False):
+    """
+    The per-school stats table as a flat frame with a leading `school`
+    column, optionally followed by the national benchmark deltas.
+    """
+    parts = [stats_table, national_deltas(stats_table)] if national else [stats_table]
+    table = pd.concat(parts, axis=1)
+    table.insert(0, 'school', table.index.astype(str))
+    return table.reset_index(drop=True)
+
+
+def rollup_export_table(rollup, national=False):
+    """
+    Rollup.export_table() (school rows, every grouping level and all
+    schools), optionally followed by the national benchmark deltas.
+    """
+    table = rollup.export_table()
+    return pd.concat([table, national_deltas(table)], axis=1) if national else table
+
+
+def write_stats(table, target, fmt):
+    """
+    Writes a stats_export_table() to a path or binary buffer as CSV, JSON
+    Lines or Parquet (Parquet needs pyarrow).
+    """
+    if fmt == 'csv':
+        table.to_csv(target, index=False)
+    elif fmt == 'jsonl':
+        table.to_json(target, orient='records', lines=True)
+    elif fmt == 'parquet':
+        table.to_parquet(target, index=False)
+    else:
+        raise ValueError(f"Unknown stats format: {fmt!r}")
@@ -0,0 +1,340 @@
+"""
+Incremental regeneration: rebuild only the schools whose responses changed
+since the previous run, reusing the other reports from the earlier output.
+"""
+import hashlib
+import json
+import os
+import zipfile
+
+import pandas as pd
+
+from .assets import AssetBundle
+from .export import DEFAULT_CODEC, DEFAULT_COMPRESSION_LEVEL, _write_assets, _zip_reports, safe_filename
+from .insights import API_ERROR_INSIGHTS, GEMINI_MODEL_NAME, PROMPT_VERSION
+from .narrative import NARRATIVE_VERSION
+from .pipeline import (
+    PipelineCallbacks, check_peer_level, load_scored_survey, process_data, report_filename, score_survey,
+)
+from .rendering import SCORING_TABLE_HTML
+from .rollups import AUTO_PEER_LEVEL, OVERALL_GROUP, OVERALL_LEVEL
+from .scoring import (
+    CODE_COLUMNS, build_scored_frame, find_group_column, group_columns, is_scored_frame, question_columns,
+)
+from .template import HTML_TEMPLATE
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def manifest_path(output):
+    """
+    The manifest sits next to a zip (`reports.zip.manifest.json`) or inside
+    an output directory.
+    """
+    if output.lower().endswith(".zip"):
+        return output + ".manifest.json"
+    return os.path.join(output, MANIFEST_NAME)
+
+
+def output_settings_key(api_key, peer_level=None, bundle_assets=False, ai_schools=None, insight_settings=None):
+    """
+    Hash of everything besides the school's rows that shapes a report: the
+    template, which insight writer was used (Gemini model/prompt or local
+    rules version), the peer-group level and whether pages link the shared
+    asset bundle. A different key means every school is rebuilt. With
+    `ai_schools` the key is the local writer's; the selected schools are
+    told apart by their fingerprints (with_ai_fingerprints).
+    `insight_settings` (an InsightProvider's `settings`) replaces the
+    writer part when the caller supplies its own provider.
+    """
+    use_gemini = api_key and ai_schools is None
+    payload = {
+        'template': hashlib.sha256((HTML_TEMPLATE + SCORING_TABLE_HTML).encode('utf-8')).hexdigest(),
+        'ai': f"{GEMINI_MODEL_NAME}/v{PROMPT_VERSION}" if use_gemini else f"local/v{NARRATIVE_VERSION}",
+    }
+    if insight_settings is not None:
+        payload['ai'] = insight_settings
+    if peer_level is not None:
+        payload['peer'] = str(peer_level).strip().lower()
+    if bundle_assets:
+        payload['assets'] = True
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def school_fingerprints(frame):
+    """
+    {school name: fingerprint} from a scored frame. Each row's encoded
+    answers are hashed and the hashes summed per school (mod 2**64), so the
+    fingerprint ignores row order but changes when any answer, row or
+    school assignment changes.
+    """
+    row_hashes = pd.util.hash_pandas_object(frame[CODE_COLUMNS], index=False)
+    grouped = row_hashes.groupby(frame['sname'].to_numpy(), sort=False)
+    sums, counts = grouped.sum(), grouped.size()
+    return {str(school): f"{int(sums[school]):016x}-{int(counts[school])}" for school in sums.index}
+
+
+def with_peer_fingerprints(fingerprints, frame, peer_level, group_names=None):
+    """
+    Appends to each school's fingerprint a hash of its peer group's member
+    fingerprints, so a change anywhere in the group rebuilds the school's
+    report (its comparison figures moved). Levels the upload lacks are
+    left alone; process_data reports them.
+    """
+    key = str(peer_level).strip().lower()
+    levels = group_columns(frame.columns, exclude=CODE_COLUMNS, names=group_names)
+    if key == AUTO_PEER_LEVEL:
+        key = str(levels[-1]).strip().lower() if levels else OVERALL_LEVEL
+    if key == OVERALL_LEVEL:
+        groups = pd.Series(OVERALL_GROUP, index=list(fingerprints))
+    else:
+        level = find_group_column(frame.columns, key, exclude=CODE_COLUMNS, names=group_names)
+        if level is None:
+            return fingerprints
+        membership = frame[level].groupby(frame['sname'], sort=False, observed=True).first()
+        groups = pd.Series({str(school): str(group) for school, group in membership.items()})
+
+    members = {}
+    for school in fingerprints:
+        members.setdefault(groups.get(school), []).append(fingerprints[school])
+    group_hashes = {group: _sha256("|".join(sorted(prints)))[:16] for group, prints in members.items()}
+    return {school: f"{fingerprint}+{group_hashes[groups.get(school)]}"
+            for school, fingerprint in fingerprints.items()}
+
+
+def with_ai_fingerprints(fingerprints, ai_schools):
+    """
+    Marks the fingerprints of schools upgraded to Gemini, so selecting or
+    deselecting a school rebuilds just that school.
+    """
+    ai_schools = {str(school) for school in ai_schools}
+    marker = f"+{GEMINI_MODEL_NAME}/v{PROMPT_VERSION}"
+    return {school: fingerprint + marker if school in ai_schools else fingerprint
+            for school, fingerprint in fingerprints.items()}
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def plan_incremental(fingerprints, manifest, settings_key):
+    """
+    Splits schools into (rebuild, reuse, removed) sets of names. A school is
+    reused only if its fingerprint is unchanged, the settings match and its
+    previous report did not fall back to the AI error text.
+    """
+    previous = manifest['schools'] if manifest and manifest.get('settings') == settings_key else {}
+    rebuild, reuse = set(), set()
+    for school, fingerprint in fingerprints.items():
+        entry = previous.get(school)
+        if entry and entry['fingerprint'] == fingerprint and entry.get('ai_ok', True):
+            reuse.add(school)
+        else:
+            rebuild.add(school)
+    removed = set(manifest['schools'] if manifest else {}) - set(fingerprints)
+    return rebuild, reuse, removed
+
+
+def _read_previous(output, entry, old_zip):
+    """
+    Previous report text if it is still present and matches its recorded hash.
+    """
+    try:
+        if old_zip is not None:
+            html = old_zip.read(entry['file']).decode('utf-8')
+        else:
+            with open(os.path.join(output, safe_filename(entry['file'])), encoding="utf-8") as f:
+                html = f.read()
+    except (KeyError, OSError, UnicodeDecodeError):
+        return None
+    return html if _sha256(html) == entry['sha256'] else None
+
+
+def _open_previous_zip(output):
+    try:
+        return zipfile.ZipFile(output)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
+def generate_incremental(source, output, api_key, compresslevel=DEFAULT_COMPRESSION_LEVEL,
+                         frame_cache=None, engine='auto', callbacks=None, bundle_assets=False,
+                         codec=DEFAULT_CODEC, **process_kwargs):
+    """
+    Writes reports for `source` (a path, file object or DataFrame) to
+    `output` (.zip or directory), regenerating only added or changed
+    schools, dropping removed ones and reusing the rest. With
+    `bundle_assets` the pages link a shared stylesheet and script that are
+    rewritten each run. A zip is rewritten with `codec` (see ZIP_CODECS),
+    reused reports included. Extra keyword arguments go to process_data.
+    Returns {'rebuilt', 'reused', 'removed'} counts, or None (with nothing
+    written) on a format error or a `peer_level` the upload has no column
+    for.
+    """
+    callbacks = callbacks or PipelineCallbacks()
+    group_names = process_kwargs.get('group_names')
+    if isinstance(source, pd.DataFrame):
+        frame = source
+        if not is_scored_frame(frame):
+            question_cols = question_columns(frame)
+            if question_cols is None:
+                callbacks.error("CSV format incorrect. Expected at least 28 columns.")
+                return None
+            frame = build_scored_frame(frame, score_survey(frame, question_cols), group_names)
+    else:
+        frame = load_scored_survey(source, frame_cache=frame_cache, engine=engine, callbacks=callbacks,
+                                   group_names=group_names)
+        if frame is None:
+            return None
+
+    is_zip = output.lower().endswith(".zip")
+    peer_level = process_kwargs.get('peer_level')
+    if not check_peer_level(frame, peer_level, callbacks, group_names):
+        return None
+    provider = process_kwargs.get('provider')
+    ai_schools = process_kwargs.get('ai_schools') if api_key and provider is None else None
+    fingerprints = school_fingerprints(frame)
+    if peer_level is not None:
+        fingerprints = with_peer_fingerprints(fingerprints, frame, peer_level, group_names)
+    if ai_schools is not None:
+        fingerprints = with_ai_fingerprints(fingerprints, ai_schools)
+    settings_key = output_settings_key(api_key, peer_level, bundle_assets, ai_schools,
+                                       provider.settings if provider is not None else None)
+    manifest = load_manifest(manifest_path(output))
+    rebuild, reuse, removed = plan_incremental(fingerprints, manifest, settings_key)
+    old_entries = manifest['schools'] if manifest else {}
+    # A zip is rewritten (reusing every report) when only these change
+    archive = {'codec': codec, 'compresslevel': compresslevel} if is_zip else None
+
+    old_zip = _open_previous_zip(output) if is_zip and reuse else None
+    try:
+        # Reports edited or deleted since the last run are rebuilt too.
+        for school in list(reuse):
+            if _read_previous(output, old_entries[school], old_zip) is None:
+                reuse.discard(school)
+                rebuild.add(school)
+
+        if not rebuild and not removed and (manifest or {}).get('archive') == archive:
+            callbacks.info(f"Incremental: nothing changed, {len(reuse)} reports reused.")
+            return {'rebuilt': 0, 'reused': len(reuse), 'removed': 0}
+
+        ai_ok = {}
+        bundle = AssetBundle() if bundle_assets else None
+
+        def record(school, stats, ai_content, html):
+            ai_ok[str(school)] = ai_content != API_ERROR_INSIGHTS
+
+        generated = process_data(frame, api_key, callbacks=callbacks, only_schools=rebuild,
+                                 on_report=record, **process_kwargs)
+        if is_zip:
+            entries = _write_zip(output, compresslevel, fingerprints, reuse, old_entries, old_zip,
+                                 generated, ai_ok, bundle, codec)
+        else:
+            entries = _write_directory(output, fingerprints, reuse, old_entries, generated, ai_ok, bundle)
+            for school in removed:
+                path = os.path.join(output, safe_filename(old_entries[school]['file']))
+                if os.path.exists(path):
+                    os.remove(path)
+    finally:
+        if old_zip is not None:
+            old_zip.close()
+
+    manifest = {'version': MANIFEST_VERSION, 'settings': settings_key, 'schools': entries, 'archive': archive}
+    with open(manifest_path(output), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    summary = {'rebuilt': len(rebuild), 'reused': len(reuse), 'removed': len(removed)}
+    callbacks.info(f"Incremental: {summary['rebuilt']} rebuilt, {summary['reused']} reused, "
+                   f"{summary['removed']} removed.")
+    return summary
+
+
+def _merged_reports(fingerprints, reuse, old_entries, generated, ai_ok, bundle=None):
+    """
+    Yields (school, manifest entry, html or None) in upload order; html is
+    None for reused reports, which the writer copies from the old output.
+    Rebuilt reports are pulled from the `generated` stream as they come and
+    passed through `bundle` before hashing, so the hash matches the file.
+    The stream is run to its end, so process_data reports its provider
+    summaries and closes its provider, or closed if the merge stops early.
+    """
+    generated = iter(generated)
+    try:
+        for school, fingerprint in fingerprints.items():
+            if school in reuse:
+                yield school, dict(old_entries[school]), None
+                continue
+            name, html = next(generated)
+            if name != report_filename(school):
+                raise RuntimeError(f"Report order mismatch: expected {school!r}, got {name!r}")
+            if bundle is not None:
+                html = bundle.page(html)
+            entry = {'fingerprint': fingerprint, 'file': name, 'sha256': _sha256(html),
+                     'ai_ok': ai_ok.get(school, True)}
+            yield school, entry, html
+        for name, _ in generated:
+            raise RuntimeError(f"Report order mismatch: unexpected {name!r}")
+    finally:
+        close = getattr(generated, 'close', None)
+        if close is not None:
+            close()
+
+
+def _write_zip(output, compresslevel, fingerprints, reuse, old_entries, old_zip, generated, ai_ok, bundle=None,
+               codec=DEFAULT_CODEC):
+    """
+    Builds the new archive next to the old one, copying reused entries
+    across, then swaps it into place.
+    """
+    entries = {}
+
+    def reports():
+        for school, entry, html in _merged_reports(fingerprints, reuse, old_entries, generated, ai_ok, bundle):
+            if html is None:
+                html = old_zip.read(entry['file']).decode('utf-8')
+                if bundle is not None:
+                    bundle.page(html)
+            entries[school] = entry
+            yield entry['file'], html
+
+    tmp = output + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            _zip_reports(f, reports(), compresslevel, bundle, codec)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, output)
+    return entries
+
+
+def _write_directory(output, fingerprints, reuse, old_entries, generated, ai_ok, bundle=None):
+    """
+    Writes only the rebuilt reports; reused files are left where they are
+    (but still read for the classes they use when bundling assets).
+    """
+    entries = {}
+    os.makedirs(output, exist_ok=True)
+    for school, entry, html in _merged_reports(fingerprints, reuse, old_entries, generated, ai_ok, bundle):
+        path = os.path.join(output, safe_filename(entry['file']))
+        if html is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+        elif bundle is not None:
+            with open(path, encoding="utf-8") as f:
+                bundle.page(f.read())
+        entries[school] = entry
+    if bundle is not None:
+        _write_assets(bundle, output)
+    return entries
@@ -0,0 +1,184 @@
+"""
+Loading survey uploads (CSV or Excel) into a DataFrame.
+
+The lean path keeps only `sname`, any grouping columns (district,
+region... or the names passed as `group_names`) and the 20 question columns (positions 8-27), stores them as
+categoricals, reads CSVs in chunks and streams xlsx
+rows through openpyxl's read-only mode. Faster engines can be chosen when
+installed: pyarrow for CSV (quicker, but parses the whole file at once)
+and python-calamine for Excel (picked automatically when available).
+"""
+import importlib.util
+import os
+import sys
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .scoring import HEADER_ATTR, QUESTION_COLUMNS_ATTR, QUESTION_END, QUESTION_START, group_columns
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCHOOL_COLUMN = 'sname'
+DEFAULT_CSV_CHUNKSIZE = 200_000
+ENGINES = ('auto', 'pandas', 'pyarrow', 'calamine')
+
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _dedupe(names):
+    # Same convention as pandas for blank and repeated headers.
+    seen = {}
+    result = []
+    for i, name in enumerate(names):
+        name = f"Unnamed: {i}" if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        result.append(name)
+    return result
+
+
+def _select_positions(header, group_names=None):
+    """
+    Positions of `sname`, the grouping columns and the question columns, or
+    None when the header is too short for the lean layout (the full frame
+    is read instead, and the pipeline reports the format error).
+    """
+    if len(header) < QUESTION_END:
+        return None
+    positions = list(range(QUESTION_START, QUESTION_END))
+    questions = header[QUESTION_START:QUESTION_END]
+    for col in [SCHOOL_COLUMN] + group_columns(header, exclude=questions, names=group_names):
+        if col in header and header.index(col) not in positions:
+            positions.append(header.index(col))
+    return sorted(positions)
+
+
+def _string_categories(values):
+    # A chunk where the column is entirely blank has float64 categories, and
+    # union_categoricals needs every chunk's categories to share one dtype.
+    return pd.Categorical.from_codes(values.cat.codes, categories=values.cat.categories.astype(str))
+
+
+def _concat_categorical(chunks):
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    return pd.DataFrame({
+        col: union_categoricals([_string_categories(chunk[col]) for chunk in chunks], ignore_order=True)
+        for col in chunks[0].columns
+    })
+
+
+def _read_csv_lean(source, engine, chunksize, group_names=None):
+    header = pd.read_csv(source, nrows=0).columns.tolist()
+    _rewind(source)
+    positions = _select_positions(header, group_names)
+    if positions is None:
+        return pd.read_csv(source), header
+    if engine == 'pyarrow':
+        df = pd.read_csv(source, usecols=[header[i] for i in positions], engine='pyarrow')
+        return df.astype('category'), header
+    reader = pd.read_csv(source, usecols=positions, dtype='category', chunksize=chunksize)
+    return _concat_categorical(list(reader)), header
+
+
+def _read_excel_lean(source, engine, group_names=None):
+    if engine == 'calamine':
+        header = pd.read_excel(source, nrows=0, engine='calamine').columns.tolist()
+        _rewind(source)
+        positions = _select_positions(header, group_names)
+        if positions is None:
+            return pd.read_excel(source, engine='calamine'), header
+        df = pd.read_excel(source, usecols=positions, engine='calamine')
+        return df.astype('category'), header
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _dedupe(next(rows, ()))
+        positions = _select_positions(header, group_names)
+        if positions is None:
+            workbook.close()
+            _rewind(source)
+            return pd.read_excel(source), header
+        columns = [[] for _ in positions]
+        for row in rows:
+            width = len(row)
+            for values, i in zip(columns, positions):
+                values.append(row[i] if i < width else None)
+    finally:
+        workbook.close()
+    return pd.DataFrame({header[i]: pd.Categorical(values) for i, values in zip(positions, columns)}), header
+
+
+def _resolve_engine(engine, is_csv):
+    if engine != 'auto':
+        return engine
+    if is_csv:
+        return 'pandas'
+    return 'calamine' if _has_module('python_calamine') else 'pandas'
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def read_survey(source, filename=None, lean=True, engine='auto', chunksize=DEFAULT_CSV_CHUNKSIZE,
+                callbacks=None, group_names=None):
+    """
+    Reads a survey upload from a path or a file-like object (such as a
+    Streamlit upload). The format is picked from `filename`, the object's
+    `.name`, or the path: `.csv` is CSV, anything else is Excel.
+    With `lean=False` every column is read as-is; otherwise the grouping
+    columns kept are those named in `group_names` (GROUP_COLUMN_NAMES by
+    default). Load time and memory are reported through `callbacks.info`
+    when given.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}")
+    name = filename or getattr(source, 'name', None) or (source if isinstance(source, (str, os.PathLike)) else '')
+    is_csv = str(name).lower().endswith('.csv')
+    started = time.perf_counter()
+
+    if not lean:
+        df = pd.read_csv(source) if is_csv else pd.read_excel(source)
+        df.attrs[HEADER_ATTR] = [str(col) for col in df.columns]
+    else:
+        engine = _resolve_engine(engine, is_csv)
+        if is_csv:
+            df, header = _read_csv_lean(source, engine, chunksize, group_names)
+        else:
+            df, header = _read_excel_lean(source, engine, group_names)
+        df.attrs[HEADER_ATTR] = list(header)
+        if len(header) >= QUESTION_END:
+            df.attrs[QUESTION_COLUMNS_ATTR] = list(header[QUESTION_START:QUESTION_END])
+
+    if callbacks is not None:
+        elapsed = time.perf_counter() - started
+        memory = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        peak = peak_rss_mb()
+        peak_text = f", peak RSS {peak:,.0f} MB" if peak is not None else ""
+        callbacks.info(f"Read {len(df):,} rows x {df.shape[1]} columns in {elapsed:.2f}s "
+                       f"({memory:,.1f} MB in memory{peak_text}).")
+    return df
@@ -0,0 +1,198 @@
+"""
+Gemini prompt building, response parsing and concurrent insight generation.
+"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cache
+
+from .aggregation import STATS_COLUMNS
+from .narrative import local_insights
+
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+DEFAULT_INSIGHT_WORKERS = 8
+
+# Placeholder used whenever the API call or JSON parsing fails.
+API_ERROR_INSIGHTS = {
+    "p1": "Analysis generation failed (API Error).",
+    "p2": "Please check API Key or try again.",
+    "key_finding": "Data Processing Complete",
+    "conclusion": "Review numerical data below.",
+    "quote": "Data speaks for itself.",
+    "strengths": "N/A",
+    "weaknesses": "N/A"
+}
+
+# Bump when the prompt wording changes so old answers are not reused.
+PROMPT_VERSION = 1
+
+
+def offline_insights(stats):
+    """
+    Insight text used when no API key is provided: the local rules-based
+    writer (narrative.py), specific to the school's figures.
+    """
+    return local_insights(stats)
+
+
+def insight_cache_key(school_name, stats, model_name=GEMINI_MODEL_NAME):
+    """
+    Content hash of everything the prompt is built from: school name, the
+    stats fields it quotes, the model and the prompt version.
+    """
+    payload = {
+        'school': str(school_name),
+        'stats': {key: stats[key] for key in STATS_COLUMNS},
+        'model': model_name,
+        'prompt_version': PROMPT_VERSION,
+    }
+    if stats.get('peer'):
+        payload['peer'] = stats['peer']
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def peer_prompt_line(stats, indent="\n        "):
+    """
+    Extra DATA line quoting the school's computed peer group, or "".
+    """
+    peer = stats.get('peer')
+    if not peer:
+        return ""
+    return (f"{indent}- Peer Group ({peer['level']} {peer['group']}, {peer['schools']} schools, "
+            f"{peer['count']} students): Exam Anxiety {peer['anxiety_pct']}%, "
+            f"Parental Pressure {peer['parent_pressure_pct']}%, Support Accessibility {peer['support_pct']}%, "
+            f"High+Severe Stress {round(peer['pct_high'] + peer['pct_severe'], 1)}%")
+
+
+def build_insight_prompt(stats, school_name):
+    return f"""
+        ROLE: Expert Education Data Analyst.
+        TASK: Write report sections for School: "{school_name}".
+        DATA:
+        - Total Students: {stats['count']}
+        - Balanced: {stats['balanced']} ({stats['pct_balanced']}%)
+        - Mild Stress: {stats['mild']} ({stats['pct_mild']}%)
+        - Moderate Stress: {stats['moderate']} ({stats['pct_moderate']}%)
+        - High Stress: {stats['high']} ({stats['pct_high']}%)
+        - Severe Stress: {stats['severe']} ({stats['pct_severe']}%)
+        - Exam Anxiety: {stats['anxiety_pct']}% (National: 81%)
+        - Parental Pressure: {stats['parent_pressure_pct']}% (National: 66%)
+        - Support Accessibility: {stats['support_pct']}% (National: 28%){peer_prompt_line(stats)}
+
+        OUTPUT FORMAT (JSON):
+        {{
+            "p1": "Executive Summary Paragraph 1 (Overview of participation and general mood)",
+            "p2": "Executive Summary Paragraph 2 (Deep dive into stress distribution)",
+            "key_finding": "One punchy key finding headline",
+            "conclusion": "One sentence strategic conclusion",
+            "quote": "A relevant, inspiring quote for students",
+            "strengths": "Insight on Strengths (Compare School vs National data)",
+            "weaknesses": "Insight on Points of Intervention (Compare School vs National data)"
+        }}
+        """
+
+
+def parse_insight_response(text):
+    # Strip markdown code fences the model sometimes wraps around the JSON.
+    return json.loads(text.replace("```json", "").replace("```", ""))
+
+
+@cache
+def insight_errors():
+    """
+    Exception types a model call or its reply can raise and that fall back
+    to API_ERROR_INSIGHTS: transport errors, Google API and auth errors
+    (when the client is installed), RuntimeError from clients and test
+    fakes, and ValueError for a reply that is not the expected JSON.
+    """
+    errors = (OSError, RuntimeError, ValueError)
+    try:
+        from google.api_core.exceptions import GoogleAPIError
+        from google.auth.exceptions import GoogleAuthError
+    except ImportError:
+        return errors
+    return errors + (GoogleAPIError, GoogleAuthError)
+
+
+def create_gemini_model(api_key):
+    # Imported lazily so the offline/CLI path runs without the package installed.
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+
+def generate_insights_with_gemini(api_key, stats, school_name, model=None, scheduler=None, cache=None):
+    """
+    Uses Gemini API to generate the Executive Summary and Insights.
+    Pass `model` (anything with a `generate_content(prompt)` method) to reuse
+    one client across calls or to substitute a fake in tests, `scheduler`
+    to rate-limit and retry the call, and `cache` to reuse earlier answers.
+    Only successfully parsed responses are cached, never the error fallback.
+    """
+    if not api_key and model is None:
+        return offline_insights(stats)
+
+    key = None
+    if cache is not None:
+        key = insight_cache_key(school_name, stats)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        if model is None:
+            model = create_gemini_model(api_key)
+        prompt = build_insight_prompt(stats, school_name)
+        if scheduler is not None:
+            response = scheduler.call(model.generate_content, prompt)
+        else:
+            response = model.generate_content(prompt)
+        insights = parse_insight_response(response.text)
+        if not isinstance(insights, dict):
+            raise ValueError("Expected a JSON object")
+
+    except insight_errors():
+        return dict(API_ERROR_INSIGHTS)
+
+    if cache is not None:
+        cache.put(key, insights)
+    return insights
+
+
+def generate_all_insights(api_key, school_stats_list, max_workers=DEFAULT_INSIGHT_WORKERS,
+                          model=None, scheduler=None, cache=None, batcher=None, on_progress=None):
+    """
+    Generates insights for a list of (school, stats) pairs through a bounded
+    thread pool, since each call mostly waits on the network. Results come
+    back in input order; a failed call yields the per-school error fallback.
+    `on_progress(done, total)` is called from the calling thread.
+    A shared `scheduler` applies rate limits and retries across all workers;
+    with a `cache`, schools whose prompt inputs are unchanged cost no call.
+    A `batcher` packs several schools into each request instead.
+    """
+    total = len(school_stats_list)
+    if not api_key and model is None:
+        results = [offline_insights(stats) for _, stats in school_stats_list]
+        if on_progress and total:
+            on_progress(total, total)
+        return results
+
+    if model is None:
+        try:
+            model = create_gemini_model(api_key)
+        except (ImportError, *insight_errors()):
+            return [dict(API_ERROR_INSIGHTS) for _ in school_stats_list]
+
+    if batcher is not None:
+        return batcher.generate(api_key, school_stats_list, model, max_workers=max_workers,
+                                scheduler=scheduler, cache=cache, on_progress=on_progress)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [
+            pool.submit(generate_insights_with_gemini, api_key, stats, school, model, scheduler, cache)
+            for school, stats in school_stats_list
+        ]
+        if on_progress:
+            for done, _ in enumerate(as_completed(futures), start=1):
+                on_progress(done, total)
+        return [f.result() for f in futures]
@@ -0,0 +1,367 @@
+"""
+Background report jobs: generation runs on a worker thread, every finished
+school is checkpointed to SQLite, and an interrupted job resumes with the
+schools it had not finished.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from .cache import CACHE_DIR
+from .insights import API_ERROR_INSIGHTS
+from .pipeline import PipelineCallbacks, load_scored_survey, process_data, report_filename
+
+JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+# Schools per insight/render chunk; a crash loses at most one chunk of work.
+DEFAULT_CHECKPOINT_EVERY = 25
+ACTIVE_STATUSES = ('queued', 'running')
+# Profilers of the most recently started jobs kept for the UI to show.
+MAX_KEPT_PROFILERS = 8
+# Pages of reports read back at a time when exporting a job.
+_EXPORT_PAGE = 200
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """
+    SQLite record of jobs and their per-school checkpoints (stats, insight
+    and rendered html). Each job also gets a directory under `directory`
+    holding a copy of its upload. Safe to share between threads.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or JOBS_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.directory, "jobs.sqlite"), check_same_thread=False,
+                                    timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, filename TEXT NOT NULL, survey_path TEXT, options TEXT NOT NULL, "
+            "uses_ai INTEGER NOT NULL, status TEXT NOT NULL, total INTEGER, done INTEGER NOT NULL DEFAULT 0, "
+            "progress REAL NOT NULL DEFAULT 0, message TEXT, error TEXT, owner_pid INTEGER, "
+            "created REAL NOT NULL, updated REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "job_id TEXT NOT NULL, school TEXT NOT NULL, position INTEGER NOT NULL, filename TEXT NOT NULL, "
+            "stats TEXT NOT NULL, insight TEXT NOT NULL, ai_ok INTEGER NOT NULL, html TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, school));")
+        self.conn.commit()
+
+    def job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def create(self, filename, options, uses_ai):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, filename, options, uses_ai, status, created, updated) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, filename, json.dumps(options), int(bool(uses_ai)), now, now))
+            self.conn.commit()
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def recent(self, limit=20):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.conn.commit()
+
+    def checkpoint(self, job_id, school, position, stats, insight, html):
+        """
+        Saves one finished school and bumps the job's done count.
+        """
+        ai_ok = insight != API_ERROR_INSIGHTS
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reports (job_id, school, position, filename, stats, insight, ai_ok, html) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, school, position, report_filename(school), json.dumps(stats), json.dumps(insight),
+                 int(ai_ok), html))
+            self.conn.execute(
+                "UPDATE jobs SET done = (SELECT COUNT(*) FROM reports WHERE job_id = ?), updated = ? WHERE id = ?",
+                (job_id, time.time(), job_id))
+            self.conn.commit()
+
+    def completed(self, job_id, include_ai_errors=False):
+        """
+        Names of checkpointed schools; by default schools whose insight fell
+        back to the API error text are left out so a resume retries them.
+        """
+        query = "SELECT school FROM reports WHERE job_id = ?"
+        if not include_ai_errors:
+            query += " AND ai_ok = 1"
+        with self.lock:
+            return {row[0] for row in self.conn.execute(query, (job_id,))}
+
+    def ai_error_count(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM reports WHERE job_id = ? AND ai_ok = 0", (job_id,)).fetchone()[0]
+
+    def discard(self, job_id, schools):
+        """
+        Drops the checkpoints of `schools` so the next run writes them again.
+        """
+        with self.lock:
+            self.conn.executemany("DELETE FROM reports WHERE job_id = ? AND school = ?",
+                                  [(job_id, str(school)) for school in schools])
+            self.conn.execute(
+                "UPDATE jobs SET done = (SELECT COUNT(*) FROM reports WHERE job_id = ?), updated = ? WHERE id = ?",
+                (job_id, time.time(), job_id))
+            self.conn.commit()
+
+    def reports(self, job_id):
+        """
+        (file name, html) pairs in upload order, read a page at a time so
+        an export can stream them into an archive.
+        """
+        position = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT position, filename, html FROM reports WHERE job_id = ? AND position > ? "
+                    "ORDER BY position LIMIT ?", (job_id, position, _EXPORT_PAGE)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row['filename'], row['html']
+            position = rows[-1]['position']
+
+    def delete(self, job_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM reports WHERE job_id = ?", (job_id,))
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.conn.commit()
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _job_dict(row):
+    job = dict(row)
+    job['options'] = json.loads(job['options'])
+    job['uses_ai'] = bool(job['uses_ai'])
+    return job
+
+
+def _thread_name(job_id):
+    return f"report-job-{job_id}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobCallbacks(PipelineCallbacks):
+    """
+    Records pipeline progress and messages on the job row for pollers.
+    """
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.last_error = None
+        self._percent = None
+
+    def progress(self, fraction, text=""):
+        percent = int(fraction * 100)
+        if percent != self._percent:
+            self._percent = percent
+            self.store.update(self.job_id, progress=fraction, message=text or None)
+
+    def info(self, message):
+        self.store.update(self.job_id, message=message)
+
+    def error(self, message):
+        self.last_error = message
+        self.store.update(self.job_id, error=message)
+
+
+class JobRunner:
+    """
+    Runs report jobs on background threads. The upload is copied into the
+    job's directory so a job can be resumed after a restart; API keys are
+    never stored and have to be passed again to resume(). `options` are
+    process_data keyword arguments (worker counts, rate limits, batch
+    size...) and are kept with the job. `profilers` holds the profilers of
+    the last MAX_KEPT_PROFILERS jobs started with one.
+    """
+
+    def __init__(self, store=None, frame_cache=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY):
+        self.store = store or JobStore()
+        self.frame_cache = frame_cache
+        self.checkpoint_every = checkpoint_every
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.cancelled = set()
+        self.profilers = {}
+
+    def submit(self, source, filename, api_key, profiler=None, **options):
+        """
+        Starts a job for `source` (a path or file object) and returns its id.
+        """
+        job_id = self.store.create(filename, options, uses_ai=bool(api_key))
+        survey_path = os.path.join(self.store.job_dir(job_id), os.path.basename(filename))
+        if isinstance(source, (str, os.PathLike)):
+            shutil.copyfile(source, survey_path)
+        else:
+            source.seek(0)
+            with open(survey_path, "wb") as f:
+                shutil.copyfileobj(source, f)
+            source.seek(0)
+        self.store.update(job_id, survey_path=survey_path)
+        self._start(job_id, api_key, profiler)
+        return job_id
+
+    def resume(self, job_id, api_key, profiler=None):
+        """
+        Continues an interrupted, failed or cancelled job with the schools it
+        has not finished (including ones whose insight failed). Returns
+        False if the job is unknown or already running.
+        """
+        job = self.status(job_id)
+        if job is None or job['status'] in ACTIVE_STATUSES:
+            return False
+        self._start(job_id, api_key, profiler)
+        return True
+
+    def upgrade(self, job_id, api_key, schools, profiler=None):
+        """
+        Rewrites `schools` of a job with Gemini insights and keeps every
+        other report, e.g. after a large batch written with local text.
+        The schools are added to the job's `ai_schools` option, so a later
+        resume keeps them on Gemini. Returns False if the job is unknown or
+        running, or no API key is given.
+        """
+        job = self.status(job_id)
+        if job is None or job['status'] in ACTIVE_STATUSES or not api_key:
+            return False
+        options = job['options']
+        # A job that used Gemini for every school just has those rewritten
+        if not job['uses_ai'] or options.get('ai_schools') is not None:
+            options['ai_schools'] = sorted(set(options.get('ai_schools') or ()) | {str(s) for s in schools})
+        self.store.update(job_id, options=json.dumps(options), uses_ai=1)
+        self.store.discard(job_id, schools)
+        self._start(job_id, api_key, profiler)
+        return True
+
+    def cancel(self, job_id):
+        """
+        Stops the job after the school being rendered; finished schools stay
+        checkpointed.
+        """
+        with self.lock:
+            self.cancelled.add(job_id)
+
+    def is_active(self, job_id):
+        # A worker registered here but not started yet counts as active
+        with self.lock:
+            thread = self.threads.get(job_id)
+        if thread is not None and (thread.ident is None or thread.is_alive()):
+            return True
+        # By thread name, so any runner in this process sees the job's worker
+        name = _thread_name(job_id)
+        return any(thread.name == name for thread in threading.enumerate())
+
+    def status(self, job_id):
+        """
+        The job row, with a queued/running job whose worker is gone (the
+        process exited or crashed) reported as 'interrupted'.
+        """
+        job = self.store.get(job_id)
+        if job is not None and job['status'] in ACTIVE_STATUSES and not self.is_active(job_id):
+            if job['owner_pid'] == os.getpid() or not _pid_alive(job['owner_pid'] or 0):
+                job['status'] = 'interrupted'
+        return job
+
+    def wait(self, job_id, timeout=None):
+        with self.lock:
+            thread = self.threads.get(job_id)
+        if thread is not None:
+            thread.join(timeout)
+
+    def _start(self, job_id, api_key, profiler):
+        thread = threading.Thread(target=self._run, args=(job_id, api_key, profiler),
+                                  name=_thread_name(job_id), daemon=True)
+        # Registered before the row says 'queued', so a poll in between does
+        # not report the job as interrupted (see is_active)
+        with self.lock:
+            self.cancelled.discard(job_id)
+            self.threads[job_id] = thread
+            if profiler is not None:
+                self.profilers.pop(job_id, None)
+                self.profilers[job_id] = profiler
+                while len(self.profilers) > MAX_KEPT_PROFILERS:
+                    del self.profilers[next(iter(self.profilers))]
+        self.store.update(job_id, status='queued', owner_pid=os.getpid(), error=None)
+        thread.start()
+
+    def _run(self, job_id, api_key, profiler):
+        store = self.store
+        callbacks = JobCallbacks(store, job_id)
+        store.update(job_id, status='running')
+        try:
+            job = store.get(job_id)
+            df = load_scored_survey(job['survey_path'], filename=job['filename'], frame_cache=self.frame_cache,
+                                    callbacks=callbacks, profiler=profiler,
+                                    group_names=job['options'].get('group_names'))
+            if df is None:
+                store.update(job_id, status='failed', error=callbacks.last_error)
+                return
+            positions = {str(school): idx for idx, school in enumerate(pd.unique(df['sname'].dropna()))}
+            pending = set(positions) - store.completed(job_id)
+            store.update(job_id, total=len(positions))
+
+            def checkpoint(school, stats, ai_content, html):
+                store.checkpoint(job_id, str(school), positions[str(school)], stats, ai_content, html)
+                if job_id in self.cancelled:
+                    raise JobCancelled()
+
+            reports = process_data(df, api_key, only_schools=pending, on_report=checkpoint, callbacks=callbacks,
+                                   profiler=profiler, checkpoint_every=self.checkpoint_every, **job['options'])
+            for _ in reports:
+                pass
+            # process_data reports a bad option (e.g. an unknown peer level) and stops early
+            if callbacks.last_error is not None:
+                store.update(job_id, status='failed', error=callbacks.last_error)
+                return
+        except JobCancelled:
+            store.update(job_id, status='cancelled', message="Cancelled.")
+        except Exception as exc:  # noqa: BLE001 - the worker's boundary: any error fails the job
+            store.update(job_id, status='failed', error=f"{type(exc).__name__}: {exc}")
+        else:
+            errors = store.ai_error_count(job_id)
+            message = (f"{errors} schools used the fallback text after AI errors; resume to retry them."
+                       if errors else "Finished.")
+            store.update(job_id, status='done', progress=1.0, message=message)
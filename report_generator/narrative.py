@@ -0,0 +1,203 @@
+"""
+Deterministic, rules-based insight text written from a school's stats: its
+category distribution and how anxiety, pressure, support and high/severe
+stress compare with the national benchmarks (and its peer group, if any).
+No network access; a few microseconds per school.
+"""
+import html
+
+from .aggregation import CATEGORY_KEYS, NATIONAL_BENCHMARKS
+from .rollups import OVERALL_LEVEL
+
+# Bump when the wording or the rules change so incremental runs rebuild.
+NARRATIVE_VERSION = 1
+# Differences smaller than this (percentage points) count as "in line".
+IN_LINE_POINTS = 2.0
+# Fewer responses than this get a caveat about small numbers.
+SMALL_SAMPLE = 10
+DISTRESS_BENCHMARK = NATIONAL_BENCHMARKS['pct_high'] + NATIONAL_BENCHMARKS['pct_severe']
+
+CATEGORY_LABELS = {
+    'balanced': "balanced students",
+    'mild': "students with mild stress",
+    'moderate': "students with moderate stress",
+    'high': "students with high stress",
+    'severe': "students with severe stress",
+}
+
+# area: (label, national figure, lower is better)
+AREAS = {
+    'anxiety_pct': ("Exam anxiety", NATIONAL_BENCHMARKS['anxiety_pct'], True),
+    'parent_pressure_pct': ("Parental pressure", NATIONAL_BENCHMARKS['parent_pressure_pct'], True),
+    'support_pct': ("Support accessibility", NATIONAL_BENCHMARKS['support_pct'], False),
+    'pct_moderate': ("Moderate stress", NATIONAL_BENCHMARKS['pct_moderate'], True),
+    'distress': ("High and severe stress", DISTRESS_BENCHMARK, True),
+}
+
+STRENGTH_TEXT = {
+    'anxiety_pct': "fewer students than usual report frequent nervousness before exams.",
+    'parent_pressure_pct': "families appear to keep performance expectations in proportion.",
+    'support_pct': "students find it easier than most to talk to teachers or counsellors.",
+    'pct_moderate': "fewer students than nationally carry a steady, moderate level of stress.",
+    'distress': "a smaller share of students than nationally is in the high and severe bands.",
+}
+WEAKNESS_TEXT = {
+    'anxiety_pct': "Mock-test desensitisation and short mindfulness routines before exams can bring it down.",
+    'parent_pressure_pct': "Parent sessions on realistic goals and on how pressure affects performance are "
+                           "recommended.",
+    'support_pct': "Regular counsellor drop-in hours and trained teacher mentors would give students someone "
+                   "to turn to.",
+    'pct_moderate': "These students are not in crisis but can tip into the higher bands; whole-class routines "
+                    "for planning revision and managing workload help most of them.",
+    'distress': "These students should be identified early and offered one-to-one follow-up.",
+}
+CONCLUSIONS = {
+    'anxiety_pct': "Prioritise exam readiness: mock tests, study-skills sessions and relaxation techniques.",
+    'parent_pressure_pct': "Prioritise parent engagement on realistic expectations and the cost of "
+                           "performance pressure.",
+    'support_pct': "Prioritise making teachers and counsellors easier to approach, with visible routes to ask "
+                   "for help.",
+    'pct_moderate': "Prioritise whole-class stress-management and study-planning routines, since most students "
+                    "sit in the moderate band.",
+    'distress': "Prioritise early identification and one-to-one follow-up for students in the high and severe "
+                "bands.",
+    None: "Sustain current practices and keep monitoring, as every indicator is at or better than the national "
+          "benchmark.",
+}
+QUOTES = {
+    'anxiety_pct': "You don't have to see the whole staircase, just take the first step.",
+    'parent_pressure_pct': "Comparison is the thief of joy.",
+    'support_pct': "Alone we can do so little; together we can do so much.",
+    'pct_moderate': "Almost everything will work again if you unplug it for a few minutes, including you.",
+    'distress': "Success is not final, failure is not fatal: it is the courage to continue that counts.",
+    None: "It always seems impossible until it's done.",
+}
+
+
+def _value(stats, area):
+    # 'distress' is high plus severe; every other area is a stats key
+    if area == 'distress':
+        return round(stats['pct_high'] + stats['pct_severe'], 1)
+    return stats[area]
+
+
+def _gap(stats, area):
+    """
+    Points better (+) or worse (-) than the national figure.
+    """
+    _, national, lower_is_better = AREAS[area]
+    delta = round(_value(stats, area) - national, 1)
+    return -delta if lower_is_better else delta
+
+
+def _comparison(stats, area):
+    """
+    '9.0 points below the national 81%' / 'in line with the national 28%'.
+    """
+    _, national, _ = AREAS[area]
+    delta = round(_value(stats, area) - national, 1)
+    if abs(delta) < IN_LINE_POINTS:
+        return f"in line with the national {national}%"
+    return f"{abs(delta):.1f} points {'above' if delta > 0 else 'below'} the national {national}%"
+
+
+def _peer_name(peer):
+    """
+    'District North' or 'all schools in the survey', escaped: group names
+    come from the upload and the text is placed into the page as is.
+    """
+    if peer['level'] == OVERALL_LEVEL:
+        return "all schools in the survey"
+    return html.escape(f"{str(peer['level']).title()} {peer['group']}")
+
+
+def _peer_clause(stats, area):
+    peer = stats.get('peer')
+    if not peer:
+        return ""
+    return (f" Across {_peer_name(peer)} ({peer['schools']} schools) the figure is "
+            f"{_value(peer, area):.1f}%.")
+
+
+def local_insights(stats):
+    """
+    Insight dict (the same keys Gemini returns) for one school's `stats`.
+    The same stats always give the same text.
+    """
+    count = stats['count']
+    calm = round(stats['pct_balanced'] + stats['pct_mild'], 1)
+    tense = round(stats['pct_moderate'] + stats['pct_high'] + stats['pct_severe'], 1)
+    distress = _value(stats, 'distress')
+    gaps = {area: _gap(stats, area) for area in AREAS}
+    best = max(gaps, key=gaps.get)
+    worst = min(gaps, key=gaps.get)
+    priority = worst if gaps[worst] <= -IN_LINE_POINTS else None
+
+    if distress >= 25:
+        mood = f"The overall mood is strained: {distress}% of students report high or severe stress."
+    elif calm >= 65:
+        mood = f"The overall mood is settled: {calm}% of students are balanced or only mildly stressed."
+    elif tense >= 60:
+        mood = (f"The overall mood is tense rather than acute: {tense}% report moderate stress or more, "
+                f"though {distress}% are in the high or severe bands.")
+    else:
+        mood = (f"The overall mood is mixed: {calm}% are balanced or mildly stressed, while {distress}% "
+                f"report high or severe stress.")
+    p1 = (f"{count} students took part in the survey. {mood} Exam anxiety ({stats['anxiety_pct']}%) is "
+          f"{_comparison(stats, 'anxiety_pct')}, parental pressure ({stats['parent_pressure_pct']}%) is "
+          f"{_comparison(stats, 'parent_pressure_pct')} and support accessibility ({stats['support_pct']}%) is "
+          f"{_comparison(stats, 'support_pct')}.")
+    if count < SMALL_SAMPLE:
+        p1 += f" With only {count} responses, a few answers can move these figures noticeably."
+
+    dominant = max(CATEGORY_KEYS, key=lambda key: stats[key])
+    p2 = (f"The largest group is {CATEGORY_LABELS[dominant]} ({stats['pct_' + dominant]}%, "
+          f"{stats[dominant]} students). Balanced students make up {stats['pct_balanced']}% against "
+          f"{NATIONAL_BENCHMARKS['pct_balanced']}% nationally, and moderate stress accounts for "
+          f"{stats['pct_moderate']}% (national {NATIONAL_BENCHMARKS['pct_moderate']}%). High and severe stress "
+          f"together cover {distress}% ({stats['high'] + stats['severe']} students), "
+          f"{_comparison(stats, 'distress')}.")
+    peer = stats.get('peer')
+    if peer:
+        peer_distress = _value(peer, 'distress')
+        delta = round(distress - peer_distress, 1)
+        position = ("level with" if abs(delta) < IN_LINE_POINTS
+                    else f"{abs(delta):.1f} points {'above' if delta > 0 else 'below'}")
+        p2 += (f" Across {_peer_name(peer)} ({peer['schools']} schools, {peer['count']} students) "
+               f"the high-and-severe share is {peer_distress:.1f}%, so this school sits {position} its peers.")
+
+    headline = max(gaps, key=lambda area: abs(gaps[area]))
+    if abs(gaps[headline]) < IN_LINE_POINTS:
+        key_finding = "Stress indicators track the national benchmarks closely"
+    else:
+        key_finding = f"{AREAS[headline][0]} {_comparison(stats, headline)}"
+
+    label, national, _ = AREAS[best]
+    if gaps[best] >= IN_LINE_POINTS:
+        strengths = f"{label} is {_value(stats, best)}%, {_comparison(stats, best)}: {STRENGTH_TEXT[best]}"
+    else:
+        strengths = (f"No indicator is clearly better than the national benchmark; the closest is "
+                     f"{label.lower()} at {_value(stats, best)}% (national {national}%).")
+    strengths += _peer_clause(stats, best)
+
+    label, national, _ = AREAS[worst]
+    if priority is not None:
+        weaknesses = f"{label} is {_value(stats, worst)}%, {_comparison(stats, worst)}. {WEAKNESS_TEXT[worst]}"
+    elif gaps[worst] >= IN_LINE_POINTS:
+        weaknesses = (f"Every indicator is better than the national benchmark; the narrowest margin is "
+                      f"{label.lower()} at {_value(stats, worst)}% (national {national}%).")
+    else:
+        weaknesses = (f"No indicator is clearly worse than the national benchmark, but {label.lower()} at "
+                      f"{_value(stats, worst)}% (national {national}%) is the closest to falling behind and "
+                      f"worth keeping an eye on.")
+    weaknesses += _peer_clause(stats, worst)
+
+    return {
+        "p1": p1,
+        "p2": p2,
+        "key_finding": key_finding,
+        "conclusion": CONCLUSIONS[priority],
+        "quote": QUOTES[priority],
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+    }
@@ -0,0 +1,301 @@
+"""
+End-to-end report pipeline: scoring, aggregation, insights and rendering.
+"""
+import hashlib
+
+from .aggregation import aggregate_school_stats, school_stats
+from .cache import file_digest
+from .ingest import DEFAULT_CSV_CHUNKSIZE, read_survey
+from .insights import DEFAULT_INSIGHT_WORKERS
+from .profiling import PipelineProfiler
+from .providers import insight_provider
+from .ratelimit import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+from .rendering import DEFAULT_RENDER_CHUNKSIZE, render_report, render_reports
+from .rollups import Rollup, resolve_peer_level
+from .scoring import (
+    CODE_COLUMNS, GROUP_COLUMN_NAMES, build_scored_frame, categorize_scores, encode_responses, group_column_names,
+    group_columns, is_scored_frame, question_columns, score_responses,
+)
+
+
+class PipelineCallbacks:
+    """
+    Receives progress and status messages from the pipeline. This base class
+    ignores everything; the Streamlit UI and the CLI supply their own.
+    """
+
+    def progress(self, fraction, text=""):
+        pass
+
+    def info(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+
+REPORT_SUFFIX = "_Report.html"
+
+
+def report_filename(school):
+    return f"{school}{REPORT_SUFFIX}"
+
+
+def report_school(name):
+    """
+    School name back from a report_filename().
+    """
+    return name[:-len(REPORT_SUFFIX)] if name.endswith(REPORT_SUFFIX) else name
+
+
+def score_survey(df, question_cols=None):
+    """
+    Adds `total_score` and `category` columns to df and returns the encoded
+    (n_rows, 20) answer matrix used by the aggregation stage.
+    """
+    codes = encode_responses(df, question_cols)
+    df['total_score'] = score_responses(codes)
+    df['category'] = categorize_scores(df['total_score'].to_numpy())
+    return codes
+
+
+def load_scored_survey(source, filename=None, frame_cache=None, engine='auto',
+                       chunksize=DEFAULT_CSV_CHUNKSIZE, callbacks=None, profiler=None, validator=None,
+                       group_names=None):
+    """
+    Returns the scored frame (see build_scored_frame) for an upload, keeping
+    the grouping columns named in `group_names` (GROUP_COLUMN_NAMES by
+    default). With a
+    SurveyFrameCache, a file whose content was seen before is loaded
+    from the cache instead of being parsed and scored again. Returns None
+    (after reporting through `callbacks.error`) if the file does not have
+    the expected columns, or if a fail-fast `validator` (SurveyValidator)
+    finds errors before scoring. Stages are timed on `profiler` if given.
+    """
+    callbacks = callbacks or PipelineCallbacks()
+    profiler = profiler or PipelineProfiler()
+    digest = file_digest(source) if frame_cache is not None and frame_cache.available else None
+    if digest is not None and group_column_names(group_names) != GROUP_COLUMN_NAMES:
+        # Other grouping columns make a different scored frame
+        names = ",".join(group_column_names(group_names))
+        digest = hashlib.sha256(f"{digest}:{names}".encode('utf-8')).hexdigest()
+    if digest is not None:
+        with profiler.stage('cache lookup') as counts:
+            frame = frame_cache.get(digest)
+            counts['rows'] = 0 if frame is None else len(frame)
+        if frame is not None:
+            callbacks.info(f"Loaded {len(frame):,} scored rows from the parsed-data cache.")
+            return frame if _run_validation(validator, frame, callbacks, profiler, group_names) else None
+
+    with profiler.stage('load') as counts:
+        df = read_survey(source, filename=filename, engine=engine, chunksize=chunksize, callbacks=callbacks,
+                         group_names=group_names)
+        counts['rows'] = len(df)
+    question_cols = question_columns(df)
+    if question_cols is None:
+        callbacks.error("CSV format incorrect. Expected at least 28 columns.")
+        return None
+    if 'sname' not in df.columns:
+        callbacks.error("CSV format incorrect. Missing the 'sname' school column.")
+        return None
+    if not _run_validation(validator, df, callbacks, profiler, group_names):
+        return None
+    with profiler.stage('score', rows=len(df)):
+        frame = build_scored_frame(df, score_survey(df, question_cols), group_names)
+    if digest is not None:
+        frame_cache.put(digest, frame)
+    return frame
+
+
+def _run_validation(validator, df, callbacks, profiler, group_names=None):
+    """
+    Runs the validation pre-pass and reports it. False if loading should
+    stop (errors found and the validator fails fast).
+    """
+    if validator is None:
+        return True
+    with profiler.stage('validate', rows=len(df)):
+        report = validator.validate(df, group_names)
+    callbacks.info(report.summary())
+    for warning in report.warnings:
+        callbacks.info(f"Warning: {warning}")
+    if report.ok:
+        return True
+    if validator.fail_fast:
+        callbacks.error("Upload rejected before scoring:\n" + "\n".join(f"- {e}" for e in report.errors))
+        return False
+    for error in report.errors:
+        callbacks.info(f"Continuing despite: {error}")
+    return True
+
+
+def school_stats_table(df):
+    """
+    Per-school stats table (see aggregate_school_stats) for a scored frame,
+    one row per school in upload order.
+    """
+    return aggregate_school_stats(df, df[CODE_COLUMNS].to_numpy())
+
+
+def group_levels(df, group_names=None):
+    """
+    Grouping columns of a scored frame or raw upload, coarsest first, among
+    `group_names` (GROUP_COLUMN_NAMES by default).
+    """
+    exclude = CODE_COLUMNS if is_scored_frame(df) else question_columns(df) or []
+    return group_columns(df.columns, exclude=exclude, names=group_names)
+
+
+def survey_rollup(df, group_names=None):
+    """
+    Rollup (per-school partials, every grouping level and all schools) of a
+    scored frame.
+    """
+    return Rollup.from_frame(df, df[CODE_COLUMNS].to_numpy(), levels=group_levels(df, group_names))
+
+
+def _unknown_peer_level(peer_level, levels):
+    return (f"No '{peer_level}' column to compare schools by. "
+            f"Grouping columns found: {', '.join(map(str, levels)) or 'none'}.")
+
+
+def check_peer_level(df, peer_level, callbacks=None, group_names=None):
+    """
+    True if `peer_level` is None or names a level of `df` ('auto',
+    'overall' or a grouping column present). Otherwise reports the error
+    through `callbacks.error` and returns False; callers check before
+    opening an output, so a bad level writes nothing.
+    """
+    if peer_level is None:
+        return True
+    levels = group_levels(df, group_names)
+    if resolve_peer_level(levels, peer_level) is not None:
+        return True
+    (callbacks or PipelineCallbacks()).error(_unknown_peer_level(peer_level, levels))
+    return False
+
+
+def preview_report(stats_table, school, api_key, model=None, use_cache=True, peer=None, ai_schools=None):
+    """
+    (stats, html) for a single school: only its insight is requested and
+    only its template filled, so one report can be checked without running
+    the whole batch. `peer` is the school's peer-group stats, if compared.
+    The insight comes from the same provider a run would use (see
+    insight_provider), so with `ai_schools` only those schools call Gemini.
+    """
+    stats = school_stats(stats_table, school)
+    if peer:
+        stats['peer'] = peer
+    provider = insight_provider(api_key, model=model, ai_schools=ai_schools, use_cache=use_cache)
+    try:
+        ai_content = provider.generate([(school, stats)])[0]
+    finally:
+        provider.close()
+    return stats, render_report(school, stats, ai_content)
+
+
+def process_data(df, api_key, max_workers=DEFAULT_INSIGHT_WORKERS,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, use_cache=True, batch_size=1,
+                 render_workers=1, render_chunksize=DEFAULT_RENDER_CHUNKSIZE,
+                 callbacks=None, model=None, only_schools=None, on_report=None, profiler=None,
+                 checkpoint_every=None, peer_level=None, provider=None, ai_schools=None, group_names=None):
+    """
+    Generator of (file name, html) report pairs, one per school, rendered
+    lazily so callers can stream them straight into an archive.
+    `df` is either a raw upload or a scored frame from load_scored_survey.
+    Progress and messages go to `callbacks` (a PipelineCallbacks).
+    `render_workers` > 1 fills templates across a process pool.
+    `only_schools` (a set of str names) limits insights and rendering to
+    those schools; `on_report(school, stats, ai_content, html)` is called
+    for every report just before it is yielded.
+    Stage timings, AI latencies and (if enabled) a cProfile of the
+    per-school render loop are collected on `profiler`.
+    With `checkpoint_every`, schools go through insights and rendering in
+    chunks of that many, so finished reports (and on_report calls) arrive
+    steadily instead of only after every insight is in.
+    `peer_level` compares each school with its computed peer group: a
+    grouping column such as 'district' (among `group_names`, if given),
+    'auto' for the finest one present, or 'overall' for all schools in
+    the upload.
+    Insights come from `provider` (an InsightProvider, left open for the
+    caller) or one built from the API key and the request settings: local
+    text without a key, Gemini with one, or Gemini for the `ai_schools`
+    names only and local text for the rest.
+    """
+    callbacks = callbacks or PipelineCallbacks()
+    profiler = profiler or PipelineProfiler()
+    if is_scored_frame(df):
+        codes = df[CODE_COLUMNS].to_numpy()
+    else:
+        # Identify Question Columns (Indices 8 to 27 based on user file)
+        question_cols = question_columns(df)
+        # Ensure we have the right columns
+        if question_cols is None:
+            callbacks.error("CSV format incorrect. Expected at least 28 columns.")
+            return
+
+        # Scoring Logic (vectorized: encode once, score and categorize whole arrays)
+        with profiler.stage('score', rows=len(df)):
+            codes = score_survey(df, question_cols)
+
+    # Per-school stats in a single aggregation pass (rolled up to peer groups if asked)
+    with profiler.stage('aggregate', rows=len(df)) as counts:
+        rollup = None
+        if peer_level is not None:
+            rollup = Rollup.from_frame(df, codes, levels=group_levels(df, group_names))
+            level = rollup.resolve_level(peer_level)
+            if level is None:
+                callbacks.error(_unknown_peer_level(peer_level, rollup.levels))
+                return
+            stats_table = rollup.tables['school']
+        else:
+            stats_table = aggregate_school_stats(df, codes)
+
+        schools = stats_table.index
+        if only_schools is not None:
+            schools = [school for school in schools if str(school) in only_schools]
+        all_stats = [(school, school_stats(stats_table, school)) for school in schools]
+        if rollup is not None:
+            for school, stats in all_stats:
+                peer = rollup.peer_stats(school, level)
+                if peer is not None:
+                    stats['peer'] = peer
+        counts['schools'] = len(all_stats)
+
+    callbacks.progress(0.0)
+
+    # Generate AI Content (concurrently, rate-limited, results in school order)
+    owns_provider = provider is None
+    if owns_provider:
+        provider = insight_provider(
+            api_key, model=model, ai_schools=ai_schools, max_workers=max_workers,
+            requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+            use_cache=use_cache, batch_size=batch_size)
+    step = checkpoint_every or max(len(all_stats), 1)
+    try:
+        for start in range(0, len(all_stats), step):
+            chunk = all_stats[start:start + step]
+            with profiler.stage('insights', schools=len(chunk)):
+                chunk_insights = provider.generate(
+                    chunk, on_progress=lambda done, total, start=start: callbacks.progress(
+                        (start + done) / len(all_stats), "Generating insights..."))
+
+            # Fill Template (optionally across processes, always in school order)
+            items = [(school, stats, ai_content) for (school, stats), ai_content in zip(chunk, chunk_insights)]
+            rendered = iter(render_reports(items, workers=render_workers, chunksize=render_chunksize))
+            for idx, (school, stats, ai_content) in enumerate(items):
+                # Timed per report so the archive writer's share stays out of it
+                with profiler.stage('render', reports=1), profiler.per_school():
+                    html = next(rendered)
+                    callbacks.progress((start + idx + 1) / len(all_stats), "Rendering reports...")
+                    if on_report is not None:
+                        on_report(school, stats, ai_content, html)
+                yield report_filename(school), html
+    finally:
+        profiler.add_latencies('AI request', provider.latencies)
+        if owns_provider:
+            provider.close()
+
+    for message in provider.summaries():
+        callbacks.info(message)
@@ -0,0 +1,192 @@
+"""
+Stage-level timing for the pipeline: wall and CPU time, row/school counts,
+AI request latency percentiles and peak memory, exportable as JSON or as a
+Chrome trace (chrome://tracing, Perfetto).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .ingest import peak_rss_mb
+
+LATENCY_PERCENTILES = (50, 90, 99)
+TOTAL_FIELDS = ('calls', 'wall_s', 'self_s', 'cpu_s', 'peak_rss_mb')
+
+
+class PipelineProfiler:
+    """
+    Collects one event per `stage()` block. A stage entered many times (the
+    per-school render step) is summed in `stage_totals()` and kept as
+    separate slices in the trace. Stages may nest (the export stage drives
+    the lazy pipeline generator); `self_s` is a stage's wall time minus the
+    stages nested in it on the same thread. With `cprofile=True`, code run inside
+    `per_school()` is also profiled with cProfile; templates filled in
+    worker processes are not seen by it.
+    """
+
+    def __init__(self, cprofile=False, clock=time.perf_counter, cpu_clock=time.process_time):
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.origin = clock()
+        self.events = []
+        self.latencies = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profile = cProfile.Profile() if cprofile else None
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Times the block. Yields a dict the caller can add counts to (rows,
+        schools, reports...), which are stored with the event.
+        """
+        counts = dict(counts)
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start, cpu_start = self.clock(), self.cpu_clock()
+        try:
+            yield counts
+        finally:
+            end, cpu_end = self.clock(), self.cpu_clock()
+            nested = stack.pop()
+            if stack:
+                stack[-1] += end - start
+            event = {
+                'name': name, 'start_s': start - self.origin, 'wall_s': end - start,
+                'self_s': end - start - nested, 'cpu_s': cpu_end - cpu_start, 'counts': counts,
+                'peak_rss_mb': peak_rss_mb(), 'thread': threading.get_ident(),
+            }
+            with self.lock:
+                self.events.append(event)
+
+    @contextmanager
+    def per_school(self):
+        """
+        Wraps one iteration of the per-school loop; a no-op unless cProfile
+        was requested.
+        """
+        if self.profile is None:
+            yield
+            return
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+
+    def add_latencies(self, name, seconds):
+        with self.lock:
+            self.latencies.setdefault(name, []).extend(seconds)
+
+    def stage_totals(self):
+        """
+        {stage: {'calls', 'wall_s', 'self_s', 'cpu_s', 'peak_rss_mb', counts...}}
+        in the order the stages first ran.
+        """
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], {'calls': 0, 'wall_s': 0.0, 'self_s': 0.0, 'cpu_s': 0.0,
+                                                      'peak_rss_mb': None})
+            total['calls'] += 1
+            total['wall_s'] += event['wall_s']
+            total['self_s'] += event['self_s']
+            total['cpu_s'] += event['cpu_s']
+            if event['peak_rss_mb'] is not None:
+                total['peak_rss_mb'] = max(total['peak_rss_mb'] or 0.0, event['peak_rss_mb'])
+            for key, value in event['counts'].items():
+                total[key] = total.get(key, 0) + value
+        return totals
+
+    def latency_percentiles(self):
+        """
+        {name: {'count', 'p50_s', 'p90_s', 'p99_s', 'max_s'}} for recorded latencies.
+        """
+        result = {}
+        for name, seconds in self.latencies.items():
+            if not seconds:
+                continue
+            values = np.percentile(np.asarray(seconds, dtype=float), LATENCY_PERCENTILES)
+            result[name] = {'count': len(seconds), 'max_s': float(max(seconds))}
+            for pct, value in zip(LATENCY_PERCENTILES, values):
+                result[name][f'p{pct}_s'] = float(value)
+        return result
+
+    def to_dict(self):
+        return {
+            'stages': self.stage_totals(),
+            'latency': self.latency_percentiles(),
+            'peak_rss_mb': peak_rss_mb(),
+            'events': self.events,
+        }
+
+    def chrome_trace(self):
+        """
+        Trace Event Format dict: one complete ("X") event per stage entry.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                'name': event['name'], 'cat': 'pipeline', 'ph': 'X', 'pid': pid, 'tid': event['thread'],
+                'ts': round(event['start_s'] * 1e6), 'dur': round(event['wall_s'] * 1e6),
+                'args': dict(event['counts'], cpu_ms=round(event['cpu_s'] * 1e3, 3),
+                             peak_rss_mb=event['peak_rss_mb']),
+            }
+            for event in self.events
+        ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def write_cprofile(self, path):
+        """
+        Dumps the cProfile run in pstats format (snakeviz, `python -m pstats`).
+        """
+        if self.profile is None:
+            raise ValueError("cProfile was not enabled for this profiler")
+        self.profile.dump_stats(path)
+
+    def profile_report(self, limit=30, sort='cumulative'):
+        """
+        Top `limit` functions from the cProfile run as text, or "" if cProfile was off.
+        """
+        if self.profile is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def summary(self):
+        lines = []
+        for name, total in self.stage_totals().items():
+            counts = ", ".join(f"{key} {value:,}" for key, value in total.items() if key not in TOTAL_FIELDS)
+            line = f"{name}: {total['wall_s']:.2f}s wall, {total['cpu_s']:.2f}s CPU"
+            if total['self_s'] < total['wall_s'] - 0.005:
+                line += f", {total['self_s']:.2f}s excluding nested stages"
+            if total['calls'] > 1:
+                line += f" over {total['calls']:,} calls"
+            if counts:
+                line += f" ({counts})"
+            lines.append(line)
+        for name, pct in self.latency_percentiles().items():
+            lines.append(f"{name} latency: p50 {pct['p50_s']:.2f}s, p90 {pct['p90_s']:.2f}s, "
+                         f"p99 {pct['p99_s']:.2f}s over {pct['count']:,} requests")
+        rss = peak_rss_mb()
+        if rss is not None:
+            lines.append(f"Peak RSS: {rss:.0f} MB")
+        return "\n".join(lines)
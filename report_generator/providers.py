@@ -0,0 +1,181 @@
+"""
+Insight providers behind one interface: the local rules-based writer, the
+Gemini client, and a selective mix that sends chosen schools to Gemini and
+writes the rest locally.
+"""
+import time
+from abc import ABC, abstractmethod
+
+from .batching import InsightBatcher
+from .cache import InsightCache
+from .insights import DEFAULT_INSIGHT_WORKERS, GEMINI_MODEL_NAME, PROMPT_VERSION, generate_all_insights
+from .narrative import NARRATIVE_VERSION, local_insights
+from .ratelimit import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, RequestScheduler
+
+
+class InsightProvider(ABC):
+    """
+    Writes the insight dict (p1, p2, key_finding, conclusion, quote,
+    strengths, weaknesses) for each (school, stats) pair, in input order.
+    `on_progress(done, total)` is called from the calling thread.
+    `settings` names what shapes the text, so incremental output knows
+    when to rebuild.
+    """
+    name = None
+
+    @property
+    @abstractmethod
+    def settings(self):
+        pass
+
+    @property
+    def latencies(self):
+        return []
+
+    @abstractmethod
+    def generate(self, school_stats_list, on_progress=None):
+        pass
+
+    def summaries(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class LocalInsightProvider(InsightProvider):
+    """
+    School-specific text from the stats and benchmark deltas (narrative.py),
+    with no network access.
+    """
+    name = 'local'
+
+    def __init__(self):
+        self.stats = {'schools': 0, 'seconds': 0.0}
+
+    @property
+    def settings(self):
+        return f"local/v{NARRATIVE_VERSION}"
+
+    def generate(self, school_stats_list, on_progress=None):
+        start = time.perf_counter()
+        results = [local_insights(stats) for _, stats in school_stats_list]
+        self.stats['schools'] += len(results)
+        self.stats['seconds'] += time.perf_counter() - start
+        if on_progress and results:
+            on_progress(len(results), len(results))
+        return results
+
+    def summary(self):
+        schools = self.stats['schools']
+        per_school = self.stats['seconds'] / schools * 1e6 if schools else 0.0
+        return f"Local insights: {schools} schools, {per_school:.1f} microseconds per school, no API calls."
+
+    def summaries(self):
+        return [self.summary()]
+
+
+class GeminiInsightProvider(InsightProvider):
+    """
+    Gemini insights through generate_all_insights: a bounded thread pool,
+    one shared rate-limiting scheduler, the on-disk answer cache and
+    optional batching. `model` substitutes a client (or a fake in tests).
+    """
+    name = 'gemini'
+
+    def __init__(self, api_key, model=None, max_workers=DEFAULT_INSIGHT_WORKERS,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 use_cache=True, batch_size=1):
+        self.api_key = api_key
+        self.model = model
+        self.max_workers = max_workers
+        self.scheduler = RequestScheduler(requests_per_minute, tokens_per_minute)
+        self.cache = InsightCache() if use_cache else None
+        self.batcher = InsightBatcher(batch_size) if batch_size > 1 else None
+
+    @property
+    def settings(self):
+        return f"{GEMINI_MODEL_NAME}/v{PROMPT_VERSION}"
+
+    @property
+    def latencies(self):
+        return self.scheduler.latencies
+
+    def generate(self, school_stats_list, on_progress=None):
+        return generate_all_insights(
+            self.api_key, school_stats_list, max_workers=self.max_workers, model=self.model,
+            scheduler=self.scheduler, cache=self.cache, batcher=self.batcher, on_progress=on_progress)
+
+    def summaries(self):
+        messages = [self.scheduler.summary()]
+        if self.batcher is not None:
+            messages.append(self.batcher.summary())
+        if self.cache is not None:
+            messages.append(self.cache.summary())
+        return messages
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+class SelectiveInsightProvider(InsightProvider):
+    """
+    Sends the schools named in `schools` to `upgrade` (usually Gemini) and
+    every other school to `base` (usually local), so a large batch can be
+    written locally and only selected schools pay for an API call. Its
+    `settings` cover both providers and the selection, so choosing other
+    schools rebuilds incremental output.
+    """
+    name = 'selective'
+
+    def __init__(self, base, upgrade, schools):
+        self.base = base
+        self.upgrade = upgrade
+        self.schools = {str(school) for school in schools}
+
+    @property
+    def settings(self):
+        return f"{self.base.settings}+{self.upgrade.settings}:" + ",".join(sorted(self.schools))
+
+    @property
+    def latencies(self):
+        return self.base.latencies + self.upgrade.latencies
+
+    def generate(self, school_stats_list, on_progress=None):
+        total = len(school_stats_list)
+        picked = [str(school) in self.schools for school, _ in school_stats_list]
+        base_items = [item for item, chosen in zip(school_stats_list, picked) if not chosen]
+        upgrade_items = [item for item, chosen in zip(school_stats_list, picked) if chosen]
+
+        def progress(offset):
+            if on_progress is None:
+                return None
+            return lambda done, _: on_progress(offset + done, total)
+
+        # Skipped when empty so a run with no selected schools creates no client
+        base_results = iter(self.base.generate(base_items, progress(0)) if base_items else [])
+        upgrade_results = iter(self.upgrade.generate(upgrade_items, progress(len(base_items)))
+                               if upgrade_items else [])
+        return [next(upgrade_results) if chosen else next(base_results) for chosen in picked]
+
+    def summaries(self):
+        return self.base.summaries() + self.upgrade.summaries()
+
+    def close(self):
+        self.base.close()
+        self.upgrade.close()
+
+
+def insight_provider(api_key, model=None, ai_schools=None, **gemini_options):
+    """
+    The provider for a run: local text without an API key (or model),
+    Gemini with one, or Gemini for the `ai_schools` names only and local
+    text for everyone else. `gemini_options` go to GeminiInsightProvider.
+    """
+    if not api_key and model is None:
+        return LocalInsightProvider()
+    gemini = GeminiInsightProvider(api_key, model=model, **gemini_options)
+    if ai_schools is None:
+        return gemini
+    return SelectiveInsightProvider(LocalInsightProvider(), gemini, ai_schools)
@@ -0,0 +1,140 @@
+"""
+Token-bucket rate limiting and retry/backoff for model calls.
+"""
+import random
+import re
+import threading
+import time
+
+DEFAULT_REQUESTS_PER_MINUTE = 300
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+DEFAULT_MAX_RETRIES = 5
+# Rough budget for the JSON reply; the prompt itself is estimated at ~4 chars/token.
+EXPECTED_OUTPUT_TOKENS = 500
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# A status code as a whole number in an error message ("429 Resource exhausted"), not part of "5000 bytes".
+_STATUS_IN_MESSAGE = re.compile(r"(?<![\w.])(%s)(?!\w|\.\d)" % "|".join(map(str, sorted(RETRYABLE_STATUS))))
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _error_status(exc):
+    """
+    Best-effort HTTP status of an API exception (google.api_core errors carry
+    `.code`; other clients use `.status_code`). Falls back to a status code
+    appearing as a whole number in the message text.
+    """
+    for attr in ('code', 'status_code'):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    message = str(exc)
+    match = _STATUS_IN_MESSAGE.search(message)
+    if match:
+        return int(match.group(1))
+    if 'quota' in message.lower() or 'rate limit' in message.lower():
+        return 429
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units/minute.
+    acquire() reserves units up front (the balance may go negative) and sleeps
+    until the reservation is covered, so concurrent callers queue fairly.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        if per_minute <= 0:
+            raise ValueError(f"Rate limit must be positive, got {per_minute!r} per minute")
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class RequestScheduler:
+    """
+    Sits in front of the model: every call first takes one request from the
+    RPM bucket and its estimated tokens from the TPM bucket, and calls that
+    fail with 429/5xx are re-queued with exponential backoff and full jitter.
+    Counters in `stats` and per-attempt `latencies` (seconds) are safe to
+    read once the batch is done.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0, clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.request_bucket = TokenBucket(requests_per_minute, clock, sleep)
+        self.token_bucket = TokenBucket(tokens_per_minute, clock, sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'throttled_seconds': 0.0, 'failures': 0}
+        self.latencies = []
+
+    def _record(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _record_latency(self, started):
+        elapsed = self.clock() - started
+        with self.lock:
+            self.latencies.append(elapsed)
+
+    def backoff_delay(self, attempt):
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, prompt, output_tokens=EXPECTED_OUTPUT_TOKENS):
+        """
+        Runs fn(prompt) under the rate limits, retrying retryable errors.
+        Non-retryable errors and exhausted retries are re-raised.
+        """
+        tokens = estimate_tokens(prompt) + output_tokens
+        attempt = 0
+        while True:
+            waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(tokens)
+            self._record('requests')
+            if waited:
+                self._record('throttled_seconds', waited)
+            started = self.clock()
+            try:
+                result = fn(prompt)
+            except Exception as exc:
+                self._record_latency(started)
+                if _error_status(exc) not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    self._record('failures')
+                    raise
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                self._record('retries')
+                self._record('throttled_seconds', delay)
+                self.sleep(delay)
+            else:
+                self._record_latency(started)
+                return result
+
+    def summary(self):
+        s = self.stats
+        return (f"AI requests: {s['requests']} sent, {s['retries']} retried, "
+                f"{s['failures']} failed, {s['throttled_seconds']:.1f}s throttled.")
@@ -0,0 +1,196 @@
+"""
+Precompiled report template rendering.
+"""
+import html
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .template import HTML_TEMPLATE
+
+DEFAULT_RENDER_CHUNKSIZE = 64
+# Chunks submitted per worker ahead of the one being yielded.
+RENDER_CHUNKS_IN_FLIGHT = 2
+
+PLACEHOLDER_PATTERN = re.compile(r'(\[[A-Z][A-Z0-9_]*\])')
+
+# Static scoring legend injected into every report (surrounding whitespace is part of the output).
+SCORING_TABLE_HTML = """
+            <div class="grid grid-cols-5 gap-2 text-center text-xs font-medium text-gray-500">
+                <div class="bg-green-100 p-2 rounded">20-36<br>Balanced</div>
+                <div class="bg-blue-100 p-2 rounded">37-52<br>Mild</div>
+                <div class="bg-yellow-100 p-2 rounded">53-68<br>Moderate</div>
+                <div class="bg-orange-100 p-2 rounded">69-84<br>High</div>
+                <div class="bg-red-100 p-2 rounded">85-100<br>Severe</div>
+            </div>
+            """
+
+REPORT_PLACEHOLDERS = [
+    "[SCHOOL_NAME]", "[EST_YEAR]", "[MODE]", "[COUNT]",
+    "[EXEC_SUMMARY_P1]", "[EXEC_SUMMARY_P2]", "[EXEC_SUMMARY_KEY_FINDING]",
+    "[EXEC_SUMMARY_CONCLUSION]", "[INSERT_KEY_QUOTE]",
+    "[INSERT_FULL_SCORING_TABLE_FROM_USER_PROMPT]",
+    "[VAL_BALANCED]", "[PCT_BALANCED]", "[VAL_MILD]", "[PCT_MILD]", "[VAL_MOD]", "[PCT_MOD]",
+    "[VAL_HIGH]", "[PCT_HIGH]", "[VAL_SEVERE]", "[PCT_SEVERE]", "[VAL_TOTAL]",
+    "[PCT_ANXIETY]", "[PCT_PARENT_PRESSURE]", "[PCT_SUPPORT]",
+    "[INSIGHT_STRENGTHS]", "[INSIGHT_WEAKNESS]", "[PEER_COMPARISON]",
+]
+
+# Rows of the optional peer-group table: (label, stats key).
+PEER_MEASURES = [
+    ("Balanced", 'pct_balanced'), ("Mild Stress", 'pct_mild'), ("Moderate Stress", 'pct_moderate'),
+    ("High Stress", 'pct_high'), ("Severe Stress", 'pct_severe'), ("Exam Anxiety", 'anxiety_pct'),
+    ("Parental Pressure", 'parent_pressure_pct'), ("Support Accessibility", 'support_pct'),
+]
+HIGHER_IS_BETTER = {'pct_balanced', 'support_pct'}
+
+
+class CompiledTemplate:
+    """
+    Template parsed once into literal segments and placeholder slots, so a
+    report is rendered with a single join instead of one str.replace pass
+    per placeholder. Raises ValueError at compile time if the template has
+    [PLACEHOLDER] tokens without a value, or values that never appear.
+    """
+
+    def __init__(self, template, placeholders):
+        self.parts = PLACEHOLDER_PATTERN.split(template)
+        # re.split with a capture group puts tokens at the odd indices.
+        self.slots = [(i, self.parts[i]) for i in range(1, len(self.parts), 2)]
+        found = {name for _, name in self.slots}
+        unknown = sorted(found - set(placeholders))
+        unused = sorted(set(placeholders) - found)
+        if unknown or unused:
+            raise ValueError(f"Template placeholders without a value: {unknown}; "
+                             f"values without a placeholder: {unused}")
+
+    def render(self, values):
+        parts = self.parts[:]
+        for i, name in self.slots:
+            parts[i] = values[name]
+        return "".join(parts)
+
+
+REPORT_TEMPLATE = CompiledTemplate(HTML_TEMPLATE, REPORT_PLACEHOLDERS)
+
+
+def peer_comparison_html(stats):
+    """
+    Table comparing the school with its computed peer group (stats['peer'],
+    see rollups.Rollup.peer_stats); empty when there is no peer group.
+    """
+    peer = stats.get('peer')
+    if not peer:
+        return ""
+    rows = []
+    for label, key in PEER_MEASURES:
+        diff = round(stats[key] - peer[key], 1)
+        if diff == 0:
+            color = "text-gray-500"
+        else:
+            color = "text-green-700" if (diff > 0) == (key in HIGHER_IS_BETTER) else "text-red-600"
+        rows.append(
+            f"""
+                        <tr class="border-b border-gray-100">
+                            <td class="py-3 px-4 text-gray-600">{label}</td>
+                            <td class="py-3 px-4 text-right font-bold text-blue-600">{stats[key]}%</td>
+                            <td class="py-3 px-4 text-right text-gray-500">{peer[key]}%</td>
+                            <td class="py-3 px-4 text-right font-bold {color}">{diff:+.1f} pts</td>
+                        </tr>""")
+    level = html.escape(str(peer['level']).title())
+    group = html.escape(peer['group'])
+    return f"""
+
+            <div class="mb-12">
+                <h3 class="text-2xl font-bold text-navy mb-2 text-center">Peer Group Comparison: <span class="text-blue-600">{level} &ndash; {group}</span></h3>
+                <p class="text-center text-sm text-gray-500 mb-6">Computed from this survey: {peer['schools']} schools, N={peer['count']} students.</p>
+                <table class="w-full max-w-3xl mx-auto text-sm">
+                    <thead>
+                        <tr class="text-xs uppercase tracking-widest text-gray-400 border-b border-gray-200">
+                            <th class="py-2 px-4 text-left">Measure</th>
+                            <th class="py-2 px-4 text-right">School</th>
+                            <th class="py-2 px-4 text-right">Peer Group</th>
+                            <th class="py-2 px-4 text-right">Difference</th>
+                        </tr>
+                    </thead>
+                    <tbody>{"".join(rows)}
+                    </tbody>
+                </table>
+            </div>"""
+
+
+def report_replacements(school, stats, ai_content):
+    return {
+        "[SCHOOL_NAME]": str(school),
+        "[EST_YEAR]": "2024",
+        "[MODE]": "Online Survey",
+        "[COUNT]": str(stats['count']),
+
+        # Exec Summary
+        "[EXEC_SUMMARY_P1]": ai_content.get("p1", ""),
+        "[EXEC_SUMMARY_P2]": ai_content.get("p2", ""),
+        "[EXEC_SUMMARY_KEY_FINDING]": ai_content.get("key_finding", ""),
+        "[EXEC_SUMMARY_CONCLUSION]": ai_content.get("conclusion", ""),
+        "[INSERT_KEY_QUOTE]": ai_content.get("quote", ""),
+
+        # Scoring Table Placeholder
+        "[INSERT_FULL_SCORING_TABLE_FROM_USER_PROMPT]": SCORING_TABLE_HTML,
+
+        # Values
+        "[VAL_BALANCED]": str(stats['balanced']),
+        "[PCT_BALANCED]": str(stats['pct_balanced']),
+        "[VAL_MILD]": str(stats['mild']),
+        "[PCT_MILD]": str(stats['pct_mild']),
+        "[VAL_MOD]": str(stats['moderate']),
+        "[PCT_MOD]": str(stats['pct_moderate']),
+        "[VAL_HIGH]": str(stats['high']),
+        "[PCT_HIGH]": str(stats['pct_high']),
+        "[VAL_SEVERE]": str(stats['severe']),
+        "[PCT_SEVERE]": str(stats['pct_severe']),
+        "[VAL_TOTAL]": str(stats['count']),
+
+        # Indicators
+        "[PCT_ANXIETY]": str(stats['anxiety_pct']),
+        "[PCT_PARENT_PRESSURE]": str(stats['parent_pressure_pct']),
+        "[PCT_SUPPORT]": str(stats['support_pct']),
+
+        # Insights
+        "[INSIGHT_STRENGTHS]": ai_content.get("strengths", ""),
+        "[INSIGHT_WEAKNESS]": ai_content.get("weaknesses", ""),
+        "[PEER_COMPARISON]": peer_comparison_html(stats),
+    }
+
+
+def render_report(school, stats, ai_content):
+    values = report_replacements(school, stats, ai_content)
+    return REPORT_TEMPLATE.render({key: str(val) for key, val in values.items()})
+
+
+def _render_chunk(chunk):
+    return [render_report(school, stats, ai_content) for school, stats, ai_content in chunk]
+
+
+def render_reports(items, workers=1, chunksize=DEFAULT_RENDER_CHUNKSIZE):
+    """
+    Renders a list of (school, stats, ai_content) triples, yielding html in
+    input order. With workers > 1 the list is cut into chunks of `chunksize`
+    and rendered across a process pool; each worker only receives its
+    chunk's stats and insight text. At most RENDER_CHUNKS_IN_FLIGHT chunks
+    per worker are pending at once, so a slow consumer (the zip writer)
+    holds back rendering instead of letting finished html pile up. Output
+    matches the serial path exactly.
+    """
+    if workers <= 1 or len(items) <= chunksize:
+        for school, stats, ai_content in items:
+            yield render_report(school, stats, ai_content)
+        return
+
+    chunks = (items[i:i + chunksize] for i in range(0, len(items), chunksize))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, chunk))
+            if len(pending) >= workers * RENDER_CHUNKS_IN_FLIGHT:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
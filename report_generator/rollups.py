@@ -0,0 +1,126 @@
+"""
+Rollups of the per-school stats to the grouping levels found in an upload
+(region, district, board...) and to all schools together. Every level is
+built by adding per-school partial counts, never from the raw rows again.
+"""
+import pandas as pd
+
+from .aggregation import PARTIAL_COLUMNS, STATS_COLUMNS, finalize_stats, partial_aggregates
+from .scoring import group_columns, question_columns
+
+SCHOOL_LEVEL = 'school'
+OVERALL_LEVEL = 'overall'
+OVERALL_GROUP = 'All schools'
+# process_data(peer_level=...) value that picks the finest grouping column present.
+AUTO_PEER_LEVEL = 'auto'
+
+
+def resolve_peer_level(levels, name):
+    """
+    The level `name` refers to ('auto', 'overall' or one of the grouping
+    columns in `levels`, matched case-insensitively), or None.
+    """
+    key = str(name).strip().lower()
+    if key in (AUTO_PEER_LEVEL, OVERALL_LEVEL):
+        return key
+    return next((level for level in levels if str(level).strip().lower() == key), None)
+
+
+class Rollup:
+    """
+    Per-school partial counts plus each school's group at every level, and
+    the finished stats table for each level in `tables`. Two rollups (for
+    example from separate uploads or chunks of one) combine with merge().
+    A school's group is the first value seen in its rows.
+    """
+
+    def __init__(self, school_partials, membership):
+        self.school_partials = school_partials
+        self.membership = membership
+        self.levels = list(membership.columns)
+        self.tables = {SCHOOL_LEVEL: finalize_stats(school_partials)}
+        self.school_counts = {}
+        for level in self.levels:
+            groups = membership[level]
+            partials = school_partials.groupby(groups, sort=False, observed=True).sum()
+            self.tables[level] = finalize_stats(partials)
+            self.school_counts[level] = groups.value_counts()
+        overall = school_partials.sum().to_frame(OVERALL_GROUP).T
+        self.tables[OVERALL_LEVEL] = finalize_stats(overall)
+        self.school_counts[OVERALL_LEVEL] = pd.Series({OVERALL_GROUP: len(school_partials)})
+
+    @classmethod
+    def from_frame(cls, df, codes, levels=None):
+        """
+        Builds the rollup from a scored frame (or raw upload) and its encoded
+        answers. `levels` defaults to every grouping column present.
+        """
+        if levels is None:
+            levels = group_columns(df.columns, exclude=question_columns(df) or [])
+        school_partials = partial_aggregates(df, codes)
+        membership = df[list(levels)].groupby(df['sname'], sort=False, observed=True).first()
+        if isinstance(membership.index, pd.CategoricalIndex):
+            membership.index = membership.index.astype(membership.index.categories.dtype)
+        membership = membership.astype(object).reindex(school_partials.index)
+        return cls(school_partials, membership)
+
+    def merge(self, other):
+        """
+        Rollup covering the schools of both; a school present in both has
+        its counts added and keeps this rollup's groups.
+        """
+        partials = pd.concat([self.school_partials, other.school_partials])
+        partials = partials.groupby(level=0, sort=False).sum()[PARTIAL_COLUMNS]
+        levels = list(dict.fromkeys(self.levels + other.levels))
+        membership = self.membership.combine_first(other.membership).reindex(partials.index)
+        return Rollup(partials, membership[levels])
+
+    def finest_level(self):
+        return self.levels[-1] if self.levels else OVERALL_LEVEL
+
+    def resolve_level(self, name):
+        """
+        The level `name` refers to ('auto', 'overall' or a grouping column,
+        matched case-insensitively), or None if the upload has no such column.
+        """
+        return resolve_peer_level(self.levels, name)
+
+    def peer_stats(self, school, level=AUTO_PEER_LEVEL):
+        """
+        Stats of the school's group at `level` ('auto' = finest grouping
+        column, 'overall' = every school) as a plain dict with 'level',
+        'group' and 'schools' added, or None if the school has no group there.
+        """
+        if level == AUTO_PEER_LEVEL:
+            level = self.finest_level()
+        if level == OVERALL_LEVEL:
+            group = OVERALL_GROUP
+        else:
+            group = self.membership.at[school, level]
+            if pd.isna(group):
+                return None
+        table = self.tables[level]
+        peer = {key: table.at[group, key].item() for key in STATS_COLUMNS}
+        peer.update(level=level, group=str(group), schools=int(self.school_counts[level][group]))
+        return peer
+
+    def export_table(self):
+        """
+        Long table of every level: `level`, `group` and `schools` columns
+        followed by the stats columns. School rows also carry their groups.
+        """
+        frames = []
+        for level, table in self.tables.items():
+            frame = table.copy()
+            if level == SCHOOL_LEVEL:
+                schools = pd.Series(1, index=table.index)
+                for col in self.levels:
+                    frame[col] = self.membership[col]
+            else:
+                schools = self.school_counts[level].reindex(table.index)
+            frame.insert(0, 'schools', schools.to_numpy())
+            frame.insert(0, 'group', table.index.astype(str))
+            frame.insert(0, 'level', level)
+            frames.append(frame.reset_index(drop=True))
+        columns = ['level', 'group', 'schools'] + STATS_COLUMNS + self.levels
+        return pd.concat(frames, ignore_index=True)[columns]
@@ -0,0 +1,151 @@
+"""
+Vectorized Likert encoding, scoring and stress categorization.
+"""
+import numpy as np
+import pandas as pd
+
+# Likert answers in scale order; an answer's code is its 1-based position here.
+LIKERT_LEVELS = ['Never', 'Rarely', 'Sometimes', 'Often', 'Always']
+SCALE_MAP = {'Never': 1, 'Rarely': 2, 'Sometimes': 3, 'Often': 4, 'Always': 5}
+REVERSE_MAP = {'Never': 5, 'Rarely': 4, 'Sometimes': 3, 'Often': 2, 'Always': 1}
+UNKNOWN_SCORE = 3
+
+# Q1-Q16 (Standard) -> Index 8 to 23, Q17-Q20 (Reverse) -> Index 24 to 27
+QUESTION_START, REVERSE_START, QUESTION_END = 8, 24, 28
+NUM_STANDARD = REVERSE_START - QUESTION_START
+
+CATEGORY_LABELS = ['Balanced', 'Mild', 'Moderate', 'High', 'Severe']
+CATEGORY_THRESHOLDS = np.array([36, 52, 68, 84])
+
+# Lookup tables indexed by answer code; code 0 is an unknown/blank answer.
+FORWARD_SCORES = np.array([UNKNOWN_SCORE] + [SCALE_MAP[level] for level in LIKERT_LEVELS], dtype=np.int16)
+REVERSE_SCORES = np.array([UNKNOWN_SCORE] + [REVERSE_MAP[level] for level in LIKERT_LEVELS], dtype=np.int16)
+
+
+# Set by the lean loader, which drops the columns that fix questions at positions 8-27.
+QUESTION_COLUMNS_ATTR = 'question_columns'
+# The upload's full header, set by read_survey for the validation pre-pass.
+HEADER_ATTR = 'header'
+# The upload's question headers on a scored frame, whose answers are q1..q20.
+QUESTION_NAMES_ATTR = 'question_names'
+
+# Headers (matched case-insensitively) that group schools for rollups and
+# peer comparisons, coarsest first. Callers can pass their own list (the
+# CLI's --group-columns) as `group_names`.
+GROUP_COLUMN_NAMES = ('region', 'state', 'board', 'district', 'zone', 'block', 'cluster')
+
+
+def group_column_names(names=None):
+    """
+    Normalised grouping column names, coarsest first: GROUP_COLUMN_NAMES
+    for None, otherwise `names` (a list, or a comma-separated string such
+    as 'state, City') lower-cased, without blanks or repeats.
+    """
+    if names is None:
+        return GROUP_COLUMN_NAMES
+    if isinstance(names, str):
+        names = names.split(',')
+    return tuple(dict.fromkeys(key for key in (str(name).strip().lower() for name in names) if key))
+
+
+def group_columns(columns, exclude=(), names=None):
+    """
+    Column names in `columns` that are grouping columns, in the order of
+    `names` (see group_column_names); names in `exclude` (the questions)
+    are skipped.
+    """
+    names = group_column_names(names)
+    by_name = {}
+    for col in columns:
+        key = str(col).strip().lower()
+        if key in names and col not in exclude:
+            by_name.setdefault(key, col)
+    return [by_name[name] for name in names if name in by_name]
+
+
+def find_group_column(columns, name, exclude=(), names=None):
+    """
+    The grouping column in `columns` that `name` refers to (matched
+    case-insensitively), or None.
+    """
+    key = str(name).strip().lower()
+    return next((col for col in group_columns(columns, exclude, names) if str(col).strip().lower() == key), None)
+
+
+def question_columns(df):
+    """
+    Names of the 20 Likert question columns: positions 8-27 of the upload,
+    or the list recorded in df.attrs by the lean loader. None if the frame
+    has too few columns.
+    """
+    recorded = df.attrs.get(QUESTION_COLUMNS_ATTR)
+    if recorded is not None:
+        return list(recorded)
+    cols = df.columns.tolist()
+    if len(cols) < QUESTION_END:
+        return None
+    return cols[QUESTION_START:QUESTION_END]
+
+
+def encode_responses(df, question_cols=None):
+    """
+    Encodes the 20 Likert question columns into an (n_rows, 20) int8 matrix.
+    Codes are 1-5 (Never..Always); anything else (typos, blanks) is 0.
+    """
+    question_cols = question_cols if question_cols is not None else question_columns(df)
+    levels = pd.Index(LIKERT_LEVELS)
+    codes = np.empty((len(df), QUESTION_END - QUESTION_START), dtype=np.int8)
+    for j, col in enumerate(question_cols):
+        # get_indexer gives -1 for anything not in LIKERT_LEVELS, so unknowns land on 0.
+        codes[:, j] = levels.get_indexer(df[col]).astype(np.int8) + 1
+    return codes
+
+
+# Column names of the encoded answers in a scored frame (see build_scored_frame).
+CODE_COLUMNS = [f'q{i}' for i in range(1, QUESTION_END - QUESTION_START + 1)]
+SCORED_COLUMNS = ['sname'] + CODE_COLUMNS + ['total_score', 'category']
+
+
+def score_responses(codes):
+    """
+    Sums standard scores for Q1-Q16 and reverse scores for Q17-Q20 per row.
+    Unknown answers score 3 on either scale.
+    """
+    standard = FORWARD_SCORES[codes[:, :NUM_STANDARD]].sum(axis=1, dtype=np.int64)
+    reverse = REVERSE_SCORES[codes[:, NUM_STANDARD:]].sum(axis=1, dtype=np.int64)
+    return standard + reverse
+
+
+def categorize_scores(totals):
+    """
+    Maps total scores onto the five stress categories (<=36, <=52, <=68, <=84, above).
+    """
+    idx = np.searchsorted(CATEGORY_THRESHOLDS, totals, side='left')
+    return pd.Categorical.from_codes(idx, categories=CATEGORY_LABELS)
+
+
+def build_scored_frame(df, codes, group_names=None):
+    """
+    Compact frame holding everything later stages need: sname, any grouping
+    columns (district, region... or those named in `group_names`), the
+    encoded answers (int8 q1..q20), total_score (int16) and category. This
+    is what the parsed-data cache stores instead of the raw upload. The
+    upload's header and question names are kept in `attrs` for validation
+    messages.
+    """
+    frame = pd.DataFrame(codes, columns=CODE_COLUMNS)
+    frame.insert(0, 'sname', df['sname'].reset_index(drop=True))
+    question_cols = question_columns(df) or []
+    for position, col in enumerate(group_columns(df.columns, exclude=question_cols, names=group_names), start=1):
+        frame.insert(position, col, df[col].astype('category').reset_index(drop=True))
+    frame['total_score'] = df['total_score'].to_numpy().astype(np.int16)
+    frame['category'] = pd.Categorical(df['category'], categories=CATEGORY_LABELS)
+    if df.attrs.get(HEADER_ATTR) is not None:
+        frame.attrs[HEADER_ATTR] = [str(col) for col in df.attrs[HEADER_ATTR]]
+    if question_cols:
+        frame.attrs[QUESTION_NAMES_ATTR] = [str(col) for col in question_cols]
+    return frame
+
+
+def is_scored_frame(df):
+    return all(col in df.columns for col in SCORED_COLUMNS)
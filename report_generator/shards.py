@@ -0,0 +1,199 @@
+"""
+Sharded export for very large batches: reports are split across several
+zip archives (by school count, size, name prefix or grouping column),
+shards are compressed in parallel and an index records which shard holds
+each school.
+"""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .assets import AssetBundle
+from .cache import file_digest
+from .export import DEFAULT_CODEC, DEFAULT_COMPRESSION_LEVEL, _zip_reports, safe_filename
+from .pipeline import report_school
+
+INDEX_VERSION = 1
+DEFAULT_EXPORT_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_BASE_NAME = "school_reports"
+PREFIX_SHARDING = 'prefix'
+UNGROUPED = "ungrouped"
+
+
+def prefix_key(school):
+    """
+    Upper-cased first letter or digit of the school name, '#' if it has none.
+    """
+    match = re.search(r"[A-Za-z0-9]", school)
+    return match.group(0).upper() if match else "#"
+
+
+def group_key(frame, column):
+    """
+    Shard key function mapping each school of a scored frame to its value
+    in grouping column `column` ('ungrouped' if blank).
+    """
+    groups = frame[column].groupby(frame['sname'], sort=False, observed=True).first()
+    mapping = {str(school): str(group) for school, group in groups.items() if not pd.isna(group)}
+    return lambda school: mapping.get(school, UNGROUPED)
+
+
+def shard_target(output):
+    """
+    (directory, base name) for shards of `output`: 'out/reports.zip'
+    gives out/reports-001.zip..., a directory gives
+    dir/school_reports-001.zip...
+    """
+    if output.lower().endswith(".zip"):
+        return os.path.dirname(output) or ".", os.path.splitext(os.path.basename(output))[0]
+    return output, DEFAULT_BASE_NAME
+
+
+def index_path(out_dir, base_name=DEFAULT_BASE_NAME):
+    return os.path.join(out_dir, f"{base_name}-index.json")
+
+
+class _Shard:
+    def __init__(self, key, part, bundle_assets):
+        self.key = key
+        self.part = part
+        self.pages = []
+        self.size = 0
+        self.bundle = AssetBundle() if bundle_assets else None
+
+    def add(self, name, html, content):
+        # Pages arrive bundled already; this records their classes for the shard's stylesheet
+        if self.bundle is not None:
+            self.bundle.page(html)
+        self.pages.append((name, content))
+        self.size += len(content)
+
+    def filename(self, base_name):
+        if self.key is None:
+            return f"{base_name}-{self.part:03d}.zip"
+        return f"{base_name}-{_key_stem(self.key)}-{self.part:03d}.zip"
+
+
+def _key_stem(key):
+    """
+    Shard key as a file name part. A key that had to be made safe gets a
+    short hash of the original, so 'North/East' and 'North_East' do not
+    write the same file.
+    """
+    stem = safe_filename(key)
+    if stem != key:
+        stem += "-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+    return stem
+
+
+def _write_shard(path, shard, compresslevel, codec):
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            _zip_reports(f, shard.pages, compresslevel, shard.bundle, codec)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return os.path.getsize(path), file_digest(path)
+
+
+def write_report_shards(reports, out_dir, base_name=DEFAULT_BASE_NAME, max_schools=None, max_bytes=None,
+                        key=None, shard_by=None, compresslevel=DEFAULT_COMPRESSION_LEVEL, codec=DEFAULT_CODEC,
+                        workers=DEFAULT_EXPORT_WORKERS, bundle_assets=False):
+    """
+    Streams (name, html) pairs into zip shards under `out_dir` and writes
+    `<base_name>-index.json` mapping each school to its shard. A shard
+    holds at most `max_schools` reports and `max_bytes` of uncompressed
+    HTML, counted after bundling with `bundle_assets`. With `key` (school
+    name -> shard key, e.g. prefix_key) reports are grouped first and each
+    group split by the same limits; `shard_by` just labels the grouping in
+    the index.
+
+    Each full shard is compressed on a worker thread (zlib, bz2 and lzma
+    release the GIL) while later reports are still rendering. One open
+    shard per key is held uncompressed, plus up to two per worker queued
+    for compression. Shards listed by a previous index in `out_dir` that
+    this run did not rewrite are removed. Returns the index dict.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _load_index(index_path(out_dir, base_name))
+    open_shards, parts, done, pending = {}, {}, [], []
+    linker = AssetBundle() if bundle_assets else None
+
+    def flush(shard, pool):
+        path = os.path.join(out_dir, shard.filename(base_name))
+        pending.append((shard, pool.submit(_write_shard, path, shard, compresslevel, codec)))
+        while len(pending) > 2 * workers:
+            done.append(_finish(*pending.pop(0), base_name))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for name, html in reports:
+            if linker is not None:
+                html = linker.page(html)
+            content = html.encode("utf-8")
+            shard_key = key(report_school(name)) if key is not None else None
+            shard = open_shards.get(shard_key)
+            if shard is not None and (
+                    (max_schools and len(shard.pages) >= max_schools)
+                    or (max_bytes and shard.size + len(content) > max_bytes)):
+                flush(shard, pool)
+                shard = None
+            if shard is None:
+                parts[shard_key] = parts.get(shard_key, 0) + 1
+                shard = open_shards[shard_key] = _Shard(shard_key, parts[shard_key], bundle_assets)
+            shard.add(name, html, content)
+        for shard in open_shards.values():
+            flush(shard, pool)
+        done.extend(_finish(shard, future, base_name) for shard, future in pending)
+
+    done.sort(key=lambda entry: (entry['key'] is not None, str(entry['key']), entry['part']))
+    index = {
+        'version': INDEX_VERSION,
+        'shard_by': shard_by or ('size' if max_bytes and not max_schools else 'count'),
+        'max_schools': max_schools, 'max_bytes': max_bytes,
+        'codec': codec, 'compresslevel': compresslevel, 'bundle_assets': bool(bundle_assets),
+        'shards': [{k: v for k, v in entry.items() if k != 'schools'} for entry in done],
+        'schools': {school: entry['file'] for entry in done for school in entry['schools']},
+    }
+    written = {entry['file'] for entry in done}
+    for entry in (previous or {}).get('shards', []):
+        stale = os.path.join(out_dir, safe_filename(entry['file']))
+        if entry['file'] not in written and os.path.exists(stale):
+            os.remove(stale)
+    with open(index_path(out_dir, base_name), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    return index
+
+
+def _finish(shard, future, base_name):
+    compressed, digest = future.result()
+    return {
+        'file': shard.filename(base_name), 'key': shard.key, 'part': shard.part,
+        'reports': len(shard.pages), 'uncompressed_bytes': shard.size, 'compressed_bytes': compressed,
+        'sha256': digest, 'schools': [report_school(name) for name, _ in shard.pages],
+    }
+
+
+def _load_index(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) and index.get('version') == INDEX_VERSION else None
+
+
+def shard_summary(index):
+    shards = index['shards']
+    compressed = sum(entry['compressed_bytes'] for entry in shards)
+    codec = index['codec']
+    if codec not in ('lzma', 'store') and index['compresslevel'] > 0:
+        codec += f" level {index['compresslevel']}"
+    return (f"Wrote {len(index['schools'])} reports into {len(shards)} shards "
+            f"({compressed / (1024 * 1024):.1f} MB, {codec}).")
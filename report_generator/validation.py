@@ -0,0 +1,183 @@
+"""
+Validation pre-pass run right after ingestion, before scoring or any AI
+calls: unknown-answer rates per question, shifted or misplaced headers,
+rows without a school name and schools with too few responses.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from .scoring import (
+    CODE_COLUMNS, HEADER_ATTR, QUESTION_END, QUESTION_NAMES_ATTR, QUESTION_START, encode_responses,
+    group_column_names, is_scored_frame, question_columns,
+)
+
+DEFAULT_MAX_UNKNOWN_RATE = 0.15
+DEFAULT_MIN_RESPONSES = 10
+# Rows and values listed in messages; the report keeps all of them.
+MAX_LISTED = 10
+BLANK_LABEL = "(blank)"
+# Headers that are never question text: finding one (or a grouping column,
+# see non_question_headers) among the question positions means the columns
+# are shifted.
+NON_QUESTION_HEADERS = frozenset({'sname', 'timestamp', 'email', 'email address', 'name', 'school', 'class',
+                                  'grade', 'section', 'gender', 'age', 'roll no'})
+_QUESTION_NUMBER = re.compile(r"^\s*q(uestion)?\s*\d+\b", re.I)
+
+
+def non_question_headers(group_names=None):
+    """
+    NON_QUESTION_HEADERS plus the grouping columns in use (`group_names`,
+    GROUP_COLUMN_NAMES by default), lower-cased.
+    """
+    return NON_QUESTION_HEADERS | frozenset(group_column_names(group_names))
+
+
+def looks_like_question(header):
+    """
+    True for headers such as 'Q7', 'Question 12' or a statement/question
+    of several words.
+    """
+    text = str(header).strip()
+    if text.lower().startswith('unnamed:'):
+        return False
+    return bool(_QUESTION_NUMBER.match(text)) or text.endswith('?') or len(text.split()) >= 5
+
+
+class ValidationReport:
+    """
+    Result of SurveyValidator.validate(). `errors` make the upload unfit
+    for reports (answers would silently score as neutral); `warnings` are
+    worth a look but do not block.
+    """
+
+    def __init__(self, rows, unknown_rates, unknown_values, misplaced_headers, blank_school_rows, small_schools,
+                 max_unknown_rate, min_responses):
+        self.rows = rows
+        self.unknown_rates = unknown_rates
+        self.unknown_values = unknown_values
+        self.misplaced_headers = misplaced_headers
+        self.blank_school_rows = blank_school_rows
+        self.small_schools = small_schools
+        self.errors = []
+        self.warnings = []
+
+        for col, rate in unknown_rates.items():
+            if rate > max_unknown_rate:
+                seen = ", ".join(f"{value!r} x{count}" for value, count in unknown_values.get(col, []))
+                self.errors.append(f"Question column '{col}': {rate:.0%} of answers are not "
+                                   f"Never/Rarely/Sometimes/Often/Always" + (f" ({seen})." if seen else "."))
+        for position, header, reason, blocking in misplaced_headers:
+            (self.errors if blocking else self.warnings).append(f"Column {position + 1} '{header}': {reason}.")
+        if blank_school_rows:
+            listed = ", ".join(map(str, blank_school_rows[:MAX_LISTED]))
+            more = "..." if len(blank_school_rows) > MAX_LISTED else ""
+            self.warnings.append(f"{len(blank_school_rows):,} rows have no school name (sname) and are left out "
+                                 f"of every report: rows {listed}{more}.")
+        if small_schools:
+            listed = ", ".join(f"{school} ({count})" for school, count in list(small_schools.items())[:MAX_LISTED])
+            more = "..." if len(small_schools) > MAX_LISTED else ""
+            self.warnings.append(f"{len(small_schools)} schools have fewer than {min_responses} responses: "
+                                 f"{listed}{more}.")
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            'rows': self.rows, 'errors': self.errors, 'warnings': self.warnings,
+            'unknown_rates': self.unknown_rates, 'unknown_values': self.unknown_values,
+            'misplaced_headers': [{'column': position + 1, 'header': header, 'reason': reason, 'error': blocking}
+                                  for position, header, reason, blocking in self.misplaced_headers],
+            'blank_school_rows': self.blank_school_rows, 'small_schools': self.small_schools,
+        }
+
+    def summary(self):
+        worst = max(self.unknown_rates.values(), default=0.0)
+        return (f"Validation: {self.rows:,} rows, {len(self.errors)} errors, {len(self.warnings)} warnings "
+                f"(highest unknown-answer rate {worst:.1%}).")
+
+
+class SurveyValidator:
+    """
+    Vectorized checks on an upload (raw or scored). `fail_fast` makes
+    load_scored_survey stop on errors; otherwise they are reported and
+    loading continues. The last report is kept on `.report`.
+    """
+
+    def __init__(self, max_unknown_rate=DEFAULT_MAX_UNKNOWN_RATE, min_responses=DEFAULT_MIN_RESPONSES,
+                 fail_fast=True):
+        self.max_unknown_rate = max_unknown_rate
+        self.min_responses = min_responses
+        self.fail_fast = fail_fast
+        self.report = None
+
+    def validate(self, df, group_names=None):
+        """
+        Checks `df` and returns (and keeps) its ValidationReport.
+        `group_names` are the grouping columns in use, which must not sit
+        among the questions.
+        """
+        if is_scored_frame(df):
+            # Named after the upload's headers when the frame still knows them
+            question_cols = df.attrs.get(QUESTION_NAMES_ATTR) or CODE_COLUMNS
+            unknown = df[CODE_COLUMNS].to_numpy() == 0
+        else:
+            question_cols = question_columns(df)
+            unknown = encode_responses(df, question_cols) == 0
+        rates = unknown.mean(axis=0) if len(df) else np.zeros(len(question_cols))
+        unknown_rates = {str(col): round(float(rate), 4) for col, rate in zip(question_cols, rates)}
+
+        # Offending values only for the columns over the limit (raw uploads only)
+        unknown_values = {}
+        for j, col in enumerate(question_cols):
+            if rates[j] > self.max_unknown_rate and col in df.columns and not is_scored_frame(df):
+                values = df[col][unknown[:, j]].astype(object).fillna(BLANK_LABEL).value_counts().head(3)
+                unknown_values[str(col)] = [(str(value), int(count)) for value, count in values.items()]
+
+        blank = _blank_school_mask(df['sname'])
+        counts = df['sname'][~blank].value_counts(sort=False)
+        counts = counts[counts > 0]
+        small = counts[counts < self.min_responses].sort_values()
+
+        self.report = ValidationReport(
+            rows=len(df), unknown_rates=unknown_rates, unknown_values=unknown_values,
+            misplaced_headers=misplaced_headers(df.attrs.get(HEADER_ATTR), group_names),
+            # Spreadsheet row numbers: the header is row 1
+            blank_school_rows=(np.flatnonzero(blank.to_numpy()) + 2).tolist(),
+            small_schools={str(school): int(count) for school, count in small.items()},
+            max_unknown_rate=self.max_unknown_rate, min_responses=self.min_responses,
+        )
+        return self.report
+
+
+def _blank_school_mask(sname):
+    if isinstance(sname.dtype, pd.CategoricalDtype):
+        blank_categories = [cat for cat in sname.cat.categories if str(cat).strip() == '']
+        return sname.isna() | sname.isin(blank_categories)
+    return sname.isna() | sname.astype(str).str.strip().eq('')
+
+
+def misplaced_headers(header, group_names=None):
+    """
+    [(position, header, reason, is_error)] for known non-question headers
+    (see non_question_headers) inside positions 8-27 and question-like
+    headers outside them. Only numbered ones ('Q21') outside are errors: a
+    free-text header there may be an open comment question. Empty when the
+    header is unknown (a frame not read by read_survey).
+    """
+    if not header:
+        return []
+    non_questions = non_question_headers(group_names)
+    problems = []
+    for position, name in enumerate(header):
+        in_questions = QUESTION_START <= position < QUESTION_END
+        if in_questions and str(name).strip().lower() in non_questions:
+            problems.append((position, name, "expected a question here; the columns look shifted", True))
+        elif not in_questions and looks_like_question(name):
+            problems.append((position, name, "looks like a question but is outside columns "
+                                             f"{QUESTION_START + 1}-{QUESTION_END}, so it is not scored",
+                             bool(_QUESTION_NUMBER.match(str(name)))))
+    return problems
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+# Raw upload layout: 8 leading columns (sname last), Q1-Q20 at positions 8-27, then free text.
+LEADING_COLUMNS = ['Timestamp', 'Email', 'Name', 'Class', 'Section', 'Gender', 'Age', 'sname']
+QUESTION_HEADERS = [f'Q{i}' for i in range(1, 21)]
+# Valid answers plus the typos and blanks an export contains.
+ANSWERS = np.array(['Never', 'Rarely', 'Sometimes', 'Often', 'Always', 'always', '', None, 'Sometime'], dtype=object)
+ANSWER_WEIGHTS = [.18, .18, .18, .18, .18, .02, .02, .03, .03]
+# One school's aggregated stats, as aggregation.school_stats returns them.
+STATS = {'count': 120, 'balanced': 30, 'mild': 40, 'moderate': 25, 'high': 15, 'severe': 10,
+         'pct_balanced': 25.0, 'pct_mild': 33.3, 'pct_moderate': 20.8, 'pct_high': 12.5, 'pct_severe': 8.3,
+         'anxiety_pct': 72.5, 'parent_pressure_pct': 61.7, 'support_pct': 34.2}
+
+
+def survey_frame(rows=2000, schools=20, seed=0, extra=None):
+    """
+    Synthetic raw upload with `rows` responses spread over `schools`
+    schools (some rows without a school name). `extra` adds columns.
+    """
+    rng = np.random.default_rng(seed)
+    data = {col: ['x'] * rows for col in LEADING_COLUMNS}
+    data['sname'] = rng.choice([f'School {i}' for i in range(schools)] + [None], rows)
+    for col in QUESTION_HEADERS:
+        data[col] = rng.choice(ANSWERS, rows, p=ANSWER_WEIGHTS)
+    data['Comment'] = ['ok'] * rows
+    df = pd.DataFrame(data)
+    for name, values in (extra or {}).items():
+        df[name] = values
+    return df
+
+
+def schools(n):
+    """
+    `(school, stats)` pairs for n schools sharing STATS.
+    """
+    return [(f"School {i}", dict(STATS)) for i in range(n)]
+
+
+@pytest.fixture
+def make_survey():
+    return survey_frame
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from conftest import survey_frame
+
+from report_generator.aggregation import STATS_COLUMNS, aggregate_school_stats, school_stats
+from report_generator.pipeline import score_survey
+
+
+def reference_stats(df):
+    """
+    The original per-school stats loop, kept as the reference.
+    """
+    cols = df.columns.tolist()
+    result = {}
+    for school in df['sname'].unique():
+        if pd.isna(school):
+            continue
+        sdf = df[df['sname'] == school]
+        total = len(sdf)
+        cats = sdf['category'].astype(str).value_counts()
+        result[school] = {
+            'count': total,
+            'balanced': cats.get('Balanced', 0),
+            'mild': cats.get('Mild', 0),
+            'moderate': cats.get('Moderate', 0),
+            'high': cats.get('High', 0),
+            'severe': cats.get('Severe', 0),
+            'pct_balanced': round(cats.get('Balanced', 0)/total*100, 1),
+            'pct_mild': round(cats.get('Mild', 0)/total*100, 1),
+            'pct_moderate': round(cats.get('Moderate', 0)/total*100, 1),
+            'pct_high': round(cats.get('High', 0)/total*100, 1),
+            'pct_severe': round(cats.get('Severe', 0)/total*100, 1),
+            'anxiety_pct': round(len(sdf[sdf[cols[8]].isin(['Often', 'Always'])]) / total * 100, 1),
+            'parent_pressure_pct': round(len(sdf[sdf[cols[12]].isin(['Often', 'Always'])]) / total * 100, 1),
+            'support_pct': round(len(sdf[sdf[cols[26]].isin(['Often', 'Always'])]) / total * 100, 1),
+        }
+    return result
+
+
+def test_stats_match_per_school_loop():
+    # Many schools plus one of 2000 responses, where percentages are
+    # multiples of 0.05 and rounding ties are common.
+    df = pd.concat([survey_frame(rows=4000, schools=60, seed=2),
+                    survey_frame(rows=2000, schools=1, seed=3).assign(sname='Large School')],
+                   ignore_index=True)
+    codes = score_survey(df)
+    expected = reference_stats(df)
+    table = aggregate_school_stats(df, codes)
+    assert list(table.index) == list(expected)
+    for school, stats in expected.items():
+        assert school_stats(table, school) == stats, school
+
+
+def test_rounding_ties_follow_the_original_formulas():
+    # 1591/2000 = 79.55% and 93/2000 = 4.65%: numpy and Python round these differently
+    categories = ['Moderate'] * 1591 + ['High'] * 93 + ['Mild'] * 316
+    df = survey_frame(rows=2000, schools=1, seed=4).assign(sname='S')
+    codes = score_survey(df)
+    df['category'] = pd.Categorical(categories, categories=['Balanced', 'Mild', 'Moderate', 'High', 'Severe'])
+    stats = school_stats(aggregate_school_stats(df, codes), 'S')
+    assert stats['pct_moderate'] == np.round(np.int64(1591) / 2000 * 100, 1)
+    assert stats['pct_high'] == np.round(np.int64(93) / 2000 * 100, 1)
+    assert set(stats) == set(STATS_COLUMNS)
@@ -0,0 +1,53 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("streamlit")
+from conftest import survey_frame
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+from report_generator import cache, jobs
+from report_generator.jobs import JobRunner, JobStore
+
+APP = os.path.join(os.path.dirname(__file__), os.pardir, "app.py")
+
+
+@pytest.fixture
+def finished_job(tmp_path, monkeypatch):
+    # Keep the app's caches and job store out of the real ~/.cache
+    monkeypatch.setenv("REPORT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, 'CACHE_DIR', str(tmp_path / "cache"))
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path / "cache" / "jobs"))
+    path = tmp_path / "survey.csv"
+    survey_frame(rows=300, schools=6).to_csv(path, index=False)
+    runner = JobRunner(JobStore())
+    job_id = runner.submit(str(path), "survey.csv", "", use_cache=False)
+    runner.wait(job_id)
+    assert runner.status(job_id)['status'] == 'done'
+    return runner, job_id
+
+
+@pytest.fixture
+def served_files(monkeypatch):
+    served = {}
+    original = MemoryMediaFileStorage.load_and_get_id
+
+    def load_and_get_id(self, path_or_data, mimetype, kind, filename=None):
+        served[filename] = path_or_data
+        return original(self, path_or_data, mimetype, kind, filename)
+
+    monkeypatch.setattr(MemoryMediaFileStorage, 'load_and_get_id', load_and_get_id)
+    return served
+
+
+def test_finished_job_offers_a_valid_zip_download(finished_job, served_files, tmp_path):
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    assert not at.exception
+    assert [button.proto.label for button in at.get('download_button')] == ["Download All Reports (ZIP)"]
+    archive = zipfile.ZipFile(io.BytesIO(served_files["school_reports.zip"]))
+    assert len(archive.namelist()) == 6
+    assert archive.testzip() is None
+    assert (tmp_path / "cache" / "frames").is_dir()
@@ -0,0 +1,67 @@
+import re
+import zipfile
+
+from conftest import STATS
+
+from report_generator.assets import (
+    SCRIPT_PATH, STYLESHEET_PATH, TEMPLATE_CLASSES, AssetBundle, _escape, build_stylesheet,
+)
+from report_generator.export import write_report_directory, write_report_zip
+from report_generator.narrative import local_insights
+from report_generator.rendering import render_report
+
+PEER = dict(STATS, level='district', group='North', schools=4, count=480, pct_balanced=20.0, support_pct=30.0)
+
+
+def reports():
+    # One page with a peer table, so its classes are covered too
+    return [
+        ("A_Report.html", render_report("A", dict(STATS, peer=PEER), local_insights(STATS))),
+        ("B_Report.html", render_report("B", STATS, local_insights(STATS))),
+    ]
+
+
+def page_classes(pages):
+    classes = set()
+    for _, html in pages:
+        for match in re.finditer(r'class="([^"]*)"', html):
+            classes.update(match.group(1).split())
+    return classes
+
+
+def test_stylesheet_covers_every_class_the_template_uses():
+    classes = page_classes(reports())
+    css, unsupported = build_stylesheet(classes)
+    assert unsupported == []
+    for class_name in classes:
+        selector = "." + (class_name if class_name in TEMPLATE_CLASSES else _escape(class_name))
+        assert selector in css, class_name
+
+
+def test_bundle_is_written_and_linked_from_every_page(tmp_path):
+    path = tmp_path / "reports.zip"
+    assert write_report_zip(reports(), str(path), bundle_assets=True) == 2
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        assert sorted(names) == sorted(["A_Report.html", "B_Report.html", STYLESHEET_PATH, SCRIPT_PATH])
+        css = archive.read(STYLESHEET_PATH).decode("utf-8")
+        pages = [archive.read(name).decode("utf-8") for name in names if name.endswith(".html")]
+    for html in pages:
+        assert f'<link rel="stylesheet" href="{STYLESHEET_PATH}">' in html
+        assert f'<script src="{SCRIPT_PATH}"></script>' in html
+        assert "<style>" not in html
+        assert "cdn.tailwindcss.com" not in html
+    assert css == build_stylesheet(page_classes(reports()))[0]
+
+    out = tmp_path / "reports"
+    write_report_directory(reports(), str(out), bundle_assets=True)
+    assert (out / STYLESHEET_PATH).read_text(encoding="utf-8") == css
+    assert (out / SCRIPT_PATH).exists()
+
+
+def test_bundled_pages_pass_through_unchanged():
+    bundle = AssetBundle()
+    pages = list(bundle.pages(reports()))
+    again = AssetBundle()
+    assert list(again.pages(pages)) == pages
+    assert again.classes == bundle.classes
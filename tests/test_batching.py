@@ -0,0 +1,81 @@
+import json
+import re
+import threading
+import types
+
+from conftest import STATS, schools
+
+from report_generator.batching import INSIGHT_KEYS, InsightBatcher, build_batch_insight_prompt
+from report_generator.cache import InsightCache
+from report_generator.insights import build_insight_prompt, generate_all_insights
+from report_generator.ratelimit import estimate_tokens
+
+
+class BatchModel:
+    """
+    Fake Gemini model. Batch prompts get an array that leaves out the
+    schools in `missing` and gives those in `incomplete` only p1; single
+    school prompts get a full answer. Records the schools of single calls.
+    """
+
+    def __init__(self, missing=(), incomplete=()):
+        self.missing = set(missing)
+        self.incomplete = set(incomplete)
+        self.lock = threading.Lock()
+        self.batch_calls = 0
+        self.single_calls = []
+
+    def generate_content(self, prompt):
+        single = re.search(r'School: "(.*)"', prompt)
+        if single:
+            with self.lock:
+                self.single_calls.append(single.group(1))
+            return types.SimpleNamespace(text=json.dumps({key: single.group(1) for key in INSIGHT_KEYS}))
+        with self.lock:
+            self.batch_calls += 1
+        items = []
+        for school in re.findall(r'^\s*- "(.*?)": students=', prompt, re.M):
+            if school in self.missing:
+                continue
+            if school in self.incomplete:
+                items.append({'school': school, 'p1': school})
+            else:
+                items.append({'school': school, **{key: school for key in INSIGHT_KEYS}})
+        return types.SimpleNamespace(text="```json\n" + json.dumps(items) + "\n```")
+
+
+def test_only_missing_and_incomplete_schools_fall_back_to_single_calls():
+    school_stats = schools(5)
+    model = BatchModel(missing={"School 1"}, incomplete={"School 3"})
+    batcher = InsightBatcher(batch_size=10)
+    results = generate_all_insights("key", school_stats, model=model, batcher=batcher)
+
+    assert [r['p1'] for r in results] == [f"School {i}" for i in range(5)]
+    assert all(set(r) == set(INSIGHT_KEYS) for r in results)
+    assert model.batch_calls == 1
+    assert sorted(model.single_calls) == ["School 1", "School 3"]
+
+    single_tokens = sum(estimate_tokens(build_insight_prompt(stats, school)) for school, stats in school_stats)
+    used_tokens = (estimate_tokens(build_batch_insight_prompt(school_stats))
+                   + estimate_tokens(build_insight_prompt(STATS, "School 1"))
+                   + estimate_tokens(build_insight_prompt(STATS, "School 3")))
+    assert batcher.stats == {'schools': 5, 'batch_calls': 1, 'fallback_calls': 2,
+                             'single_tokens': single_tokens, 'used_tokens': used_tokens}
+    assert single_tokens > used_tokens
+    summary = batcher.summary()
+    assert "3 calls for 5 schools (2 calls saved, 2 single-school fallbacks)" in summary
+    assert f"~{single_tokens - used_tokens:,} prompt tokens saved" in summary
+
+
+def test_fallback_answers_are_cached_like_batched_ones(tmp_path):
+    school_stats = schools(4)
+    cache = InsightCache(str(tmp_path / "insights.sqlite"))
+    model = BatchModel(missing={"School 2"})
+    first = generate_all_insights("key", school_stats, model=model, cache=cache, batcher=InsightBatcher(4))
+    assert model.single_calls == ["School 2"]
+
+    model = BatchModel()
+    again = generate_all_insights("key", school_stats, model=model, cache=cache, batcher=InsightBatcher(4))
+    assert again == first
+    assert model.batch_calls == 0
+    assert model.single_calls == []
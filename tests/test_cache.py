@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+from conftest import QUESTION_HEADERS, survey_frame
+
+from report_generator.cache import SurveyFrameCache
+from report_generator.pipeline import load_scored_survey
+from report_generator.scoring import HEADER_ATTR, QUESTION_NAMES_ATTR
+from report_generator.validation import SurveyValidator
+
+pytest.importorskip("pyarrow")
+
+
+def test_cached_frame_keeps_header_and_question_names(tmp_path):
+    path = tmp_path / "survey.csv"
+    df = survey_frame(rows=200, schools=5)
+    df.to_csv(path, index=False)
+    cache = SurveyFrameCache(str(tmp_path / "frames"))
+
+    fresh = load_scored_survey(str(path), frame_cache=cache)
+    cached = load_scored_survey(str(path), frame_cache=cache)
+    assert cached.equals(fresh)
+    assert cached.attrs[HEADER_ATTR] == list(df.columns)
+    assert cached.attrs[QUESTION_NAMES_ATTR] == QUESTION_HEADERS
+
+
+def test_validation_of_a_cached_frame_matches_the_upload(tmp_path):
+    # sname moved into the first question position shifts every question along
+    path = tmp_path / "shifted.csv"
+    df = survey_frame(rows=200, schools=5)
+    columns = list(df.columns)
+    columns.insert(8, columns.pop(7))
+    df[columns].to_csv(path, index=False)
+    cache = SurveyFrameCache(str(tmp_path / "frames"))
+
+    reports = []
+    for _ in range(2):
+        validator = SurveyValidator(fail_fast=False)
+        assert load_scored_survey(str(path), frame_cache=cache, validator=validator) is not None
+        reports.append(validator.report)
+    fresh, cached = reports
+    assert list(cached.unknown_rates) == list(fresh.unknown_rates)
+    assert cached.misplaced_headers == fresh.misplaced_headers != []
+    assert any("'sname'" in error for error in cached.errors)
+
+
+def test_prune_evicts_old_and_least_recently_used_frames(tmp_path):
+    cache = SurveyFrameCache(str(tmp_path / "frames"))
+    frame = survey_frame(rows=50, schools=2)
+    now = time.time()
+    for age, digest in enumerate(["c", "b", "a"]):
+        assert cache.put(digest, frame)
+        os.utime(cache._path(digest), (now - age * 3600, now - age * 3600))
+    size = os.path.getsize(cache._path("a"))
+
+    # Reading "a" makes it the most recently used, so "b" is the one over the limit
+    assert cache.get("a") is not None
+    cache.max_bytes = 2 * size
+    cache.prune()
+    assert [cache.get(digest) is not None for digest in "abc"] == [True, False, True]
+
+    old = now - 10 * 86400
+    os.utime(cache._path("c"), (old, old))
+    reopened = SurveyFrameCache(str(tmp_path / "frames"), max_age_days=7)
+    assert reopened.get("c") is None
+    assert reopened.get("a") is not None
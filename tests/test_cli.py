@@ -0,0 +1,71 @@
+import zipfile
+
+import pandas as pd
+import pytest
+from conftest import survey_frame
+
+from report_generator.cli import main
+
+
+@pytest.fixture
+def grouped_survey(tmp_path):
+    path = tmp_path / "survey.csv"
+    df = survey_frame(rows=300, schools=6, extra={'District': ['North', 'South', 'East'] * 100})
+    df['City'] = df['sname'].map({f"School {i}": f"City {i % 2}" for i in range(6)})
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("extra", [[], ["--incremental"]])
+def test_unknown_peer_group_leaves_the_output_alone(grouped_survey, tmp_path, capsys, extra):
+    output = tmp_path / "out.zip"
+    output.write_text("previous run")
+
+    rc = main([grouped_survey, "-o", str(output), "--no-ai", "--no-frame-cache", "--peer-group", "City", "-q"]
+              + extra)
+    assert rc == 1
+    assert output.read_text() == "previous run"
+    assert "No 'City' column to compare schools by" in capsys.readouterr().err
+
+
+def test_known_peer_group_writes_reports(grouped_survey, tmp_path):
+    output = tmp_path / "reports"
+    rc = main([grouped_survey, "-o", str(output), "--no-ai", "--no-frame-cache", "--peer-group", "district", "-q"])
+    assert rc == 0
+    assert len(list(output.iterdir())) == 6
+
+
+def test_group_columns_name_other_grouping_columns(grouped_survey, tmp_path):
+    output = tmp_path / "reports"
+    rc = main([grouped_survey, "-o", str(output), "--no-ai", "--no-frame-cache", "--group-columns", "district,City",
+               "--peer-group", "city", "-q"])
+    assert rc == 0
+    assert all("Across City City" in page.read_text(encoding="utf-8") for page in output.iterdir())
+
+    rollups = tmp_path / "rollups.csv"
+    rc = main([grouped_survey, "-o", str(rollups), "--stats-only", "--rollups", "--no-frame-cache",
+               "--group-columns", "City", "-q"])
+    assert rc == 0
+    assert set(pd.read_csv(rollups)['level']) == {'school', 'City', 'overall'}
+
+
+@pytest.mark.parametrize("codec, compress_type", [("lzma", zipfile.ZIP_LZMA), ("bzip2", zipfile.ZIP_BZIP2)])
+def test_incremental_zip_uses_the_codec(grouped_survey, tmp_path, codec, compress_type):
+    output = tmp_path / "out.zip"
+    args = [grouped_survey, "-o", str(output), "--no-ai", "--no-frame-cache", "--incremental", "-q"]
+    assert main(args) == 0
+    # The second run reuses every report and still rewrites them with the codec
+    assert main(args + ["--codec", codec]) == 0
+    with zipfile.ZipFile(output) as archive:
+        assert {info.compress_type for info in archive.infolist()} == {compress_type}
+
+
+@pytest.mark.parametrize("option", ["--rpm", "--tpm"])
+@pytest.mark.parametrize("value", ["0", "-5"])
+def test_non_positive_rate_limits_are_rejected(grouped_survey, tmp_path, capsys, option, value):
+    output = tmp_path / "out.zip"
+    with pytest.raises(SystemExit) as exit_info:
+        main([grouped_survey, "-o", str(output), option, value, "-q"])
+    assert exit_info.value.code == 2
+    assert "must be a positive whole number" in capsys.readouterr().err
+    assert not output.exists()
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from conftest import survey_frame
+
+from report_generator.aggregation import NATIONAL_BENCHMARKS, STATS_COLUMNS, aggregate_school_stats
+from report_generator.export import stats_export_table, stats_format, write_stats
+from report_generator.pipeline import score_survey
+
+READERS = {
+    'csv': pd.read_csv,
+    'jsonl': lambda path: pd.read_json(path, orient='records', lines=True),
+    'parquet': pd.read_parquet,
+}
+
+
+@pytest.fixture(scope="module")
+def stats_table():
+    df = survey_frame(rows=600, schools=8)
+    return aggregate_school_stats(df, score_survey(df))
+
+
+@pytest.mark.parametrize("name", ["stats.csv", "stats.jsonl", "stats.parquet"])
+def test_stats_round_trip(stats_table, tmp_path, name):
+    fmt = stats_format(name)
+    if fmt == 'parquet':
+        pytest.importorskip("pyarrow")
+    table = stats_export_table(stats_table, national=True)
+    path = tmp_path / name
+    write_stats(table, str(path), fmt)
+
+    loaded = READERS[fmt](path)
+    assert list(loaded.columns) == list(table.columns)
+    pd.testing.assert_frame_equal(loaded, table, check_dtype=False)
+
+
+def test_national_delta_columns(stats_table):
+    table = stats_export_table(stats_table, national=True)
+    assert list(table.columns) == (['school'] + list(stats_table.columns)
+                                   + [f"{key}_vs_national" for key in NATIONAL_BENCHMARKS])
+    assert table['school'].tolist() == [str(school) for school in stats_table.index]
+    for key, benchmark in NATIONAL_BENCHMARKS.items():
+        expected = (stats_table[key] - benchmark).round(1).tolist()
+        assert table[f"{key}_vs_national"].tolist() == expected
+    assert set(STATS_COLUMNS) <= set(stats_export_table(stats_table).columns)
+    assert not any(col.endswith("_vs_national") for col in stats_export_table(stats_table).columns)
+
+
+def test_unknown_format_is_rejected(stats_table, tmp_path):
+    assert stats_format("stats.xlsx") is None
+    with pytest.raises(ValueError):
+        write_stats(stats_export_table(stats_table), str(tmp_path / "stats.xlsx"), 'xlsx')
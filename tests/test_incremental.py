@@ -0,0 +1,160 @@
+import json
+import zipfile
+
+import pytest
+from conftest import survey_frame
+
+from report_generator import rendering
+from report_generator.incremental import generate_incremental, manifest_path
+from report_generator.pipeline import PipelineCallbacks, report_filename
+from report_generator.providers import LocalInsightProvider, SelectiveInsightProvider
+
+
+class CountingProvider(LocalInsightProvider):
+    """
+    Local insights, recording the schools each run asks about.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.schools = []
+
+    def generate(self, school_stats_list, on_progress=None):
+        self.schools.extend(str(school) for school, _ in school_stats_list)
+        return super().generate(school_stats_list, on_progress)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """
+    Names of the schools rendered since the fixture was set up.
+    """
+    rendered = []
+    render_report = rendering.render_report
+
+    def counting_render(school, stats, ai_content):
+        rendered.append(str(school))
+        return render_report(school, stats, ai_content)
+
+    monkeypatch.setattr(rendering, 'render_report', counting_render)
+    return rendered
+
+
+def run(df, output):
+    provider = CountingProvider()
+    summary = generate_incremental(df, str(output), "", provider=provider)
+    return summary, provider.schools
+
+
+def report_files(output):
+    if str(output).endswith(".zip"):
+        with zipfile.ZipFile(output) as archive:
+            return {name: archive.read(name).decode('utf-8') for name in archive.namelist()}
+    return {path.name: path.read_text(encoding="utf-8") for path in output.glob("*.html")}
+
+
+def manifest_schools(output):
+    with open(manifest_path(str(output)), encoding="utf-8") as f:
+        return set(json.load(f)['schools'])
+
+
+@pytest.mark.parametrize("name", ["reports.zip", "reports"])
+def test_unchanged_rerun_reuses_every_report(tmp_path, renders, name):
+    output = tmp_path / name
+    df = survey_frame(rows=300, schools=6)
+    run(df, output)
+    first = report_files(output)
+    renders.clear()
+
+    summary, asked = run(df, output)
+    assert summary == {'rebuilt': 0, 'reused': 6, 'removed': 0}
+    assert asked == []
+    assert renders == []
+    assert report_files(output) == first
+
+
+@pytest.mark.parametrize("name", ["reports.zip", "reports"])
+def test_changed_school_is_rebuilt(tmp_path, renders, name):
+    output = tmp_path / name
+    df = survey_frame(rows=300, schools=6)
+    run(df, output)
+    first = report_files(output)
+    renders.clear()
+
+    df.loc[df['sname'] == "School 2", 'Q1'] = 'Always'
+    summary, asked = run(df, output)
+    assert summary == {'rebuilt': 1, 'reused': 5, 'removed': 0}
+    assert asked == renders == ["School 2"]
+    second = report_files(output)
+    changed = report_filename("School 2")
+    assert second[changed] != first[changed]
+    assert {k: v for k, v in second.items() if k != changed} == {k: v for k, v in first.items() if k != changed}
+
+
+@pytest.mark.parametrize("name", ["reports.zip", "reports"])
+def test_removed_school_is_dropped(tmp_path, renders, name):
+    output = tmp_path / name
+    df = survey_frame(rows=300, schools=6)
+    run(df, output)
+    renders.clear()
+
+    summary, asked = run(df[df['sname'] != "School 3"], output)
+    assert summary == {'rebuilt': 0, 'reused': 5, 'removed': 1}
+    assert asked == renders == []
+    files = report_files(output)
+    assert report_filename("School 3") not in files
+    assert len(files) == 5
+    assert manifest_schools(output) == {f"School {i}" for i in range(6) if i != 3}
+
+
+class RecordingCallbacks(PipelineCallbacks):
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+
+@pytest.mark.parametrize("name", ["reports.zip", "reports"])
+def test_rebuild_runs_the_report_stream_to_its_end(tmp_path, name):
+    output = tmp_path / name
+    df = survey_frame(rows=300, schools=6)
+    run(df, output)
+
+    # The provider summary is only reported once process_data has finished
+    df.loc[df['sname'] == "School 2", 'Q1'] = 'Always'
+    callbacks = RecordingCallbacks()
+    provider = CountingProvider()
+    generate_incremental(df, str(output), "", provider=provider, callbacks=callbacks)
+    assert provider.schools == ["School 2"]
+    assert provider.summary() in callbacks.messages
+
+
+class MarkedProvider(LocalInsightProvider):
+    """
+    Stands in for Gemini: local text with a marker in the key finding.
+    """
+
+    @property
+    def settings(self):
+        return "marked/v1"
+
+    def generate(self, school_stats_list, on_progress=None):
+        results = super().generate(school_stats_list, on_progress)
+        return [dict(insights, key_finding="MARKED") for insights in results]
+
+
+def test_changing_the_ai_selection_rebuilds_the_output(tmp_path):
+    output = tmp_path / "reports.zip"
+    df = survey_frame(rows=300, schools=6)
+
+    def run_selected(schools):
+        provider = SelectiveInsightProvider(LocalInsightProvider(), MarkedProvider(), schools)
+        return generate_incremental(df, str(output), "", provider=provider)
+
+    assert run_selected(["School 1"])['rebuilt'] == 6
+    assert run_selected(["School 1"]) == {'rebuilt': 0, 'reused': 6, 'removed': 0}
+    assert run_selected(["School 2"])['rebuilt'] == 6
+    files = report_files(output)
+    assert "MARKED" in files[report_filename("School 2")]
+    assert "MARKED" not in files[report_filename("School 1")]
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+from conftest import QUESTION_HEADERS, survey_frame
+
+from report_generator.ingest import read_survey
+
+
+@pytest.mark.parametrize("blank_half", [0, 1])
+def test_chunk_with_an_entirely_blank_column(tmp_path, blank_half):
+    districts = [None] * 5 + ['North'] * 5 if blank_half == 0 else ['North'] * 5 + [None] * 5
+    path = tmp_path / "survey.csv"
+    survey_frame(rows=10, schools=2, extra={'district': districts}).to_csv(path, index=False)
+
+    chunked = read_survey(str(path), chunksize=5)
+    whole = read_survey(str(path))
+    assert chunked['district'].isna().tolist() == [value is None for value in districts]
+    assert chunked.equals(whole)
+
+
+def test_chunked_read_matches_a_single_read(tmp_path):
+    path = tmp_path / "survey.csv"
+    survey_frame(rows=500, schools=7, extra={'region': ['East', 'West'] * 250}).to_csv(path, index=False)
+
+    chunked = read_survey(str(path), chunksize=37)
+    whole = read_survey(str(path))
+    assert chunked.equals(whole)
+    assert list(chunked.columns) == list(whole.columns)
+
+
+def as_values(column):
+    return [None if pd.isna(value) else value for value in column.astype(object)]
+
+
+@pytest.mark.parametrize("engine", ["pandas", "calamine"])
+def test_excel_read_matches_read_excel(tmp_path, engine):
+    # "pandas" streams rows through openpyxl's read-only mode
+    pytest.importorskip("openpyxl")
+    if engine == "calamine":
+        pytest.importorskip("python_calamine")
+    path = tmp_path / "survey.xlsx"
+    districts = ['North', 'South', None] * 40
+    survey_frame(rows=120, schools=5, extra={'district': districts}).to_excel(path, index=False)
+
+    expected = pd.read_excel(path)
+    df = read_survey(str(path), engine=engine)
+    assert list(df.columns) == [col for col in expected.columns if col in df.columns]
+    assert set(df.columns) == {'sname', 'district'} | set(QUESTION_HEADERS)
+    for col in df.columns:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+        assert as_values(df[col]) == as_values(expected[col]), col
+
+
+def test_pyarrow_csv_read_matches_the_chunked_read(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "survey.csv"
+    survey_frame(rows=300, schools=5, extra={'district': ['North', 'South', None] * 100}).to_csv(path, index=False)
+
+    df = read_survey(str(path), engine='pyarrow')
+    chunked = read_survey(str(path), chunksize=70)
+    assert list(df.columns) == list(chunked.columns)
+    for col in df.columns:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+        assert as_values(df[col]) == as_values(chunked[col]), col
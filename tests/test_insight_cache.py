@@ -0,0 +1,86 @@
+import json
+import re
+import threading
+import types
+
+from conftest import schools
+
+from report_generator import cache as cache_module
+from report_generator.batching import INSIGHT_KEYS
+from report_generator.cache import InsightCache
+from report_generator.insights import API_ERROR_INSIGHTS, generate_all_insights
+
+
+class CountingModel:
+    """
+    Fake Gemini model recording which schools it was asked about, failing
+    for the schools in `fail`.
+    """
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def generate_content(self, prompt):
+        school = re.search(r'School: "(.*)"', prompt).group(1)
+        with self.lock:
+            self.calls.append(school)
+        if school in self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        return types.SimpleNamespace(text=json.dumps({key: school for key in INSIGHT_KEYS}))
+
+
+def test_hit_and_miss(tmp_path):
+    cache = InsightCache(str(tmp_path / "insights.sqlite"))
+    assert cache.get("a") is None
+    cache.put("a", {'p1': 'text'})
+    assert cache.get("a") == {'p1': 'text'}
+    assert cache.stats == {'hits': 1, 'misses': 1, 'writes': 1}
+    cache.close()
+
+    reopened = InsightCache(str(tmp_path / "insights.sqlite"))
+    assert reopened.get("a") == {'p1': 'text'}
+    reopened.close()
+
+
+def test_api_errors_are_not_cached(tmp_path):
+    cache = InsightCache(str(tmp_path / "insights.sqlite"))
+    results = generate_all_insights("key", schools(4), model=CountingModel(fail={"School 2"}), cache=cache)
+    assert results[2] == API_ERROR_INSIGHTS
+    assert len(cache) == 3
+
+    # The rerun only asks the model about the school that failed
+    model = CountingModel()
+    results = generate_all_insights("key", schools(4), model=model, cache=cache)
+    assert model.calls == ["School 2"]
+    assert [r['p1'] for r in results] == [f"School {i}" for i in range(4)]
+    cache.close()
+
+
+def test_warm_rerun_makes_no_model_calls(tmp_path):
+    cache = InsightCache(str(tmp_path / "insights.sqlite"))
+    cold = generate_all_insights("key", schools(5), model=CountingModel(), cache=cache)
+    model = CountingModel()
+    warm = generate_all_insights("key", schools(5), model=model, cache=cache)
+    assert model.calls == []
+    assert warm == cold
+    assert cache.stats['hits'] == 5
+    cache.close()
+
+
+def test_prune_drops_old_and_least_recently_used_entries(tmp_path, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(cache_module.time, 'time', lambda: clock[0])
+    path = str(tmp_path / "insights.sqlite")
+    cache = InsightCache(path, max_entries=2, max_age_days=1)
+    for key in ("old", "a", "b", "c"):
+        cache.put(key, {'p1': key})
+        clock[0] += 3600 if key != "old" else 2 * 86400
+    cache.get("a")  # now more recently used than b and c
+    cache.prune()
+    assert cache.get("old") is None
+    assert cache.get("a") == {'p1': 'a'}
+    assert cache.get("c") == {'p1': 'c'}
+    assert cache.get("b") is None
+    cache.close()
@@ -0,0 +1,137 @@
+import zipfile
+
+import pytest
+from conftest import survey_frame
+
+from report_generator import jobs
+from report_generator.export import write_report_zip
+from report_generator.jobs import JobRunner, JobStore
+from report_generator.pipeline import report_filename
+from report_generator.profiling import PipelineProfiler
+
+SCHOOLS = 6
+
+
+class RecordingStore(JobStore):
+    """
+    JobStore that records every checkpointed school and can call
+    `on_checkpoint(job_id, count)` after each one.
+    """
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.checkpointed = []
+        self.on_checkpoint = None
+
+    def checkpoint(self, job_id, school, position, stats, insight, html):
+        super().checkpoint(job_id, school, position, stats, insight, html)
+        self.checkpointed.append(school)
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(job_id, len(self.checkpointed))
+
+
+@pytest.fixture
+def survey(tmp_path):
+    path = tmp_path / "survey.csv"
+    survey_frame(rows=300, schools=SCHOOLS).to_csv(path, index=False)
+    return str(path)
+
+
+def stop_after(runner, count):
+    def on_checkpoint(job_id, done):
+        if done == count:
+            runner.cancel(job_id)
+    return on_checkpoint
+
+
+def assert_archive_has_each_school_once(store, job_id, path):
+    assert write_report_zip(store.reports(job_id), str(path)) == SCHOOLS
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+    assert sorted(names) == sorted(report_filename(f"School {i}") for i in range(SCHOOLS))
+
+
+def test_cancelled_job_resumes_with_unfinished_schools_only(tmp_path, survey):
+    store = RecordingStore(str(tmp_path / "jobs"))
+    runner = JobRunner(store, checkpoint_every=2)
+    store.on_checkpoint = stop_after(runner, 3)
+    job_id = runner.submit(survey, "survey.csv", "", use_cache=False)
+    runner.wait(job_id)
+    job = runner.status(job_id)
+    assert job['status'] == 'cancelled'
+    assert job['done'] == 3
+    first = list(store.checkpointed)
+
+    store.checkpointed.clear()
+    store.on_checkpoint = None
+    assert runner.resume(job_id, "")
+    runner.wait(job_id)
+    job = runner.status(job_id)
+    assert job['status'] == 'done'
+    assert job['done'] == job['total'] == SCHOOLS
+    assert not set(first) & set(store.checkpointed)
+    assert len(first) + len(store.checkpointed) == SCHOOLS
+    assert_archive_has_each_school_once(store, job_id, tmp_path / "reports.zip")
+
+
+def test_job_left_running_by_a_dead_process_is_resumed(tmp_path, survey):
+    directory = str(tmp_path / "jobs")
+    store = RecordingStore(directory)
+    runner = JobRunner(store, checkpoint_every=2)
+    store.on_checkpoint = stop_after(runner, 2)
+    job_id = runner.submit(survey, "survey.csv", "", use_cache=False)
+    runner.wait(job_id)
+    # What a crash mid-run leaves behind: the row still says running
+    store.update(job_id, status='running')
+    first = list(store.checkpointed)
+    store.close()
+
+    store = RecordingStore(directory)
+    runner = JobRunner(store, checkpoint_every=2)
+    assert runner.status(job_id)['status'] == 'interrupted'
+    assert runner.resume(job_id, "")
+    runner.wait(job_id)
+    assert runner.status(job_id)['status'] == 'done'
+    assert sorted(first + store.checkpointed) == sorted(f"School {i}" for i in range(SCHOOLS))
+    assert_archive_has_each_school_once(store, job_id, tmp_path / "reports.zip")
+
+
+def test_job_is_not_reported_interrupted_before_its_worker_starts(tmp_path, survey):
+    store = JobStore(str(tmp_path / "jobs"))
+    runner = JobRunner(store)
+    seen = []
+    update = store.update
+
+    def polling_update(job_id, **fields):
+        update(job_id, **fields)
+        if fields.get('status') == 'queued':
+            seen.append(runner.status(job_id)['status'])
+
+    store.update = polling_update
+    job_id = runner.submit(survey, "survey.csv", "", use_cache=False)
+    runner.wait(job_id)
+    assert seen == ['queued']
+    assert runner.status(job_id)['status'] == 'done'
+
+
+def test_option_rejected_by_the_pipeline_fails_the_job(tmp_path, survey):
+    runner = JobRunner(JobStore(str(tmp_path / "jobs")))
+    job_id = runner.submit(survey, "survey.csv", "", use_cache=False, peer_level='region')
+    runner.wait(job_id)
+    job = runner.status(job_id)
+    assert job['status'] == 'failed'
+    assert "No 'region' column" in job['error']
+    assert job['done'] == 0
+
+
+def test_only_the_latest_profilers_are_kept(tmp_path, survey, monkeypatch):
+    monkeypatch.setattr(jobs, 'MAX_KEPT_PROFILERS', 2)
+    runner = JobRunner(JobStore(str(tmp_path / "jobs")))
+    job_ids = []
+    for _ in range(3):
+        job_ids.append(runner.submit(survey, "survey.csv", "", profiler=PipelineProfiler(), use_cache=False))
+        runner.wait(job_ids[-1])
+    assert list(runner.profilers) == job_ids[1:]
+    assert runner.resume(job_ids[0], "", profiler=PipelineProfiler())
+    runner.wait(job_ids[0])
+    assert list(runner.profilers) == [job_ids[2], job_ids[0]]
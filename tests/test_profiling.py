@@ -0,0 +1,47 @@
+import json
+import pstats
+
+import pytest
+from conftest import survey_frame
+
+from report_generator.cli import main
+from report_generator.profiling import PipelineProfiler
+
+
+def test_profiled_run_writes_cprofile_stats_and_chrome_trace(tmp_path):
+    survey = tmp_path / "survey.csv"
+    survey_frame(rows=300, schools=6).to_csv(survey, index=False)
+    trace, stats, profile = tmp_path / "trace.json", tmp_path / "render.prof", tmp_path / "profile.json"
+
+    rc = main([str(survey), "-o", str(tmp_path / "reports.zip"), "--no-ai", "--no-frame-cache", "-q",
+               "--trace", str(trace), "--cprofile-out", str(stats), "--profile-json", str(profile)])
+    assert rc == 0
+
+    functions = {name for _, _, name in pstats.Stats(str(stats)).stats}
+    assert "render_report" in functions
+
+    events = json.loads(trace.read_text())['traceEvents']
+    assert {'load', 'score', 'aggregate', 'insights', 'render', 'export'} <= {e['name'] for e in events}
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+    assert sum(e['name'] == 'render' for e in events) == 6
+
+    totals = json.loads(profile.read_text())['stages']
+    assert totals['render']['calls'] == totals['render']['reports'] == 6
+    assert totals['aggregate']['schools'] == 6
+
+
+def test_nested_stage_self_time_excludes_children():
+    ticks = iter([0.0, 0.0, 1.0, 3.0, 6.0])
+    profiler = PipelineProfiler(clock=lambda: next(ticks), cpu_clock=lambda: 0.0)
+    with profiler.stage('export'):
+        with profiler.stage('render', reports=1):
+            pass
+    totals = profiler.stage_totals()
+    assert totals['render']['wall_s'] == 2.0
+    assert totals['export']['wall_s'] == 6.0
+    assert totals['export']['self_s'] == 4.0
+
+
+def test_cprofile_dump_needs_cprofile(tmp_path):
+    with pytest.raises(ValueError):
+        PipelineProfiler().write_cprofile(str(tmp_path / "render.prof"))
@@ -0,0 +1,60 @@
+import json
+import types
+
+import pytest
+from conftest import survey_frame
+
+from report_generator.aggregation import aggregate_school_stats
+from report_generator.batching import INSIGHT_KEYS
+from report_generator.narrative import local_insights
+from report_generator.pipeline import preview_report, score_survey
+from report_generator.providers import InsightProvider, LocalInsightProvider
+
+
+class CountingModel:
+    """
+    Fake Gemini model that records the prompts it is sent.
+    """
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return types.SimpleNamespace(text=json.dumps({key: "From the model" for key in INSIGHT_KEYS}))
+
+
+@pytest.fixture(scope="module")
+def stats_table():
+    df = survey_frame(rows=400, schools=4)
+    return aggregate_school_stats(df, score_survey(df))
+
+
+def test_preview_only_calls_gemini_for_selected_schools(stats_table):
+    model = CountingModel()
+    stats, html = preview_report(stats_table, "School 1", "", model=model, use_cache=False,
+                                 ai_schools={"School 2"})
+    assert model.prompts == []
+    assert local_insights(stats)['p1'] in html
+
+    _, html = preview_report(stats_table, "School 2", "", model=model, use_cache=False, ai_schools={"School 2"})
+    assert len(model.prompts) == 1
+    assert "From the model" in html
+
+
+def test_preview_without_a_selection_calls_gemini(stats_table):
+    model = CountingModel()
+    preview_report(stats_table, "School 1", "", model=model, use_cache=False)
+    assert len(model.prompts) == 1
+
+
+def test_providers_must_implement_settings_and_generate():
+    with pytest.raises(TypeError):
+        InsightProvider()
+
+    class NoGenerate(InsightProvider):
+        settings = "partial"
+
+    with pytest.raises(TypeError):
+        NoGenerate()
+    assert LocalInsightProvider().settings.startswith("local/")
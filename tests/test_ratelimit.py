@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from report_generator.ratelimit import RequestScheduler, TokenBucket, _error_status
+
+
+class FakeClock:
+    """
+    Manual clock: sleep() advances time instantly and records the delays.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ApiError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(message or f"{code} error")
+        self.code = code
+
+
+class ScheduledStub:
+    """
+    Stands in for the model: call i raises the error at position i of
+    `schedule` (None means succeed).
+    """
+
+    def __init__(self, schedule):
+        self.schedule = list(schedule)
+        self.calls = 0
+
+    def __call__(self, prompt):
+        error = self.schedule[self.calls] if self.calls < len(self.schedule) else None
+        self.calls += 1
+        if error is not None:
+            raise error
+        return "ok"
+
+
+def scheduler(clock, **kwargs):
+    return RequestScheduler(clock=clock, sleep=clock.sleep, rng=random.Random(0), **kwargs)
+
+
+def test_retries_429_and_5xx_with_backoff_then_succeeds():
+    clock = FakeClock()
+    stub = ScheduledStub([ApiError(429), ApiError(503), Exception("429 Resource has been exhausted")])
+    s = scheduler(clock, base_delay=1.0, max_delay=60.0)
+    assert s.call(stub, "prompt") == "ok"
+    assert stub.calls == 4
+    assert s.stats['retries'] == 3 and s.stats['failures'] == 0 and s.stats['requests'] == 4
+    # Full jitter: attempt n waits at most base_delay * 2**n
+    assert [d <= 2 ** n for n, d in enumerate(clock.sleeps)] == [True] * 3
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    stub = ScheduledStub([ApiError(429)] * 10)
+    s = scheduler(clock, max_retries=2)
+    with pytest.raises(ApiError):
+        s.call(stub, "prompt")
+    assert stub.calls == 3
+    assert s.stats['failures'] == 1
+
+
+@pytest.mark.parametrize('error', [ApiError(400), ValueError("Request payload exceeds 5000 bytes"),
+                                   ValueError("field 'x' invalid at offset 1.500")])
+def test_non_retryable_errors_fail_at_once(error):
+    clock = FakeClock()
+    stub = ScheduledStub([error])
+    s = scheduler(clock)
+    with pytest.raises(type(error)):
+        s.call(stub, "prompt")
+    assert stub.calls == 1
+    assert clock.sleeps == []
+
+
+@pytest.mark.parametrize('message, status', [
+    ("429 Too Many Requests", 429), ("upstream returned 503.", 503), ("HTTP 500: internal", 500),
+    ("payload exceeds 5000 bytes", None), ("request id 14290", None), ("took 1.502s", None),
+    ("Quota exceeded for this project", 429),
+])
+def test_status_from_message_matches_whole_numbers(message, status):
+    assert _error_status(Exception(message)) == status
+
+
+def test_rpm_bucket_spaces_requests():
+    clock = FakeClock()
+    s = scheduler(clock, requests_per_minute=60)
+    s.request_bucket.tokens = 0     # start empty: one request per second
+    for _ in range(3):
+        s.call(lambda prompt: "ok", "prompt")
+    assert clock.now == pytest.approx(3.0)
+    assert s.stats['throttled_seconds'] == pytest.approx(3.0)
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(120, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire(120) == 0.0
+    assert bucket.acquire(2) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("per_minute", [0, -60])
+def test_non_positive_rate_is_rejected(per_minute):
+    with pytest.raises(ValueError, match="must be positive"):
+        TokenBucket(per_minute)
+    with pytest.raises(ValueError):
+        RequestScheduler(requests_per_minute=per_minute)
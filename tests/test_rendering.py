@@ -0,0 +1,92 @@
+from concurrent.futures import Future
+
+import pytest
+from conftest import STATS, survey_frame
+
+from report_generator import rendering
+from report_generator.aggregation import aggregate_school_stats, school_stats
+from report_generator.narrative import local_insights
+from report_generator.pipeline import score_survey
+from report_generator.rendering import CompiledTemplate, render_report, render_reports, report_replacements
+from report_generator.template import HTML_TEMPLATE
+
+
+def report_items(schools):
+    df = survey_frame(rows=schools * 5, schools=schools)
+    table = aggregate_school_stats(df, score_survey(df))
+    items = []
+    for school in table.index:
+        stats = school_stats(table, school)
+        items.append((school, stats, local_insights(stats)))
+    return items
+
+
+class InlineExecutor:
+    """
+    Runs each submitted chunk at once and records how many results were
+    waiting to be collected at the peak.
+    """
+    def __init__(self, max_workers):
+        self.pending = 0
+        self.peak = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        self.pending += 1
+        self.peak = max(self.peak, self.pending)
+        original = future.result
+
+        def result():
+            self.pending -= 1
+            return original()
+        future.result = result
+        return future
+
+
+def test_pool_output_matches_serial_rendering():
+    items = report_items(12)
+    expected = [render_report(*item) for item in items]
+    assert list(render_reports(items, workers=2, chunksize=5)) == expected
+
+
+def test_chunks_in_flight_are_bounded(monkeypatch):
+    executors = []
+
+    def executor(max_workers):
+        executors.append(InlineExecutor(max_workers))
+        return executors[-1]
+
+    monkeypatch.setattr(rendering, 'ProcessPoolExecutor', executor)
+    items = report_items(40)
+    rendered = render_reports(items, workers=2, chunksize=2)
+    first = next(rendered)
+    # Only the first window of chunks is submitted before anything is yielded
+    assert executors[0].peak == 2 * rendering.RENDER_CHUNKS_IN_FLIGHT
+    assert [first] + list(rendered) == [render_report(*item) for item in items]
+    assert executors[0].peak == 2 * rendering.RENDER_CHUNKS_IN_FLIGHT
+
+
+INSIGHTS = {'p1': "Participation was strong.", 'p2': "Most students sit in the mild band.",
+            'key_finding': "Exam anxiety is below the national rate", 'conclusion': "Keep the mentoring scheme.",
+            'quote': "Small steps every day.", 'strengths': "Support is above the national 28%.",
+            'weaknesses': "Parental pressure is close to the national 66%."}
+
+
+def test_compiled_template_matches_str_replace_loop():
+    # The renderer this replaced: one str.replace pass per placeholder
+    expected = HTML_TEMPLATE
+    for key, val in report_replacements("Green Valley School", STATS, INSIGHTS).items():
+        expected = expected.replace(key, str(val))
+    assert render_report("Green Valley School", STATS, INSIGHTS) == expected
+
+
+def test_unknown_placeholder_fails_at_compile_time():
+    with pytest.raises(ValueError, match=r"\[SCHOOL_MOTTO\]"):
+        CompiledTemplate("<h1>[SCHOOL_NAME]</h1><p>[SCHOOL_MOTTO]</p>", ["[SCHOOL_NAME]"])
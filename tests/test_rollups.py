@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+from conftest import survey_frame
+
+from report_generator.aggregation import STATS_COLUMNS, aggregate_school_stats, school_stats
+from report_generator.pipeline import score_survey
+from report_generator.rollups import OVERALL_GROUP, OVERALL_LEVEL, SCHOOL_LEVEL, Rollup
+
+SCHOOLS = 6
+DISTRICTS = {f"School {i}": ['North', 'South', 'East'][i % 3] for i in range(SCHOOLS)}
+REGIONS = {'North': 'Upper', 'South': 'Lower', 'East': 'Lower'}
+
+
+@pytest.fixture(scope="module")
+def survey():
+    """
+    Scored frame where every school sits in exactly one district and every
+    district in one region, with the answer codes.
+    """
+    df = survey_frame(rows=600, schools=SCHOOLS)
+    df['district'] = df['sname'].map(DISTRICTS)
+    df['region'] = df['district'].map(REGIONS)
+    return df, score_survey(df)
+
+
+def grouped_stats(df, codes, column):
+    # Aggregated straight from the rows, as if the column were the school
+    return aggregate_school_stats(df.assign(sname=df[column]), codes)
+
+
+def test_levels_match_aggregating_the_rows_directly(survey):
+    df, codes = survey
+    rollup = Rollup.from_frame(df, codes, levels=['region', 'district'])
+    assert rollup.levels == ['region', 'district']
+    pd.testing.assert_frame_equal(rollup.tables[SCHOOL_LEVEL], aggregate_school_stats(df, codes))
+    for level in rollup.levels:
+        pd.testing.assert_frame_equal(rollup.tables[level], grouped_stats(df, codes, level), check_names=False)
+    # Rows without a school name count towards no level
+    overall = grouped_stats(df.assign(all=df['sname'].notna().map({True: OVERALL_GROUP, False: None})), codes, 'all')
+    pd.testing.assert_frame_equal(rollup.tables[OVERALL_LEVEL], overall, check_names=False, check_dtype=False)
+
+
+def test_merged_partials_equal_the_whole_frame(survey):
+    df, codes = survey
+    # Every school has rows in both halves
+    half = len(df) // 2
+    first = Rollup.from_frame(df.iloc[:half], codes[:half], levels=['region', 'district'])
+    second = Rollup.from_frame(df.iloc[half:], codes[half:], levels=['region', 'district'])
+    merged = first.merge(second)
+    whole = Rollup.from_frame(df, codes, levels=['region', 'district'])
+
+    assert set(first.school_partials.index) == set(second.school_partials.index)
+    for level, table in whole.tables.items():
+        pd.testing.assert_frame_equal(merged.tables[level].loc[table.index], table, check_dtype=False)
+    pd.testing.assert_frame_equal(merged.export_table().sort_values(['level', 'group']).reset_index(drop=True),
+                                  whole.export_table().sort_values(['level', 'group']).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_peer_stats_of_a_school_with_a_known_district(survey):
+    df, codes = survey
+    rollup = Rollup.from_frame(df, codes, levels=['region', 'district'])
+    districts = grouped_stats(df, codes, 'district')
+
+    peer = rollup.peer_stats("School 1", 'district')
+    assert peer == dict(school_stats(districts, 'South'), level='district', group='South', schools=2)
+    assert rollup.peer_stats("School 1") == peer
+    regional = rollup.peer_stats("School 1", 'region')
+    assert (regional['group'], regional['schools']) == ('Lower', 4)
+    assert regional['count'] == districts.loc[['South', 'East'], 'count'].sum()
+    overall = rollup.peer_stats("School 1", OVERALL_LEVEL)
+    assert (overall['group'], overall['schools'], overall['count']) == (OVERALL_GROUP, SCHOOLS, districts['count'].sum())
+
+
+def test_school_without_a_group_has_no_peer_stats(survey):
+    df, codes = survey
+    df = df.assign(district=df['district'].where(df['sname'] != "School 0"))
+    rollup = Rollup.from_frame(df, codes, levels=['district'])
+    assert rollup.peer_stats("School 0", 'district') is None
+    assert rollup.peer_stats("School 1", 'district')['group'] == 'South'
+
+
+def test_export_table_lists_every_level(survey):
+    df, codes = survey
+    rollup = Rollup.from_frame(df, codes, levels=['region', 'district'])
+    table = rollup.export_table()
+
+    assert list(table.columns) == ['level', 'group', 'schools'] + STATS_COLUMNS + ['region', 'district']
+    assert table['level'].value_counts().to_dict() == {SCHOOL_LEVEL: SCHOOLS, 'district': 3, 'region': 2,
+                                                       OVERALL_LEVEL: 1}
+    schools = table[table['level'] == SCHOOL_LEVEL].set_index('group')
+    assert schools['district'].to_dict() == DISTRICTS
+    assert (schools['schools'] == 1).all()
+    districts = table[table['level'] == 'district'].set_index('group')
+    assert districts['schools'].to_dict() == {'North': 2, 'South': 2, 'East': 2}
+    assert districts['count'].to_dict() == grouped_stats(df, codes, 'district')['count'].to_dict()
@@ -0,0 +1,102 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import QUESTION_HEADERS, survey_frame
+
+from report_generator.pipeline import score_survey
+from report_generator.scoring import encode_responses
+
+SCALE_MAP = {'Never': 1, 'Rarely': 2, 'Sometimes': 3, 'Often': 4, 'Always': 5}
+REVERSE_MAP = {'Never': 5, 'Rarely': 4, 'Sometimes': 3, 'Often': 2, 'Always': 1}
+
+
+def calculate_score(row, cols):
+    # The original row-wise scoring, kept as the reference
+    score = 0
+    for i in range(8, 24):
+        score += SCALE_MAP.get(row[cols[i]], 3)
+    for i in range(24, 28):
+        score += REVERSE_MAP.get(row[cols[i]], 3)
+    return score
+
+
+def get_category(s):
+    if s <= 36: return 'Balanced'
+    elif s <= 52: return 'Mild'
+    elif s <= 68: return 'Moderate'
+    elif s <= 84: return 'High'
+    else: return 'Severe'
+
+
+def reference_scores(df):
+    cols = df.columns.tolist()
+    totals = df.apply(calculate_score, axis=1, cols=cols)
+    return totals.tolist(), totals.apply(get_category).tolist()
+
+
+def frame_with_totals(totals):
+    """
+    One row per target total: Q17-Q20 'Sometimes' (12 points), Q1-Q16
+    filled from 'Never' upwards until the total is reached.
+    """
+    levels = list(SCALE_MAP)
+    rows = []
+    for total in totals:
+        points = [1] * 16
+        remaining = total - 12 - 16
+        for i in range(16):
+            step = min(4, remaining)
+            points[i] += step
+            remaining -= step
+        rows.append([levels[p - 1] for p in points] + ['Sometimes'] * 4)
+    df = survey_frame(rows=len(totals), schools=1)
+    df[QUESTION_HEADERS] = pd.DataFrame(rows, columns=QUESTION_HEADERS)
+    return df
+
+
+def test_matches_row_wise_scoring():
+    df = survey_frame(rows=3000, seed=1)
+    expected_totals, expected_categories = reference_scores(df)
+    score_survey(df)
+    assert df['total_score'].tolist() == expected_totals
+    assert df['category'].astype(str).tolist() == expected_categories
+
+
+@pytest.mark.parametrize('answer', ['always', '', None, np.nan, 'Sometime', ' Often', 'NEVER'])
+def test_unknown_and_blank_answers_score_three(answer):
+    df = survey_frame(rows=1, schools=1)
+    df[QUESTION_HEADERS] = 'Never'
+    df['Q1'] = answer       # standard question
+    df['Q20'] = answer      # reverse-scored question
+    expected_totals, expected_categories = reference_scores(df)
+    score_survey(df)
+    # Q2-Q16 'Never' (1 each), Q17-Q19 'Never' reversed (5 each), two unknowns at 3
+    assert expected_totals == [15 * 1 + 3 * 5 + 3 + 3]
+    assert df['total_score'].tolist() == expected_totals
+    assert df['category'].astype(str).tolist() == expected_categories
+
+
+def test_category_boundaries():
+    totals = [28, 36, 37, 52, 53, 68, 69, 84, 85, 92]
+    df = frame_with_totals(totals)
+    expected_totals, expected_categories = reference_scores(df)
+    assert expected_totals == totals
+    score_survey(df)
+    assert df['total_score'].tolist() == totals
+    assert df['category'].astype(str).tolist() == expected_categories == [
+        'Balanced', 'Balanced', 'Mild', 'Mild', 'Moderate', 'Moderate', 'High', 'High', 'Severe', 'Severe']
+
+
+def test_unknown_answer_scores_zero_without_warnings():
+    df = survey_frame(rows=4, schools=1)
+    df[QUESTION_HEADERS] = 'Often'
+    df.loc[0, 'Q1'] = 'Sometime'
+    df.loc[1, 'Q1'] = None
+    df['Q2'] = df['Q2'].astype('category')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        codes = encode_responses(df)
+    assert codes[:, 0].tolist() == [0, 0, 4, 4]
+    assert codes[:, 1].tolist() == [4, 4, 4, 4]
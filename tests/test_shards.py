@@ -0,0 +1,107 @@
+import json
+import zipfile
+
+from conftest import STATS
+
+from report_generator.assets import AssetBundle
+from report_generator.cache import file_digest
+from report_generator.narrative import local_insights
+from report_generator.pipeline import report_filename
+from report_generator.rendering import render_report
+from report_generator.shards import index_path, prefix_key, write_report_shards
+
+
+def reports(schools, body="<p>report</p>"):
+    return [(report_filename(school), f"<html><h1>{school}</h1>{body}</html>") for school in schools]
+
+
+def shard_contents(out_dir, index):
+    contents = {}
+    for entry in index['shards']:
+        with zipfile.ZipFile(out_dir / entry['file']) as archive:
+            contents[entry['file']] = archive.namelist()
+    return contents
+
+
+def test_index_maps_every_school_to_its_shard(tmp_path):
+    schools = [f"School {i}" for i in range(7)]
+    index = write_report_shards(reports(schools), str(tmp_path), max_schools=3, workers=2)
+
+    assert index == json.loads(open(index_path(str(tmp_path)), encoding="utf-8").read())
+    assert index['shard_by'] == 'count'
+    assert [entry['file'] for entry in index['shards']] == [
+        "school_reports-001.zip", "school_reports-002.zip", "school_reports-003.zip"]
+    assert [entry['reports'] for entry in index['shards']] == [3, 3, 1]
+    assert list(index['schools']) == schools
+    contents = shard_contents(tmp_path, index)
+    for school, file in index['schools'].items():
+        assert contents[file].count(report_filename(school)) == 1
+    for entry in index['shards']:
+        assert entry['sha256'] == file_digest(str(tmp_path / entry['file']))
+        assert entry['compressed_bytes'] == (tmp_path / entry['file']).stat().st_size
+
+
+def test_byte_limit_counts_encoded_bytes(tmp_path):
+    # The second page is about 500 characters but 980 bytes of UTF-8
+    pages = reports(["School A"]) + reports(["École B"], body="é" * 480)
+    limit = 1000
+    assert sum(len(html) for _, html in pages) < limit < sum(len(html.encode("utf-8")) for _, html in pages)
+    index = write_report_shards(pages, str(tmp_path), max_bytes=limit, workers=1)
+
+    assert index['shard_by'] == 'size'
+    assert [entry['reports'] for entry in index['shards']] == [1, 1]
+    assert all(entry['uncompressed_bytes'] <= limit for entry in index['shards'])
+
+
+def test_byte_limit_packs_pages_up_to_the_limit(tmp_path):
+    pages = reports([f"School {i}" for i in range(6)])
+    size = len(pages[0][1].encode("utf-8"))
+    index = write_report_shards(pages, str(tmp_path), max_bytes=2 * size, workers=2)
+    assert [entry['reports'] for entry in index['shards']] == [2, 2, 2]
+    assert all(entry['uncompressed_bytes'] == 2 * size for entry in index['shards'])
+
+
+def test_key_groups_schools_before_splitting(tmp_path):
+    schools = ["Alpha", "Beta", "Apex", "Bolt", "Atlas", "Cedar"]
+    index = write_report_shards(reports(schools), str(tmp_path), key=prefix_key, shard_by='prefix',
+                                max_schools=2)
+    assert index['shard_by'] == 'prefix'
+    assert [(entry['key'], entry['part'], entry['reports']) for entry in index['shards']] == [
+        ('A', 1, 2), ('A', 2, 1), ('B', 1, 2), ('C', 1, 1)]
+    assert index['schools']['Atlas'] == "school_reports-A-002.zip"
+    assert set(shard_contents(tmp_path, index)["school_reports-B-001.zip"]) == {
+        report_filename("Beta"), report_filename("Bolt")}
+
+
+def test_rerun_removes_shards_it_did_not_rewrite(tmp_path):
+    schools = [f"School {i}" for i in range(6)]
+    (tmp_path / "notes.txt").write_text("keep me")
+    write_report_shards(reports(schools), str(tmp_path), max_schools=2)
+    assert (tmp_path / "school_reports-003.zip").exists()
+
+    index = write_report_shards(reports(schools), str(tmp_path), max_schools=3)
+    assert [entry['file'] for entry in index['shards']] == ["school_reports-001.zip", "school_reports-002.zip"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "notes.txt", "school_reports-001.zip", "school_reports-002.zip", "school_reports-index.json"]
+
+
+def test_byte_limit_counts_bundled_pages(tmp_path):
+    pages = [(report_filename(school), render_report(school, STATS, local_insights(STATS)))
+             for school in ["School 1", "School 2", "School 3", "School 4"]]
+    bundled = len(AssetBundle().page(pages[0][1]).encode("utf-8"))
+    # Bundling shrinks every page, so counting the templated page would split each pair
+    assert bundled < len(pages[0][1].encode("utf-8"))
+    index = write_report_shards(pages, str(tmp_path), max_bytes=2 * bundled, bundle_assets=True)
+    assert [entry['reports'] for entry in index['shards']] == [2, 2]
+    assert all(entry['uncompressed_bytes'] == 2 * bundled for entry in index['shards'])
+
+
+def test_keys_that_sanitize_alike_get_separate_shards(tmp_path):
+    districts = {"School 0": "North/East", "School 1": "North_East"}
+    index = write_report_shards(reports(districts), str(tmp_path), key=districts.get, shard_by='district')
+    files = [entry['file'] for entry in index['shards']]
+    assert len(set(files)) == 2
+    assert "school_reports-North_East-001.zip" in files
+    contents = shard_contents(tmp_path, index)
+    for school, file in index['schools'].items():
+        assert contents[file] == [report_filename(school)]
@@ -0,0 +1,112 @@
+import pytest
+from conftest import LEADING_COLUMNS, QUESTION_HEADERS, survey_frame
+
+from report_generator.pipeline import PipelineCallbacks, load_scored_survey
+from report_generator.validation import SurveyValidator, misplaced_headers, non_question_headers
+
+
+def shifted_headers(column, group_names=None):
+    """
+    Names flagged in the first question position when `column` sits there.
+    """
+    header = LEADING_COLUMNS + [column] + QUESTION_HEADERS + ['Comment']
+    return [name for position, name, _, _ in misplaced_headers(header, group_names) if position == 8]
+
+
+def test_grouping_columns_in_use_are_not_questions():
+    assert 'district' in non_question_headers()
+    custom = non_question_headers(['State', 'City'])
+    assert {'state', 'city', 'sname'} <= custom
+    assert 'district' not in custom
+
+    assert shifted_headers('City') == []
+    assert shifted_headers('City', 'state,City') == ['City']
+    assert shifted_headers('District', ['City']) == []
+    assert shifted_headers('District') == ['District']
+
+
+def test_custom_grouping_column_among_the_questions_is_rejected(tmp_path):
+    path = tmp_path / "shifted.csv"
+    df = survey_frame(rows=200, schools=5)
+    df.insert(8, 'City', 'Pune')
+    df.to_csv(path, index=False)
+
+    validator = SurveyValidator()
+    assert load_scored_survey(str(path), validator=validator, group_names=['City']) is None
+    assert any("'City': expected a question here" in error for error in validator.report.errors)
+
+
+class RecordingCallbacks(PipelineCallbacks):
+    def __init__(self):
+        self.messages = []
+        self.errors = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+    def error(self, message):
+        self.errors.append(message)
+
+
+def clean_frame(rows=100, schools=5):
+    """
+    Upload where every answer is valid and every row has a school.
+    """
+    df = survey_frame(rows=rows, schools=schools)
+    df['sname'] = [f"School {i % schools}" for i in range(rows)]
+    for col in QUESTION_HEADERS:
+        df[col] = 'Often'
+    return df
+
+
+@pytest.mark.parametrize("limit, flagged", [(0.15, True), (0.2, False), (0.25, False)])
+def test_unknown_answer_rate_over_the_limit_is_an_error(limit, flagged):
+    df = clean_frame()
+    df.loc[:19, 'Q3'] = 'Sometime'
+    report = SurveyValidator(max_unknown_rate=limit).validate(df)
+    assert report.unknown_rates['Q3'] == 0.2
+    assert report.unknown_rates['Q4'] == 0.0
+    assert report.ok is not flagged
+    if flagged:
+        assert report.errors == ["Question column 'Q3': 20% of answers are not "
+                                 "Never/Rarely/Sometimes/Often/Always ('Sometime' x20)."]
+        assert report.unknown_values == {'Q3': [('Sometime', 20)]}
+
+
+def test_rows_without_a_school_are_listed_by_spreadsheet_row():
+    df = clean_frame()
+    df.loc[3, 'sname'] = None
+    df.loc[7, 'sname'] = "  "
+    report = SurveyValidator().validate(df)
+    assert report.ok
+    assert report.blank_school_rows == [5, 9]
+    assert report.warnings == ["2 rows have no school name (sname) and are left out of every report: rows 5, 9."]
+
+
+def test_schools_with_few_responses_are_a_warning():
+    df = clean_frame()
+    df.loc[:2, 'sname'] = "Tiny School"
+    report = SurveyValidator(min_responses=20).validate(df)
+    assert report.ok
+    assert report.small_schools == {'Tiny School': 3, 'School 0': 19, 'School 1': 19, 'School 2': 19}
+    assert report.warnings == ["4 schools have fewer than 20 responses: "
+                               "Tiny School (3), School 0 (19), School 1 (19), School 2 (19)."]
+
+
+@pytest.mark.parametrize("fail_fast", [True, False])
+def test_fail_fast_stops_loading_and_warn_only_continues(tmp_path, fail_fast):
+    path = tmp_path / "survey.csv"
+    df = clean_frame()
+    df.loc[:39, 'Q5'] = 'Sometime'
+    df.to_csv(path, index=False)
+    callbacks = RecordingCallbacks()
+
+    frame = load_scored_survey(str(path), callbacks=callbacks, validator=SurveyValidator(fail_fast=fail_fast))
+    if fail_fast:
+        assert frame is None
+        assert len(callbacks.errors) == 1
+        assert callbacks.errors[0].startswith("Upload rejected before scoring:\n- Question column 'Q5': 40%")
+    else:
+        assert len(frame) == 100
+        assert callbacks.errors == []
+        assert any(message.startswith("Continuing despite: Question column 'Q5'") for message in callbacks.messages)